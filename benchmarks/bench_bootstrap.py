@@ -0,0 +1,43 @@
+"""
+Benchmarks the bootstrapped ensemble, which evaluates all heads in a single
+pass, against evaluating M separate networks with the same architecture
+
+Usage: python -m benchmarks.bench_bootstrap
+"""
+import chainer.links as L
+import numpy as np
+from chainer import as_variable, functions as F
+
+from benchmarks.common import measure, report
+from chainercb.policies import BootstrapEnsemble
+
+HEADS = [4, 16, 64]
+N = 256
+D = 32
+HIDDEN = 64
+K = 16
+
+
+def main():
+    np.random.seed(42)
+    x = as_variable(np.random.random((N, D)).astype(np.float32))
+    for m in HEADS:
+        params = {'heads': m, 'n': N, 'd': D, 'hidden': HIDDEN, 'k': K}
+        ensemble = BootstrapEnsemble(L.Linear(D, HIDDEN), m, K, HIDDEN)
+        report('ensemble', params, measure(lambda: ensemble.draw(x)))
+
+        # The naive route: a full network per head
+        networks = [(L.Linear(D, HIDDEN), L.Linear(HIDDEN, K))
+                     for _ in range(m)]
+
+        def separate():
+            heads = np.random.randint(m, size=N)
+            best = np.stack([F.argmax(out(trunk(x)), axis=1).data
+                             for trunk, out in networks], axis=1)
+            return best[np.arange(N), heads]
+
+        report('separate', params, measure(separate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Benchmarks the drift of the incrementally maintained inverse of the ridge
+regression over many single-row updates, and the cost of the update with drift
+monitoring and scheduled refactorization
+
+Usage: python -m benchmarks.bench_drift
+"""
+import numpy as np
+
+from benchmarks.common import measure, report
+from chainercb.util import RidgeRegression
+
+UPDATES = 100000
+D = [8, 64]
+
+CONFIGS = {
+    'float32': dict(dtype=np.float32),
+    'float64': dict(dtype=np.float64),
+    'float32+drift': dict(dtype=np.float32, drift_tolerance=1e-5),
+    'float64+schedule': dict(dtype=np.float64, refactor_every=10000),
+}
+
+
+def main():
+    for d in D:
+        np.random.seed(42)
+        x = np.random.randn(UPDATES, 1, d)
+        y = np.random.randn(UPDATES, 1)
+        for name, config in CONFIGS.items():
+            r = RidgeRegression(d, **config)
+            xs = x.astype(r._dtype)
+            ys = y.astype(r._dtype)
+            for i in range(UPDATES):
+                r.update(xs[i], ys[i])
+            params = {'config': name, 'd': d, 'updates': UPDATES}
+            report('drift', params, {'drift': r.drift(),
+                                     'refactorizations': r.refactorizations})
+            report('update', params,
+                   measure(lambda: r.update(xs[0], ys[0])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Benchmarks the latency of single-context requests for the ridge-based policies,
+comparing draw (through chainer) with the plain array fast_draw
+
+Usage: python -m benchmarks.bench_fast_path
+"""
+import numpy as np
+from chainer import as_variable
+
+from benchmarks.common import measure_latency, report
+from chainercb.policies import (ADFUCBPolicy, EpsilonGreedy, LinUCBPolicy,
+                                ThompsonPolicy)
+
+ARMS = [4, 32, 256]
+D = 16
+
+
+def train(policy, x_shape, k):
+    for _ in range(10):
+        x = as_variable(np.random.random((16,) + x_shape))
+        a = as_variable(np.random.randint(k, size=16))
+        r = as_variable(np.random.random(16))
+        policy.update(x, a, None, r)
+    return policy
+
+
+def main():
+    for k in ARMS:
+        policies = {
+            'LinUCBPolicy': train(LinUCBPolicy(k, D), (D,), k),
+            'ThompsonPolicy': train(ThompsonPolicy(k, D), (D,), k),
+            'ADFUCBPolicy': train(ADFUCBPolicy(D), (k, D), k),
+        }
+        policies['EpsilonGreedy(LinUCBPolicy)'] = EpsilonGreedy(
+            policies['LinUCBPolicy'], 0.1)
+        for name, policy in policies.items():
+            shape = (1, k, D) if name == 'ADFUCBPolicy' else (1, D)
+            x = np.random.random(shape).astype(np.float32)
+            v = as_variable(x)
+            params = {'policy': name, 'k': k, 'd': D, 'n': 1}
+            report('draw', params, measure_latency(lambda: policy.draw(v)))
+            report('fast_draw', params,
+                   measure_latency(lambda: policy.fast_draw(x)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Benchmarks encoding batches of categorical records with the feature hasher
+against one-hot encoding them by hand through a vocabulary
+
+Usage: python -m benchmarks.bench_hashing
+"""
+import numpy as np
+
+from benchmarks.common import measure, report
+from chainercb.util import FeatureHasher
+
+N = [1, 64, 1024]
+D = 1 << 12
+FIELDS = 8
+CARDINALITY = 1000
+
+
+def main():
+    np.random.seed(42)
+    for n in N:
+        records = [[f'f{j}={v}' for j, v in enumerate(row)] for row in
+                   np.random.randint(CARDINALITY, size=(n, FIELDS))]
+        params = {'n': n, 'd': D, 'fields': FIELDS}
+        hasher = FeatureHasher(D)
+        hasher(records)
+        report('hash_dense', params, measure(lambda: hasher(records)))
+        report('hash_sparse', params,
+               measure(lambda: hasher.transform(records, sparse=True)))
+
+        # Exact one-hot encoding, one column per distinct feature value
+        vocabulary = {}
+
+        def one_hot():
+            x = np.zeros((n, FIELDS * CARDINALITY), dtype=np.float32)
+            for i, row in enumerate(records):
+                for feature in row:
+                    x[i, vocabulary.setdefault(feature, len(vocabulary))] = 1.0
+            return x
+
+        report('one_hot', params, measure(one_hot, repeat=3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Benchmarks the time it takes a fresh interpreter to import parts of chainercb
+
+Usage: python -m benchmarks.bench_import
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import report
+
+STATEMENTS = [
+    'pass',
+    'import numpy',
+    'import chainer',
+    'from chainercb.util import RidgeRegression',
+    'from chainercb.util import ArmRegistry',
+    'from chainercb.policies import Softmax',
+    'from chainercb.policies import LinUCBPolicy',
+    'from chainercb.policies import *',
+]
+REPEAT = 7
+
+
+def main():
+    for statement in STATEMENTS:
+        code = (f'{statement}\n'
+                f'import sys\n'
+                f'print("chainer" in sys.modules)')
+        times = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, '-c', code], check=True,
+                                 stdout=subprocess.PIPE).stdout
+            times.append(time.perf_counter() - start)
+        params = {'statement': statement,
+                  'chainer': out.decode().strip() == 'True'}
+        report('import', params, {'number': REPEAT, 'min': min(times),
+                                  'median': statistics.median(times),
+                                  'max': max(times)})
+
+
+if __name__ == '__main__':
+    main()
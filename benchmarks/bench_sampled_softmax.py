@@ -0,0 +1,42 @@
+"""
+Benchmarks a training step (IPS loss forward and backward) of a softmax policy
+over large action spaces, using the exact and the sampled log-propensity
+
+Usage: python -m benchmarks.bench_sampled_softmax
+"""
+import numpy as np
+from chainer import Variable, links as L
+
+from benchmarks.common import measure, report
+from chainercb.loss import ips
+from chainercb.policies import SampledSoftmax
+
+BATCH_SIZE = 256
+D = 64
+ACTIONS = [1000, 10000, 100000]
+SAMPLES = [None, 64, 256]
+
+
+def main():
+    for k in ACTIONS:
+        policy = SampledSoftmax(L.Linear(16, D), L.Linear(D, k))
+        x = Variable(np.random.random((BATCH_SIZE, 16)).astype(np.float32))
+        action = Variable(np.random.randint(k, size=BATCH_SIZE)
+                          .astype(np.int32))
+        log_p = Variable(np.full(BATCH_SIZE, -np.log(k), dtype=np.float32))
+        reward = Variable(np.random.random(BATCH_SIZE).astype(np.float32))
+        for m in SAMPLES:
+            if m is not None:
+                policy.nr_samples = m
+
+            def step():
+                policy.cleargrads()
+                ips(x, action, log_p, reward, policy,
+                    sampled=m is not None).backward()
+
+            params = {'n': BATCH_SIZE, 'd': D, 'k': k, 'samples': m}
+            report('ips.step', params, measure(step))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Micro-benchmarks for the per-row gather kernels in chainercb.util.select_items
+
+Usage: python -m benchmarks.bench_select_items
+"""
+import numpy as np
+from chainer import Variable
+
+from benchmarks.common import measure, report
+from chainercb.util import select_items_per_row, inverse_select_items_per_row
+
+# Typical (rows, cols, idx) shapes: single propensities for small and large
+# action spaces, slates and the pairwise comparisons of thompson sampling
+SHAPES = [(32, 6, 1), (256, 100, 1), (1024, 100, 10), (1024, 1000, 1),
+          (4096, 1000, 10), (128, 10000, 100)]
+
+
+def main():
+    for rows, cols, nr_idx in SHAPES:
+        params = {'rows': rows, 'cols': cols, 'idx': nr_idx}
+        values = np.random.random((rows, cols)).astype(np.float32)
+        idx = np.stack([np.random.permutation(cols)[:nr_idx]
+                        for _ in range(rows)]).astype(np.int32)
+        gy = np.ones((rows, nr_idx), dtype=np.float32)
+
+        def select():
+            select_items_per_row(values, idx)
+
+        def select_backward():
+            v = Variable(values)
+            y = select_items_per_row(v, idx)
+            y.grad = gy
+            y.backward()
+
+        def inverse():
+            inverse_select_items_per_row(values, idx)
+
+        report('select_items_per_row', params, measure(select))
+        report('select_items_per_row.backward', params,
+               measure(select_backward))
+        report('inverse_select_items_per_row', params, measure(inverse))
+
+
+if __name__ == '__main__':
+    main()
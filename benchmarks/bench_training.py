@@ -0,0 +1,74 @@
+"""
+Benchmarks the throughput of training a softmax policy on logged feedback with
+a serial iterator against a prefetching multiprocess iterator, for a dataset
+whose examples take time to load (e.g. decoding from disk)
+
+Usage: python -m benchmarks.bench_training
+"""
+import time
+
+import chainer.links as L
+import numpy as np
+from chainer import optimizers
+from chainer.dataset import DatasetMixin
+from chainer.iterators import SerialIterator
+
+from benchmarks.common import report
+from chainercb.policies import Softmax
+from chainercb.training import BanditUpdater, prefetch_iterator
+
+N = 4096
+D = 64
+K = 32
+BATCH_SIZE = 64
+LOAD_TIME = 1e-3
+
+
+class SlowDataset(DatasetMixin):
+    def __init__(self):
+        np.random.seed(42)
+        self.x = np.random.random((N, D)).astype(np.float32)
+        self.actions = np.random.randint(K, size=N).astype(np.int32)
+        self.log_p = np.full(N, -np.log(K), dtype=np.float32)
+        self.rewards = np.random.random(N).astype(np.float32)
+
+    def __len__(self):
+        return N
+
+    def get_example(self, i):
+        time.sleep(LOAD_TIME)
+        return self.x[i], self.actions[i], self.log_p[i], self.rewards[i]
+
+
+def run(iterator, steps):
+    policy = Softmax(L.Linear(D, K))
+    optimizer = optimizers.Adam()
+    optimizer.setup(policy)
+    updater = BanditUpdater(iterator, optimizer)
+    updater.update()
+    start = time.perf_counter()
+    for _ in range(steps):
+        updater.update()
+    return {'steps': steps,
+            'examples_per_second': steps * BATCH_SIZE /
+            (time.perf_counter() - start)}
+
+
+def main():
+    dataset = SlowDataset()
+    steps = N // BATCH_SIZE
+    params = {'n': N, 'd': D, 'k': K, 'batch_size': BATCH_SIZE,
+              'load_time': LOAD_TIME}
+    report('serial', params, run(SerialIterator(dataset, BATCH_SIZE), steps))
+    for processes in [2, 4]:
+        iterator = prefetch_iterator(dataset, BATCH_SIZE,
+                                     n_processes=processes)
+        try:
+            report('prefetch', dict(params, processes=processes),
+                   run(iterator, steps))
+        finally:
+            iterator.finalize()
+
+
+if __name__ == '__main__':
+    main()
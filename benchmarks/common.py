@@ -0,0 +1,105 @@
+"""
+Shared helpers for the benchmarks. Every measurement is written as a single
+JSON record per line, so results of different commits can be compared.
+"""
+import json
+import sys
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+
+def measure(fn, repeat=5):
+    """
+    Measures the wall time of calling fn
+
+    :param fn: The function to measure, called without arguments
+    :type fn: callable
+
+    :param repeat: The number of repetitions, each repetition calls fn as often
+                   as is needed to run for at least 0.2 seconds
+    :type repeat: int
+
+    :return: The number of calls per repetition and the minimum, median and
+             maximum time per call in seconds
+    :rtype: dict
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = sorted(t / number for t in timer.repeat(repeat=repeat,
+                                                     number=number))
+    return {'number': number, 'min': times[0],
+            'median': times[len(times) // 2], 'max': times[-1]}
+
+
+def measure_latency(fn, calls=2000, warmup=100):
+    """
+    Measures the distribution of the wall time of individual calls to fn
+
+    :param fn: The function to measure, called without arguments
+    :type fn: callable
+
+    :param calls: The number of calls to measure
+    :type calls: int
+
+    :param warmup: The number of calls to make before measuring
+    :type warmup: int
+
+    :return: The number of calls and the median, 99th percentile and maximum
+             time per call in seconds
+    :rtype: dict
+    """
+    for _ in range(warmup):
+        fn()
+    times = np.empty(calls)
+    for i in range(calls):
+        start = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - start
+    return {'number': calls, 'median': float(np.median(times)),
+            'p99': float(np.percentile(times, 99)), 'max': float(times.max())}
+
+
+def measure_memory(fn):
+    """
+    Measures the peak memory allocated during a single call to fn, this
+    includes all allocations made by numpy
+
+    :param fn: The function to measure, called without arguments
+    :type fn: callable
+
+    :return: The peak number of bytes allocated during the call
+    :rtype: int
+    """
+    fn()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def report(benchmark, params, stats, out=None):
+    """
+    Writes a measurement as a JSON record
+
+    :param benchmark: The name of the benchmark
+    :type benchmark: str
+
+    :param params: The parameters of the measurement
+    :type params: dict
+
+    :param stats: The measured statistics
+    :type stats: dict
+
+    :param out: The stream to write to or None to use stdout
+    :type out: io.TextIOBase|None
+    """
+    out = out or sys.stdout
+    out.write(json.dumps(dict(benchmark=benchmark, params=params, **stats)))
+    out.write('\n')
+    out.flush()
@@ -0,0 +1,220 @@
+"""
+Benchmark suite for the policies, the ridge regression and the IPS loss. Every
+case is run over a grid of batch sizes n, arms k, dimensions d and (for
+action-dependent features) action-set sizes, and both the time per call and
+the peak memory of a call are written as JSON records.
+
+Usage:
+    python -m benchmarks.run [--quick] [--filter NAME] [--output FILE]
+    python -m benchmarks.run compare BASELINE CANDIDATE [--threshold 1.2]
+
+The compare mode matches the records of two runs and lists the cases whose
+median time or peak memory grew by more than the threshold, it exits with a
+non-zero status if there are any.
+"""
+import argparse
+import itertools
+import json
+import sys
+
+import numpy as np
+from chainer import Variable, links as L
+
+from benchmarks.common import measure, measure_memory, report
+from chainercb.loss import ips
+from chainercb.policies import (ADFUCBPolicy, EpsilonGreedy, LinUCBPolicy,
+                                Softmax, ThompsonPolicy)
+from chainercb.policy import Policy
+from chainercb.util import RidgeRegression
+
+GRID = {'n': [1, 64, 1024], 'k': [4, 32], 'd': [8, 64]}
+QUICK_GRID = {'n': [1, 64], 'k': [4], 'd': [8]}
+METHODS = ['draw', 'max', 'propensity', 'log_propensity', 'update']
+
+
+def policy_cases(n, k, d):
+    """
+    Generates the benchmark cases of all policies for one point of the grid
+
+    :param n: The batch size
+    :type n: int
+
+    :param k: The number of arms, or the size of the action set for policies
+              with action-dependent features
+    :type k: int
+
+    :param d: The dimensionality of the contexts
+    :type d: int
+
+    :return: Tuples of the benchmark name and the function to measure
+    :rtype: generator
+    """
+    x = Variable(np.random.random((n, d)).astype(np.float32))
+    x_adf = Variable(np.random.random((n, k, d)).astype(np.float32))
+    actions = Variable(np.random.randint(k, size=n).astype(np.int32))
+    rewards = Variable(np.random.random(n).astype(np.float32))
+    log_p = Variable(np.full(n, -np.log(k), dtype=np.float32))
+
+    policies = {
+        'Softmax': (Softmax(L.Linear(d, k)), x),
+        'EpsilonGreedy': (EpsilonGreedy(Softmax(L.Linear(d, k)), 0.1), x),
+        'LinUCBPolicy': (LinUCBPolicy(k, d), x),
+        'ThompsonPolicy': (ThompsonPolicy(k, d), x),
+        'ADFUCBPolicy': (ADFUCBPolicy(d), x_adf),
+    }
+    for name, (policy, c_x) in policies.items():
+        # Train the ridge-based policies a little, so that they are not scored
+        # from their (trivial) initial state
+        policy.update(c_x, actions, log_p, rewards)
+        calls = {
+            'draw': lambda: policy.draw(c_x),
+            'max': lambda: policy.max(c_x),
+            'propensity': lambda: policy.propensity(c_x, actions),
+            'log_propensity': lambda: policy.log_propensity(c_x, actions),
+            'update': lambda: policy.update(c_x, actions, log_p, rewards),
+        }
+        for method in METHODS:
+            if method == 'update' and type(policy).update is Policy.update:
+                continue
+            yield f'{name}.{method}', calls[method]
+
+    def step():
+        policy = policies['Softmax'][0]
+        policy.cleargrads()
+        ips(x, actions, log_p, rewards, policy).backward()
+
+    yield 'loss.ips', step
+
+
+def ridge_cases(n, d):
+    """
+    Generates the benchmark cases of the ridge regression
+
+    :param n: The batch size
+    :type n: int
+
+    :param d: The dimensionality
+    :type d: int
+
+    :return: Tuples of the benchmark name and the function to measure
+    :rtype: generator
+    """
+    ridge = RidgeRegression(d)
+    x = Variable(np.random.random((n, d)))
+    r = Variable(np.random.random(n))
+    ridge.update(x, r)
+    yield 'RidgeRegression.update', lambda: ridge.update(x, r)
+    yield 'RidgeRegression.predict', lambda: ridge.predict(x)
+    yield 'RidgeRegression.ucb', lambda: ridge.ucb(x)
+    yield 'RidgeRegression.thompson', lambda: ridge.thompson(x)
+
+
+def run(grid, pattern=None, out=None):
+    """
+    Runs all benchmark cases over the grid
+
+    :param grid: The values of n, k and d to sweep
+    :type grid: dict
+
+    :param pattern: Only run cases whose name contains this string
+    :type pattern: str|None
+
+    :param out: The stream to write the records to or None to use stdout
+    :type out: io.TextIOBase|None
+    """
+    # Deterministic policies have zero propensities for most actions, taking
+    # their logarithm is expected
+    np.random.seed(42)
+    np.seterr(divide='ignore')
+    for n, k, d in itertools.product(grid['n'], grid['k'], grid['d']):
+        cases = itertools.chain(policy_cases(n, k, d), ridge_cases(n, d)
+                                if k == grid['k'][0] else [])
+        for name, fn in cases:
+            if pattern is not None and pattern not in name:
+                continue
+            params = {'n': n, 'd': d}
+            if not name.startswith('RidgeRegression'):
+                params['k'] = k
+            stats = measure(fn, repeat=3)
+            stats['peak_bytes'] = measure_memory(fn)
+            report(name, params, stats, out)
+
+
+def compare(baseline, candidate, threshold):
+    """
+    Compares two benchmark runs and lists the regressions
+
+    :param baseline: The path to the records of the baseline run
+    :type baseline: str
+
+    :param candidate: The path to the records of the candidate run
+    :type candidate: str
+
+    :param threshold: The ratio of candidate over baseline above which a
+                      measurement counts as a regression
+    :type threshold: float
+
+    :return: The number of regressions
+    :rtype: int
+    """
+    def load(path):
+        with open(path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return {(r['benchmark'], json.dumps(r['params'], sort_keys=True)): r
+                for r in records}
+
+    old = load(baseline)
+    new = load(candidate)
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        for stat in ('median', 'peak_bytes'):
+            if stat not in old[key] or stat not in new[key]:
+                continue
+            if new[key][stat] == old[key][stat]:
+                continue
+            ratio = new[key][stat] / old[key][stat] if old[key][stat] \
+                else float('inf')
+            if ratio > threshold:
+                regressions += 1
+                flag = 'REGRESSION'
+            elif ratio < 1.0 / threshold:
+                flag = 'improvement'
+            else:
+                continue
+            print(f'{flag:12s} {key[0]:32s} {key[1]:28s} {stat:10s} '
+                  f'{old[key][stat]:.3g} -> {new[key][stat]:.3g} '
+                  f'({ratio:.2f}x)')
+    for key in sorted(old.keys() - new.keys()):
+        print(f'{"missing":12s} {key[0]:32s} {key[1]}')
+    return regressions
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['compare']:
+        parser = argparse.ArgumentParser(prog='benchmarks.run compare')
+        parser.add_argument('baseline')
+        parser.add_argument('candidate')
+        parser.add_argument('--threshold', type=float, default=1.2)
+        args = parser.parse_args(argv[1:])
+        sys.exit(1 if compare(args.baseline, args.candidate, args.threshold)
+                 else 0)
+
+    parser = argparse.ArgumentParser(prog='benchmarks.run')
+    parser.add_argument('--quick', action='store_true',
+                        help='run a small grid only')
+    parser.add_argument('--filter', default=None,
+                        help='only run cases whose name contains this string')
+    parser.add_argument('--output', default=None,
+                        help='write the records to this file')
+    args = parser.parse_args(argv)
+    grid = QUICK_GRID if args.quick else GRID
+    if args.output is None:
+        run(grid, args.filter)
+    else:
+        with open(args.output, 'w') as out:
+            run(grid, args.filter, out)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,39 @@
+import time
+from collections import OrderedDict
+
+import chainer
+import numpy as np
 from chainer import cuda, Chain, Variable, as_variable
 
+from chainercb.policies.epsilon_greedy import EpsilonGreedy
+from chainercb.policies.softmax import Softmax
+from chainercb.util.ring import RingBuffer
+
 
 class Bandify(Chain):
-    def __init__(self, acting_policy):
+    def __init__(self, acting_policy, encoder=None):
+        """
+        :param acting_policy: The policy that executes actions
+        :type acting_policy: chainercb.policy.Policy
+
+        :param encoder: A function that encodes raw contexts (e.g. records of
+                        categorical features) into context vectors before they
+                        are passed to the policy, such as a
+                        chainercb.util.FeatureHasher, or None if contexts are
+                        already vectors
+        :type encoder: callable|None
+        """
         super().__init__(acting_policy=acting_policy)
+        self.encoder = encoder
         self._hooks = []
+        self._shadows = OrderedDict()
+        self._shadow_hooks = []
 
     def __call__(self, *args):
         if len(args) != 2:
             raise RuntimeError('expecting 2 arguments for bandify: (x, y)')
         observations, labels = args
+        observations = self._encode(observations)
         actions = self.acting_policy.draw(observations)
         log_propensities = self.acting_policy.log_propensity(observations,
                                                              actions)
@@ -17,9 +41,98 @@ class Bandify(Chain):
                               dtype=observations.dtype)
 
         self._call_hooks(observations, actions, log_propensities, rewards)
+        if self._shadow_hooks:
+            shadow_log_p = self.shadow_log_propensities(observations, actions)
+            for hook in self._shadow_hooks:
+                hook(as_variable(observations), as_variable(actions),
+                     as_variable(log_propensities), as_variable(rewards),
+                     shadow_log_p)
 
         return observations, actions, log_propensities, rewards
 
+    def shadow_policy(self, name, policy):
+        """
+        Adds a shadow policy. Shadow policies never act, but the log propensity
+        scores they assign to the actions of the acting policy are computed for
+        every batch, so that they can be compared off-policy later on.
+
+        :param name: The name of the shadow policy
+        :type name: str
+
+        :param policy: The shadow policy
+        :type policy: chainercb.policy.Policy
+        """
+        if name in self._shadows:
+            raise ValueError(f"a shadow policy named '{name}' already exists")
+        self._shadows[name] = policy
+
+    def shadow_hook(self, hook):
+        """
+        Adds a hook that is called for every batch with the context vectors,
+        actions, log propensity scores and rewards of the acting policy and
+        with a dictionary of the log propensity scores of all shadow policies
+
+        :param hook: The hook
+        :type hook: callable
+        """
+        self._shadow_hooks.append(hook)
+
+    def shadow_log_propensities(self, x, actions):
+        """
+        Computes the log propensity scores of the given actions under all
+        shadow policies. Work is shared between structurally related shadow
+        policies: softmax policies with the same predictor evaluate it once
+        and epsilon greedy policies that wrap the same policy compute its best
+        actions once.
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param actions: The actions
+        :type actions: chainer.Variable
+
+        :return: The log propensity scores of every shadow policy by name
+        :rtype: collections.OrderedDict
+        """
+        predictions = {}
+        underlying = {}
+        result = OrderedDict()
+        with chainer.no_backprop_mode():
+            for name, policy in self._shadows.items():
+                if _shares(policy, Softmax, ('_predict', 'log_propensity')):
+                    key = id(policy.predictor)
+                    if key not in predictions:
+                        predictions[key] = policy.predictor(x)
+                    result[name] = policy._log_propensity(predictions[key],
+                                                          actions)
+                elif _shares(policy, EpsilonGreedy,
+                             ('max', 'nr_actions', 'log_nr_actions',
+                              'log_propensity')):
+                    key = id(policy.policy)
+                    if key not in underlying:
+                        underlying[key] = (policy.max(x),
+                                           policy.nr_actions(x),
+                                           policy.log_nr_actions(x))
+                    result[name] = policy._log_propensity(x, actions,
+                                                          *underlying[key])
+                else:
+                    result[name] = policy.log_propensity(x, actions)
+        return result
+
+    def _encode(self, observations):
+        """
+        Encodes raw contexts with the encoder, if any
+
+        :param observations: The raw contexts
+        :type observations: chainer.Variable|list
+
+        :return: The context vectors
+        :rtype: chainer.Variable
+        """
+        if self.encoder is None:
+            return observations
+        return as_variable(self.encoder(observations))
+
     def _call_hooks(self, x, actions, log_p, rewards):
         """
         Calls the internal hooks
@@ -78,3 +191,292 @@ class MultiClassBandify(Bandify):
         xp = cuda.get_array_module(actions.data)
         array = xp.equal(actions.data, labels.data) * 1.0
         return Variable(array.astype(dtype))
+
+
+class MultiClassSlateBandify(Bandify):
+    """
+    Chain to turn a multiclass problem into a contextual bandit problem with
+    ranked slates as actions. The reward of a slate is the DCG gain of the
+    position at which the correct label was placed, or 0 if it was not placed.
+    """
+    def reward(self, actions, labels, dtype):
+        xp = cuda.get_array_module(actions.data)
+        hits = xp.equal(actions.data, labels.data[:, None]) * 1.0
+        gains = 1.0 / xp.log2(xp.arange(actions.shape[1]) + 2.0)
+        return Variable(xp.sum(hits * gains, axis=1).astype(dtype))
+
+
+class DelayedBandify(Bandify):
+    """
+    Chain for bandit problems where rewards arrive some time after the actions
+    were executed. Every executed action is logged under an event id in a
+    fixed-capacity ring buffer together with its context and log propensity.
+    Rewards are joined to their events as they arrive and joined events are
+    passed to the hooks in batches.
+
+    Events that are not joined within ttl seconds expire and, when the buffer
+    is full, the oldest events are evicted, so memory is bounded by the
+    capacity.
+
+    When the acting policy has arms that come and go (see
+    LinearPolicy.arm_generations), the generation of the arm of every event is
+    logged too, and joined events whose arm was removed or replaced in the
+    meantime are dropped (and counted in stale) rather than passed on.
+    """
+
+    # The states of a slot of the buffer
+    _FREE, _PENDING, _JOINED = 0, 1, 2
+
+    def __init__(self, acting_policy, capacity=65536, ttl=None, flush_size=1,
+                 clock=time.monotonic, encoder=None):
+        """
+        :param acting_policy: The policy that executes actions
+        :type acting_policy: chainercb.policy.Policy
+
+        :param capacity: The maximum number of logged events
+        :type capacity: int
+
+        :param ttl: The time (in seconds) after which unjoined events expire
+                    or None to only evict them when the buffer is full
+        :type ttl: float|None
+
+        :param flush_size: The number of joined events that are collected
+                           before they are passed to the hooks
+        :type flush_size: int
+
+        :param clock: The clock that time stamps events
+        :type clock: callable
+
+        :param encoder: A function that encodes raw contexts into context
+                        vectors or None if contexts are already vectors
+        :type encoder: callable|None
+        """
+        super().__init__(acting_policy, encoder)
+        self.ttl = ttl
+        self.flush_size = flush_size
+        self.clock = clock
+        self._ring = RingBuffer(capacity)
+        self._ring.allocate('state', (), np.int8, self._FREE)
+        self._ring.allocate('time', (), np.float64)
+        self._ids = [None] * capacity
+        self._index = {}
+        self._joined = []
+        self._expired = 0
+        self.evicted = 0
+        self.expired = 0
+        self.unmatched = 0
+        self.stale = 0
+
+    @property
+    def pending(self):
+        """
+        :return: The number of logged events that wait for their reward
+        :rtype: int
+        """
+        return len(self._index)
+
+    def __call__(self, *args):
+        if len(args) != 2:
+            raise RuntimeError('expecting 2 arguments for delayed bandify: '
+                               '(x, event_ids)')
+        observations, event_ids = args
+        observations = self._encode(observations)
+        actions = self.acting_policy.draw(observations)
+        log_propensities = self.acting_policy.log_propensity(observations,
+                                                             actions)
+        self._log(observations, actions, log_propensities, event_ids)
+        return observations, actions, log_propensities
+
+    def join(self, event_ids, rewards):
+        """
+        Joins rewards to previously logged events. Rewards of events that are
+        unknown, expired or evicted are dropped.
+
+        :param event_ids: The event ids
+        :type event_ids: list
+
+        :param rewards: The rewards, vector of the same length
+        :type rewards: numpy.ndarray|list of float
+
+        :return: The number of rewards that were joined
+        :rtype: int
+        """
+        self._expire()
+        column = self._ring.columns.get('reward')
+        state = self._ring.columns['state']
+        joined = 0
+        for event_id, reward in zip(event_ids, _to_list(rewards)):
+            slot = self._index.pop(event_id, None)
+            if slot is None:
+                self.unmatched += 1
+                continue
+            column[slot] = reward
+            state[slot] = self._JOINED
+            self._joined.append(slot)
+            joined += 1
+        if len(self._joined) >= self.flush_size:
+            self.flush()
+        return joined
+
+    def flush(self):
+        """
+        Passes all joined events to the hooks as a single batch
+
+        :return: The number of events that were passed
+        :rtype: int
+        """
+        if not self._joined:
+            return 0
+        slots = np.array(self._joined)
+        self._joined = []
+        columns = self._ring.columns
+        x = columns['x'][slots]
+        actions = columns['action'][slots]
+        log_p = columns['log_p'][slots]
+        rewards = columns['reward'][slots]
+        columns['state'][slots] = self._FREE
+        for slot in slots:
+            self._ids[slot] = None
+        if 'generation' in columns:
+            fresh = self.acting_policy.arm_generations(actions) == \
+                columns['generation'][slots]
+            if not fresh.all():
+                self.stale += int((~fresh).sum())
+                x, actions, log_p, rewards = (x[fresh], actions[fresh],
+                                              log_p[fresh], rewards[fresh])
+                if not fresh.any():
+                    return 0
+        self._call_hooks(x, actions, log_p, rewards)
+        return x.shape[0]
+
+    def reward(self, actions, labels, dtype):
+        raise NotImplementedError('rewards of a delayed bandify are joined '
+                                  'to events, see DelayedBandify.join')
+
+    def _log(self, x, actions, log_p, event_ids):
+        """
+        Logs a batch of executed actions under their event ids
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param actions: The executed actions
+        :type actions: chainer.Variable
+
+        :param log_p: The log propensity scores of the actions
+        :type log_p: chainer.Variable
+
+        :param event_ids: The event ids, one per context vector
+        :type event_ids: list
+        """
+        self._expire()
+        x = cuda.to_cpu(as_variable(x).data)
+        actions = cuda.to_cpu(as_variable(actions).data)
+        log_p = cuda.to_cpu(as_variable(log_p).data)
+        if len(event_ids) != x.shape[0]:
+            raise ValueError(f'expecting one event id per context, but '
+                             f'{len(event_ids)} are given for {x.shape[0]}')
+
+        # Joined events that are about to be overwritten are flushed first,
+        # pending events are evicted
+        slots = self._ring.next_slots(x.shape[0])
+        state = self._ring.columns['state']
+        if (state[slots] == self._JOINED).any():
+            self.flush()
+        for slot in slots[state[slots] == self._PENDING]:
+            self._release(slot)
+            self.evicted += 1
+
+        self._ring.allocate('reward', (), x.dtype)
+        logged = dict(x=x, action=actions, log_p=log_p,
+                      time=np.full(x.shape[0], self.clock()))
+        generations = getattr(self.acting_policy, 'arm_generations', None)
+        if generations is not None:
+            self._ring.allocate('generation', (), np.int64)
+            logged['generation'] = generations(actions)
+        self._ring.push(x.shape[0], **logged)
+        state[slots] = self._PENDING
+        for slot, event_id in zip(slots, event_ids):
+            # An event id that is logged again supersedes its pending event,
+            # which is evicted
+            previous = self._index.get(event_id)
+            if previous is not None:
+                self._release(previous)
+                state[previous] = self._FREE
+                self.evicted += 1
+            self._ids[slot] = event_id
+            self._index[event_id] = slot
+
+    def _release(self, slot):
+        """
+        Removes the event id of a slot, and its index entry if the entry
+        points to this slot
+
+        :param slot: The slot
+        :type slot: int
+        """
+        event_id = self._ids[slot]
+        if self._index.get(event_id) == slot:
+            del self._index[event_id]
+        self._ids[slot] = None
+
+    def _expire(self):
+        """
+        Expires the pending events that are older than the ttl. Events are
+        logged in order of time, so this only looks at the events logged since
+        the last expiry, which is amortized constant time per event.
+        """
+        if self.ttl is None:
+            return
+        cutoff = self.clock() - self.ttl
+        state = self._ring.columns['state']
+        times = self._ring.columns['time']
+        self._expired = max(self._expired,
+                            self._ring.pushed - self._ring.capacity)
+        while self._expired < self._ring.pushed:
+            slot = self._expired % self._ring.capacity
+            if times[slot] >= cutoff:
+                break
+            if state[slot] == self._PENDING:
+                self._release(slot)
+                state[slot] = self._FREE
+                self.expired += 1
+            self._expired += 1
+
+
+def _to_list(values):
+    """
+    Converts a vector of values to a list
+
+    :param values: The values
+    :type values: chainer.Variable|numpy.ndarray|cupy.ndarray|list
+
+    :return: The values as a list
+    :rtype: list
+    """
+    if isinstance(values, Variable):
+        values = values.data
+    if hasattr(values, 'tolist'):
+        return values.tolist()
+    return list(values)
+
+
+def _shares(policy, cls, methods):
+    """
+    Checks whether a policy is an instance of a class that does not override
+    any of the given methods, in which case its outputs can be shared
+
+    :param policy: The policy
+    :type policy: chainercb.policy.Policy
+
+    :param cls: The class
+    :type cls: type
+
+    :param methods: The names of the methods
+    :type methods: tuple of str
+
+    :return: True if the outputs of the methods can be shared
+    :rtype: bool
+    """
+    return isinstance(policy, cls) and all(
+        getattr(type(policy), m) is getattr(cls, m) for m in methods)
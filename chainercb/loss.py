@@ -2,7 +2,7 @@ import chainer.functions as F
 
 
 def ips(observations, actions, log_propensities, rewards, policy, lagrange=0.0,
-        clip=None, reduce='mean'):
+        clip=None, reduce='mean', sampled=False):
     """
     This is the lambda-translated IPS loss as described in Joachims et al
     (2018), Deep Learning with Logged Bandit Feedback. This is a modified
@@ -36,13 +36,21 @@ def ips(observations, actions, log_propensities, rewards, policy, lagrange=0.0,
                    mean of the loss over the entire minibatch
     :type reduce: str
 
+    :param sampled: Whether to approximate the log-propensities of the policy by
+                    sampled softmax, which avoids normalizing over all actions
+                    at the cost of a bias that shrinks with the number of
+                    sampled negatives (see
+                    :class:`chainercb.policies.SampledSoftmax`)
+    :type sampled: bool
+
     :return: The loss
     :rtype: chainer.Variable
     """
 
     # Compute the propensity scores of the policy we wish to optimize (this is
     # capable of backprop)
-    policy_log_propensities = policy.log_propensity(observations, actions)
+    policy_log_propensities = _log_propensity(policy, observations, actions,
+                                              sampled)
 
     # Compute the λ-translated loss from the rewards
     loss = (1.0 - rewards) - lagrange
@@ -58,7 +66,8 @@ def ips(observations, actions, log_propensities, rewards, policy, lagrange=0.0,
     return _reduce_loss(element_loss, reduce)
 
 
-def policy_gradient(observations, actions, rewards, policy, reduce='mean'):
+def policy_gradient(observations, actions, rewards, policy, reduce='mean',
+                    sampled=False):
     """
     This loss is the simple policy-gradient loss
 
@@ -80,13 +89,21 @@ def policy_gradient(observations, actions, rewards, policy, reduce='mean'):
                    mean of the loss over the entire minibatch
     :type reduce: str
 
+    :param sampled: Whether to approximate the log-propensities of the policy by
+                    sampled softmax, which avoids normalizing over all actions
+                    at the cost of a bias that shrinks with the number of
+                    sampled negatives (see
+                    :class:`chainercb.policies.SampledSoftmax`)
+    :type sampled: bool
+
     :return: The loss
     :rtype: chainer.Variable
     """
 
     # Compute the log propensity scores of the policy we wish to optimize (this
     # is capable of backprop)
-    policy_log_propensity = policy.log_propensity(observations, actions)
+    policy_log_propensity = _log_propensity(policy, observations, actions,
+                                            sampled)
 
     # Compute the per-element loss
     element_loss = -policy_log_propensity * rewards
@@ -95,6 +112,33 @@ def policy_gradient(observations, actions, rewards, policy, reduce='mean'):
     return _reduce_loss(element_loss, reduce)
 
 
+def _log_propensity(policy, observations, actions, sampled):
+    """
+    Computes the (optionally sampled) log-propensities of a policy
+
+    :param policy: The policy
+    :type policy: chainercb.policy.Policy
+
+    :param observations: The observations
+    :type observations: chainer.Variable
+
+    :param actions: The actions
+    :type actions: chainer.Variable
+
+    :param sampled: Whether to use the sampled log-propensities
+    :type sampled: bool
+
+    :return: The log-propensities
+    :rtype: chainer.Variable
+    """
+    if not sampled:
+        return policy.log_propensity(observations, actions)
+    if not hasattr(policy, 'sampled_log_propensity'):
+        raise ValueError(f'{type(policy).__name__} does not support sampled '
+                         f'log-propensities')
+    return policy.sampled_log_propensity(observations, actions)
+
+
 def _reduce_loss(element_loss, reduce):
     """
     Reduces the loss in the per-element loss either by 'no' reduction or by
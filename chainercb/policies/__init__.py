@@ -1,7 +1,21 @@
-from chainercb.policies.epsilon_greedy import EpsilonGreedy
-from chainercb.policies.exploit import Exploit
-from chainercb.policies.explore import Explore
-from chainercb.policies.softmax import Softmax
-from chainercb.policies.linear_ucb import LinUCBPolicy
-from chainercb.policies.linear_thompson import ThompsonPolicy
-from chainercb.policies.adf_ucb import ADFUCBPolicy
\ No newline at end of file
+from chainercb.util.lazy import lazy_exports
+
+# Policies are imported on first access, so that only the policies that are
+# actually used (and their dependencies) are loaded
+_exports = {
+    'EpsilonGreedy': 'chainercb.policies.epsilon_greedy',
+    'Exploit': 'chainercb.policies.exploit',
+    'Explore': 'chainercb.policies.explore',
+    'Softmax': 'chainercb.policies.softmax',
+    'LinUCBPolicy': 'chainercb.policies.linear_ucb',
+    'ThompsonPolicy': 'chainercb.policies.linear_thompson',
+    'ADFUCBPolicy': 'chainercb.policies.adf_ucb',
+    'HierarchicalSoftmax': 'chainercb.policies.hierarchical_softmax',
+    'PlackettLuce': 'chainercb.policies.plackett_luce',
+    'SampledSoftmax': 'chainercb.policies.sampled_softmax',
+    'NeuralLinearPolicy': 'chainercb.policies.neural_linear',
+    'BootstrapEnsemble': 'chainercb.policies.bootstrap',
+    'KernelUCBPolicy': 'chainercb.policies.kernel_ucb',
+}
+__all__ = list(_exports)
+__getattr__, __dir__ = lazy_exports(__name__, _exports)
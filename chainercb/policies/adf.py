@@ -1,4 +1,5 @@
-from chainer import cuda, functions as F, as_variable
+import numpy as np
+from chainer import cuda, functions as F, as_variable, Variable
 
 from chainercb.policy import Policy
 from chainercb.util import RidgeRegression, select_items_per_row
@@ -11,7 +12,8 @@ class ADFPolicy(Policy):
     action-dependent features (ADF).
     """
 
-    def __init__(self, d, alpha=1.0, regularizer=1.0, device=None):
+    def __init__(self, d, alpha=1.0, regularizer=1.0, device=None,
+                 regressor=RidgeRegression):
         """
         :param d: The number of dimensions (features)
         :type d: int
@@ -24,10 +26,15 @@ class ADFPolicy(Policy):
 
         :param device: The GPU device to use or None to use CPU
         :type device: int|None
+
+        :param regressor: The regressor class (or factory taking d, alpha,
+                          regularization and device), e.g. a windowed or
+                          discounted ridge regression
+        :type regressor: callable
         """
         super().__init__()
         self.d = d
-        self.regressor = RidgeRegression(d, alpha, regularizer, device)
+        self.regressor = regressor(d, alpha, regularizer, device)
 
     def max(self, x):
         x_r = F.reshape(x, (x.shape[0] * x.shape[1], x.shape[2]))
@@ -35,6 +42,17 @@ class ADFPolicy(Policy):
         result = F.reshape(out, (x.shape[0], x.shape[1]))
         return F.argmax(result, axis=1)
 
+    def fast_max(self, x):
+        if isinstance(x, Variable):
+            x = x.data
+        theta = getattr(self.regressor, self.regressor.serving_field('_theta'))
+        return (x @ theta).argmax(axis=1).astype(np.int32)
+
+    def fast_uniform(self, x):
+        xp = cuda.get_array_module(x)
+        result = xp.random.random((x.shape[0], x.shape[1]))
+        return result.argmax(axis=1).astype(np.int32)
+
     def uniform(self, x):
         xp = cuda.get_array_module(x)
         result = xp.random.random((x.shape[0], x.shape[1]))
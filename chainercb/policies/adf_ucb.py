@@ -1,6 +1,8 @@
-from chainer import cuda, functions as F, as_variable
+import numpy as np
+from chainer import cuda, functions as F, as_variable, Variable
 
 from chainercb.policies.adf import ADFPolicy
+from chainercb.policies.linear_ucb import _argmax_alphas
 
 
 class ADFUCBPolicy(ADFPolicy):
@@ -14,8 +16,68 @@ class ADFUCBPolicy(ADFPolicy):
         result = F.reshape(out, (x.shape[0], x.shape[1]))
         return F.argmax(result, axis=1)
 
+    def fast_draw(self, x):
+        xp = cuda.get_array_module(x)
+        if isinstance(x, Variable):
+            x = x.data
+        r = self.regressor
+        theta = getattr(r, r.serving_field('_theta'))
+        A_inv = getattr(r, r.serving_field('_A_inv'))
+        scores = xp.matmul(x, theta)
+        dev = xp.sum(xp.matmul(x, A_inv) * x, axis=2)
+        scores += r._alpha * xp.sqrt(dev)
+        return scores.argmax(axis=1).astype(np.int32)
+
     def propensity(self, x, action):
         return as_variable(1.0 * (self.draw(x).data == action.data))
 
     def log_propensity(self, x, action):
         return F.log(self.propensity(x, action))
+
+    def draw_alphas(self, x, alphas):
+        """
+        Draws actions for every value of the variance scaling factor alpha in
+        a grid. The means and deviations are computed only once, so evaluating
+        many alphas costs little more than evaluating one.
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param alphas: The values of alpha, vector of shape (m)
+        :type alphas: numpy.ndarray|cupy.ndarray|list of float
+
+        :return: The actions for every alpha, matrix of shape (m, n)
+        :rtype: chainer.Variable
+        """
+        xp = cuda.get_array_module(x)
+        if isinstance(x, Variable):
+            x = x.data
+        r = self.regressor
+        theta = getattr(r, r.serving_field('_theta'))
+        A_inv = getattr(r, r.serving_field('_A_inv'))
+        mean = xp.matmul(x, theta)
+        dev = xp.sqrt(xp.sum(xp.matmul(x, A_inv) * x, axis=2))
+        return as_variable(_argmax_alphas(mean, dev, alphas))
+
+    def propensity_alphas(self, x, action, alphas):
+        """
+        Computes the propensity scores of a batch of actions for every value of
+        alpha in a grid
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param action: The actions
+        :type action: chainer.Variable
+
+        :param alphas: The values of alpha, vector of shape (m)
+        :type alphas: numpy.ndarray|cupy.ndarray|list of float
+
+        :return: The propensity scores for every alpha, matrix of shape (m, n)
+        :rtype: chainer.Variable
+        """
+        drawn = self.draw_alphas(x, alphas).data
+        return as_variable(1.0 * (drawn == action.data[None, :]))
+
+    def log_propensity_alphas(self, x, action, alphas):
+        return F.log(self.propensity_alphas(x, action, alphas))
@@ -0,0 +1,155 @@
+import chainer.links as L
+from chainer import as_variable, cuda, functions as F
+
+from chainercb.policy import Policy
+
+
+class BootstrapEnsemble(Policy):
+    def __init__(self, trunk, nr_heads, k, size=None, optimizer=None):
+        """
+        A bootstrapped Thompson sampling policy. An ensemble of heads shares a
+        single trunk and every head predicts the reward of all actions. All
+        heads are a single linear layer with nr_heads * k outputs, so the whole
+        ensemble is evaluated with one forward pass.
+
+        Drawing samples a head per row and plays its best action, so the
+        propensity of an action is exactly the fraction of heads that consider
+        it best. Every head is trained on its own bootstrap resample of every
+        batch, which is approximated by weighting every row with an
+        independent Poisson(1) weight per head (the online bootstrap).
+
+        :param trunk: The shared trunk, mapping contexts to hidden features
+        :type trunk: chainer.Link
+
+        :param nr_heads: The number of heads M
+        :type nr_heads: int
+
+        :param k: The number of actions
+        :type k: int
+
+        :param size: The number of hidden features or None to infer it from
+                     the output of the trunk
+        :type size: int|None
+
+        :param optimizer: The optimizer used by update to train the trunk and
+                          the heads or None if the ensemble is trained
+                          elsewhere (e.g. with bootstrap_loss)
+        :type optimizer: chainer.Optimizer|None
+        """
+        super().__init__(trunk=trunk, heads=L.Linear(size, nr_heads * k))
+        self.nr_heads = nr_heads
+        self.k = k
+        self.optimizer = optimizer
+        if optimizer is not None:
+            optimizer.setup(self)
+
+    def predict_heads(self, x):
+        """
+        Predicts the rewards of all actions by all heads
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :return: The predictions, of shape (n, nr_heads, k)
+        :rtype: chainer.Variable
+        """
+        return F.reshape(self.heads(self.trunk(x)),
+                         (x.shape[0], self.nr_heads, self.k))
+
+    def draw(self, x):
+        xp = cuda.get_array_module(x)
+        best = self._best(x)
+        heads = xp.random.randint(self.nr_heads, size=x.shape[0])
+        return as_variable(best[xp.arange(x.shape[0]), heads])
+
+    def max(self, x):
+        # The action that most heads consider best has the highest propensity
+        return F.argmax(self._votes(self._best(x)), axis=1)
+
+    def uniform(self, x):
+        xp = cuda.get_array_module(x)
+        return as_variable(xp.random.randint(self.k, size=x.shape[0]))
+
+    def nr_actions(self, x):
+        xp = cuda.get_array_module(x)
+        return as_variable(xp.ones(x.shape[0]) * self.k)
+
+    def log_nr_actions(self, x):
+        return F.log(self.nr_actions(x))
+
+    def propensity(self, x, action):
+        votes = self._votes(self._best(x))
+        return F.select_item(votes, action.data) / self.nr_heads
+
+    def log_propensity(self, x, action):
+        return F.log(self.propensity(x, action))
+
+    def update(self, x, actions, log_p, rewards):
+        if self.optimizer is None:
+            return
+        loss = self.bootstrap_loss(x, actions, rewards)
+        self.cleargrads()
+        loss.backward()
+        self.optimizer.update()
+
+    def bootstrap_loss(self, x, actions, rewards, weights=None):
+        """
+        Computes the squared error of the predicted rewards of the played
+        actions, weighted per row and head by bootstrap weights
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param actions: The played actions
+        :type actions: chainer.Variable
+
+        :param rewards: The observed rewards
+        :type rewards: chainer.Variable
+
+        :param weights: The weights of shape (n, nr_heads) or None to draw
+                        Poisson(1) weights
+        :type weights: numpy.ndarray|cupy.ndarray|None
+
+        :return: The mean weighted loss
+        :rtype: chainer.Variable
+        """
+        xp = cuda.get_array_module(x)
+        n = x.shape[0]
+        if weights is None:
+            weights = xp.random.poisson(1.0, size=(n, self.nr_heads))
+        predictions = F.reshape(self.predict_heads(x),
+                                (n * self.nr_heads, self.k))
+        played = xp.repeat(as_variable(actions).data.astype('i'),
+                           self.nr_heads)
+        predictions = F.reshape(F.select_item(predictions, played),
+                                (n, self.nr_heads))
+        targets = xp.broadcast_to(as_variable(rewards).data[:, None],
+                                  predictions.shape)
+        errors = F.squared_error(predictions,
+                                 targets.astype(predictions.dtype))
+        return F.mean(errors * weights.astype(predictions.dtype))
+
+    def _best(self, x):
+        """
+        Computes the best action of every head
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :return: The best actions, of shape (n, nr_heads)
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        return self.predict_heads(x).data.argmax(axis=2).astype('i')
+
+    def _votes(self, best):
+        """
+        Counts how many heads consider every action best
+
+        :param best: The best actions of every head, of shape (n, nr_heads)
+        :type best: numpy.ndarray|cupy.ndarray
+
+        :return: The number of votes of every action, of shape (n, k)
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        xp = cuda.get_array_module(best)
+        return xp.sum(best[:, :, None] == xp.arange(self.k), axis=1) * 1.0
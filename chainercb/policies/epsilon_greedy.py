@@ -40,6 +40,21 @@ class EpsilonGreedy(Policy):
         # probability epsilon from uniform
         return as_variable(((1 - draw) * from_max.data + draw * from_uniform.data).astype('I'))
 
+    def fast_draw(self, x):
+        xp = cuda.get_array_module(x)
+        from_max = self.fast_max(x)
+        from_uniform = self.fast_uniform(x)
+        draw = xp.random.random((x.shape[0])) < self.epsilon
+        draw = draw.reshape([draw.shape[0] if i == 0 else 1
+                             for i in range(from_max.ndim)])
+        return xp.where(draw, from_uniform, from_max).astype('I')
+
+    def fast_max(self, x):
+        return self.policy.fast_max(x)
+
+    def fast_uniform(self, x):
+        return self.policy.fast_uniform(x)
+
     def max(self, x):
         return self.policy.max(x)
 
@@ -68,15 +83,42 @@ class EpsilonGreedy(Policy):
         return as_variable(p.astype(dtype=x.dtype))
 
     def log_propensity(self, x, action):
+        return self._log_propensity(x, action, self.max(x),
+                                    self.nr_actions(x),
+                                    self.log_nr_actions(x))
+
+    def _log_propensity(self, x, action, max_action, nr_actions,
+                        log_nr_actions):
+        """
+        Computes the log propensity scores from the outputs of the underlying
+        policy, so that these can be shared by epsilon greedy policies that
+        wrap the same policy
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param action: The actions
+        :type action: chainer.Variable
+
+        :param max_action: The best actions of the underlying policy
+        :type max_action: chainer.Variable
+
+        :param nr_actions: The number of actions of the underlying policy
+        :type nr_actions: chainer.Variable
+
+        :param log_nr_actions: The logarithm of the number of actions
+        :type log_nr_actions: chainer.Variable
+
+        :return: The log propensity score(s) of the given action(s)
+        :rtype: chainer.Variable
+        """
         xp = cuda.get_array_module(x, action)
-        max_action = self.max(x)
         if action.ndim > 1:
             p = 1.0 * (xp.all(action.data == max_action.data, axis=1))
         else:
             p = 1.0 * (action.data == max_action.data)
         p_inv = 1.0 - p
-        nr_a = self.nr_actions(x).data
-        nr_a[nr_a == 0.0] = 1.0
+        nr_a = xp.where(nr_actions.data == 0.0, 1.0, nr_actions.data)
         p *= xp.log(1 - self.epsilon + self.epsilon / nr_a)
-        p_inv *= xp.log(self.epsilon) - self.log_nr_actions(x).data
+        p_inv *= xp.log(self.epsilon) - log_nr_actions.data
         return as_variable(as_variable(p + p_inv).data.astype(dtype=x.dtype))
@@ -16,6 +16,15 @@ class Explore(Policy):
     def draw(self, x):
         return self.uniform(x)
 
+    def fast_draw(self, x):
+        return self.fast_uniform(x)
+
+    def fast_max(self, x):
+        return self.policy.fast_max(x)
+
+    def fast_uniform(self, x):
+        return self.policy.fast_uniform(x)
+
     def max(self, x):
         return self.policy.max(x)
 
@@ -0,0 +1,131 @@
+import numpy as np
+import chainer
+from chainer import as_variable, cuda, functions as F, initializers
+from chainercb.policy import Policy
+
+
+class HierarchicalSoftmax(Policy):
+    def __init__(self, predictor, k, in_size, tau=1.0, initialW=None):
+        """
+        A softmax policy for very large action spaces. The k actions are the
+        leaves of a balanced binary tree and every internal node makes a
+        logistic left/right decision based on the output of the predictor. The
+        probability of an action is the product of the decisions on the path
+        from the root to its leaf, so sampling and computing (log) propensities
+        costs O(log k) per context instead of O(k).
+
+        :param predictor: The predictor function producing a representation of
+                          the context vectors of size in_size
+        :type predictor: chainer.Link
+
+        :param k: The number of actions (at least 2)
+        :type k: int
+
+        :param in_size: The size of the output of the predictor
+        :type in_size: int
+
+        :param tau: The temperature parameter dictating the smoothness of the
+                    decisions in the tree
+        :type tau: float
+
+        :param initialW: The initializer of the weights of the internal nodes
+        :type initialW: chainer.Initializer|numpy.ndarray|None
+        """
+        super().__init__(predictor=predictor)
+        if k < 2:
+            raise ValueError(f'a hierarchical softmax needs at least 2 '
+                             f'actions, but {k} are given')
+        self.k = k
+        self.tau = tau
+        if initialW is None:
+            initialW = initializers.Normal(1.0 / np.sqrt(in_size))
+        with self.init_scope():
+            self.W = chainer.Parameter(initialW, (k - 1, in_size))
+            self.b = chainer.Parameter(0.0, (k - 1,))
+        nodes, codes = _paths(k)
+        self.add_persistent('nodes', nodes)
+        self.add_persistent('codes', codes)
+
+    def draw(self, x):
+        xp = cuda.get_array_module(x)
+        with chainer.no_backprop_mode():
+            h = self.predictor(x).data
+        W = self.W.data
+        b = self.b.data
+
+        # Walk down the tree for all rows at once, a row stops moving as soon
+        # as it reaches a leaf
+        node = xp.zeros(h.shape[0], dtype=np.int32)
+        for _ in range(self.nodes.shape[1]):
+            internal = node < self.k - 1
+            idx = xp.where(internal, node, 0)
+            logit = (xp.sum(W[idx] * h, axis=1) + b[idx]) / self.tau
+            u = xp.random.uniform(0.0, 1.0, node.shape)
+            left = (xp.log(u) - xp.log1p(-u)) < logit
+            child = 2 * node + 1 + (1 - left)
+            node = xp.where(internal, child, node).astype(np.int32)
+        return as_variable(node - (self.k - 1))
+
+    def max(self, x):
+        # Finding the most likely leaf requires looking at all of them, this
+        # costs O(k log k) per context
+        xp = cuda.get_array_module(x)
+        with chainer.no_backprop_mode():
+            h = self.predictor(x).data
+        logits = (xp.dot(h, self.W.data.T) + self.b.data) / self.tau
+        logits = logits[:, self.nodes] * self.codes
+        log_p = -xp.sum(xp.logaddexp(0.0, -logits) * abs(self.codes),
+                        axis=2)
+        return F.argmax(log_p, axis=1)
+
+    def uniform(self, x):
+        xp = cuda.get_array_module(x)
+        return as_variable(xp.random.randint(self.k, size=(x.shape[0])))
+
+    def nr_actions(self, x):
+        xp = cuda.get_array_module(x)
+        return as_variable(xp.ones(x.shape[0]) * self.k)
+
+    def propensity(self, x, action):
+        return F.exp(self.log_propensity(x, action))
+
+    def log_propensity(self, x, action):
+        # Only the nodes on the path of the given action are evaluated
+        h = self.predictor(x)
+        nodes = self.nodes[action.data]
+        codes = self.codes[action.data]
+        w = F.embed_id(nodes, self.W)
+        b = F.embed_id(nodes, F.reshape(self.b, (self.k - 1, 1)))
+        logits = F.matmul(w, F.expand_dims(h, 2)) + b
+        logits = F.reshape(logits, nodes.shape) / self.tau
+        log_p = -F.softplus(-codes * logits) * abs(codes)
+        return F.sum(log_p, axis=1)
+
+
+def _paths(k):
+    """
+    Computes the paths between every leaf and the root of a balanced binary
+    tree with k leaves. The tree is stored in heap order, internal nodes are 0
+    to k - 2 and the leaf of action a is node k - 1 + a.
+
+    :param k: The number of leaves
+    :type k: int
+
+    :return: A matrix with the internal nodes on the path of every leaf and a
+             matrix with the decision codes (1.0 for left, -1.0 for right and
+             0.0 for padding), both of shape (k, depth)
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    nodes = []
+    codes = []
+    node = np.arange(k - 1, 2 * k - 1)
+    while np.any(node > 0):
+        internal = node > 0
+        parent = (node - 1) // 2
+        nodes.append(np.where(internal, parent, 0))
+        codes.append(np.where(internal, np.where(node % 2 == 1, 1.0, -1.0),
+                              0.0))
+        node = np.where(internal, parent, 0)
+    nodes = np.stack(nodes, axis=1).astype(np.int32)
+    codes = np.stack(codes, axis=1).astype(np.float32)
+    return nodes, codes
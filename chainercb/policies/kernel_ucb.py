@@ -0,0 +1,44 @@
+from chainercb.policies.linear_ucb import LinUCBPolicy
+from chainercb.policies.neural_linear import NeuralLinearPolicy
+from chainercb.util import RidgeRegression
+
+
+class KernelUCBPolicy(NeuralLinearPolicy):
+    def __init__(self, k, features, alpha=1.0, regularizer=1.0, device=None,
+                 regressor=RidgeRegression, replay=None):
+        """
+        An approximate kernel UCB policy. Contexts are lifted by a fixed-size
+        approximation of a kernel feature map (e.g. random Fourier features or
+        a Nystroem approximation) and every arm runs a ridge regression UCB in
+        the lifted space. Unlike exact kernel UCB, whose cost grows with the
+        number of observations, memory and time per step are bounded by the
+        number of features.
+
+        :param k: The number of arms (actions)
+        :type k: int
+
+        :param features: The kernel feature map, a link with a size attribute
+                         holding the number of features
+        :type features: chainercb.util.kernel.RandomFourierFeatures|
+                        chainercb.util.kernel.Nystroem
+
+        :param alpha: The variance scaling factor for UCB
+        :type alpha: float
+
+        :param regularizer: The ridge regression regularization constant
+        :type regularizer: float
+
+        :param device: The GPU device to use or None to use CPU
+        :type device: int|None
+
+        :param regressor: The regressor class (or factory taking d, alpha,
+                          regularization and device) of every arm
+        :type regressor: callable
+
+        :param replay: A replay buffer to which every update is logged, so
+                       that the arms can be refitted with rebuild, or None
+        :type replay: chainercb.util.ReplayBuffer|None
+        """
+        head = LinUCBPolicy(k, features.size, alpha, regularizer, device,
+                            regressor=regressor)
+        super().__init__(features, head, replay)
@@ -1,15 +1,32 @@
-from chainer import cuda, functions as F, as_variable
+import chainer
+import numpy as np
+from chainer import cuda, functions as F, as_variable, Variable
 
 from chainercb.policy import Policy
-from chainercb.util import RidgeRegression
+from chainercb.util import ArmRegistry, RidgeRegression, TieredArmRegistry
 
 
 class LinearPolicy(Policy):
     """
     A strictly linear, finite-arm, policy that uses a per-arm regressor.
+
+    Most methods accept an optional eligibility mask, a boolean matrix of shape
+    (n, k) where entry (i, a) indicates whether arm a may be played for context
+    i. Arms that are not eligible for a row are skipped entirely, so scoring
+    only costs as much as the number of eligible (row, arm) pairs. Every row
+    needs at least one eligible arm to select an action for it, drawing for a
+    row without any raises a ValueError.
+
+    Arms can be added and removed at any time, removed arms are treated as
+    ineligible for every row. Feedback for arms that were removed after their
+    action was logged is dropped (and counted in stale_feedback), as is
+    feedback for an id that was reused by a newer arm when the generations of
+    the logged actions are passed to update.
     """
 
-    def __init__(self, k, d, alpha=1.0, regularizer=1.0, device=None):
+    def __init__(self, k, d, alpha=1.0, regularizer=1.0, device=None,
+                 capacity=None, resident=None, directory=None,
+                 regressor=RidgeRegression):
         """
         :param k: The number of arms (actions)
         :type k: int
@@ -25,34 +42,360 @@ class LinearPolicy(Policy):
 
         :param device: The GPU device to use or None to use CPU
         :type device: int|None
+
+        :param capacity: The number of arms to preallocate storage for or None
+                         to only allocate storage for k arms
+        :type capacity: int|None
+
+        :param resident: The maximum number of arms to keep in memory, the
+                         least recently used arms beyond this budget are
+                         evicted to disk. None keeps all arms in memory
+        :type resident: int|None
+
+        :param directory: The directory for the on-disk store of evicted arms
+                          or None to use a temporary directory
+        :type directory: str|None
+
+        :param regressor: The regressor class (or factory taking d, alpha,
+                          regularization and device) of every arm, e.g.
+                          a windowed or discounted ridge regression
+        :type regressor: callable
         """
         super().__init__()
-        self.k = k
         self.d = d
-        self.regressors = [RidgeRegression(d, alpha, regularizer, device)
-                           for _ in range(self.k)]
+        capacity = max(k, capacity or 0)
+        if resident is None:
+            self.regressors = ArmRegistry(d, alpha, regularizer, device,
+                                          capacity, regressor)
+        else:
+            self.regressors = TieredArmRegistry(d, alpha, regularizer, device,
+                                                capacity, resident, directory,
+                                                regressor)
+        for _ in range(k):
+            self.regressors.add()
+        self._buffers = {}
+        self.stale_feedback = 0
 
-    def max(self, x):
-        xp = cuda.get_array_module(x)
-        pred = [self.regressors[a].predict(x).data for a in range(self.k)]
-        pred = [xp.reshape(p, (p.shape[0], 1)) for p in pred]
-        pred = xp.hstack(pred)
+    @property
+    def k(self):
+        """
+        :return: The width of the action space, that is, one more than the
+                 largest arm id in use (removed arms are never played)
+        :rtype: int
+        """
+        return self.regressors.size
+
+    def add_arm(self):
+        """
+        Adds a new arm to this policy. Its id is either a previously removed id
+        or k, in which case the action space grows by one.
+
+        :return: The id of the new arm
+        :rtype: int
+        """
+        return self.regressors.add()
+
+    def remove_arm(self, arm):
+        """
+        Retires an arm from this policy, it will no longer be played
+
+        :param arm: The id of the arm to remove
+        :type arm: int
+        """
+        self.regressors.remove(arm)
+
+    def arm_generations(self, actions):
+        """
+        Gets the current generations of the arms of given actions, which can be
+        logged with the actions and passed to update with their feedback
+
+        :param actions: The actions
+        :type actions: chainer.Variable|numpy.ndarray|cupy.ndarray
+
+        :return: The generations, -1 for arms that are not in use
+        :rtype: numpy.ndarray
+        """
+        actions = cuda.to_cpu(getattr(actions, 'data', actions))
+        return self.regressors.generations[actions]
+
+    def reset(self):
+        """
+        Resets the regressors of all arms in use to their initial state, e.g.
+        before refitting them on different features
+        """
+        for a in self.regressors.ids:
+            self.regressors.reset(a)
+
+    def max(self, x, mask=None):
+        pred = self._scores(x, lambda r, c_x: r.predict(c_x), mask)
         return F.argmax(pred, axis=1)
 
-    def uniform(self, x):
+    def uniform(self, x, mask=None):
+        xp = cuda.get_array_module(x)
+        mask = self._selection_mask(x, mask)
+        if mask is None:
+            return as_variable(xp.random.randint(self.k, size=(x.shape[0])))
+
+        # Sample uniformly among the eligible arms of every row by taking the
+        # arg max of uniform noise where ineligible arms can never win
+        r = xp.random.random(mask.shape)
+        r[~mask] = -1.0
+        return F.argmax(r, axis=1)
+
+    def fast_max(self, x, mask=None):
+        scores = self._fast_scores(x, mask)
+        if scores is None:
+            with chainer.no_backprop_mode():
+                return self.max(x, mask).data
+        return scores.argmax(axis=1).astype(np.int32)
+
+    def fast_uniform(self, x, mask=None):
         xp = cuda.get_array_module(x)
-        return as_variable(xp.random.randint(self.k, size=(x.shape[0])))
+        if mask is None and len(self.regressors) == self.k:
+            return xp.random.randint(self.k, size=(x.shape[0]))
+        with chainer.no_backprop_mode():
+            return self.uniform(x, mask).data
 
-    def nr_actions(self, x):
+    def nr_actions(self, x, mask=None):
         xp = cuda.get_array_module(x)
-        return as_variable(xp.ones(x.shape[0]) * self.k)
+        mask = self._mask(x, mask)
+        if mask is None:
+            return as_variable(xp.ones(x.shape[0]) * self.k)
+        return as_variable(xp.sum(mask, axis=1) * 1.0)
+
+    def log_nr_actions(self, x, mask=None):
+        return F.log(self.nr_actions(x, mask))
+
+    def update(self, x, actions, log_p, rewards, generations=None):
+        """
+        Updates the regressors of the played arms, feedback for arms that are
+        no longer in use (or whose id was reused since) is dropped
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param actions: The played actions
+        :type actions: chainer.Variable
+
+        :param log_p: The log propensity scores of the actions
+        :type log_p: chainer.Variable
 
-    def log_nr_actions(self, x):
-        return F.log(self.nr_actions(x))
+        :param rewards: The rewards
+        :type rewards: chainer.Variable
 
-    def update(self, x, actions, log_p, rewards):
+        :param generations: The generations of the arms when the actions were
+                            played (see arm_generations) or None to only drop
+                            feedback for arms that are not in use
+        :type generations: numpy.ndarray|None
+        """
         xp = cuda.get_array_module(actions)
+        current = self.arm_generations(actions)
+        valid = current >= 0
+        if generations is not None:
+            valid &= current == cuda.to_cpu(generations)
+        if not valid.all():
+            self.stale_feedback += int((~valid).sum())
+            valid = xp.asarray(valid)
+            x = as_variable(x.data[valid])
+            actions = as_variable(actions.data[valid])
+            rewards = as_variable(rewards.data[valid])
         for a in xp.unique(actions.data):
             c_x = x.data[actions.data == a, :]
             c_r = rewards.data[actions.data == a]
             self.regressors[a].update(as_variable(c_x), as_variable(c_r))
+
+    def _mask(self, x, mask=None):
+        """
+        Combines an eligibility mask with the arms that are currently in use
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param mask: The eligibility mask of shape (n, k) or None
+        :type mask: chainer.Variable|numpy.ndarray|cupy.ndarray|None
+
+        :return: The boolean eligibility mask, or None if every arm is eligible
+                 for every row
+        :rtype: numpy.ndarray|cupy.ndarray|None
+        """
+        xp = cuda.get_array_module(x)
+        if len(self.regressors) == self.k:
+            return None if mask is None else _as_mask(mask)
+        active = self.regressors.active
+        if mask is None:
+            return xp.broadcast_to(active, (x.shape[0], self.k))
+        return _as_mask(mask) & active
+
+    def _selection_mask(self, x, mask=None):
+        """
+        Combines an eligibility mask with the arms that are currently in use,
+        for selecting an action in every row
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param mask: The eligibility mask of shape (n, k) or None
+        :type mask: chainer.Variable|numpy.ndarray|cupy.ndarray|None
+
+        :return: The boolean eligibility mask, or None if every arm is eligible
+                 for every row
+        :rtype: numpy.ndarray|cupy.ndarray|None
+        """
+        xp = cuda.get_array_module(x)
+        mask = self._mask(x, mask)
+        if mask is None and (self.k > 0 or x.shape[0] == 0):
+            return mask
+        if mask is None or not xp.all(xp.any(mask, axis=1)):
+            raise ValueError('no arm is eligible for some rows, an action '
+                             'can only be selected for rows with at least one '
+                             'eligible arm')
+        return mask
+
+    def _scores(self, x, score, mask=None):
+        """
+        Computes a matrix of per-arm scores for given batch of context vectors
+        x. When a mask is given, every arm is only scored on the rows for which
+        it is eligible and arms that are eligible for no row at all are not
+        touched. Skipped entries receive a score of -inf.
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param score: Function that scores a batch of contexts for a regressor
+        :type score: (chainercb.util.RidgeRegression, chainer.Variable) ->
+                     chainer.Variable
+
+        :param mask: The eligibility mask of shape (n, k) or None
+        :type mask: chainer.Variable|numpy.ndarray|cupy.ndarray|None
+
+        :return: The scores, matrix of shape (n, k)
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        xp = cuda.get_array_module(x)
+        x = as_variable(x)
+        mask = self._selection_mask(x, mask)
+        if mask is None:
+            scores = [score(self.regressors[a], x).data for a in range(self.k)]
+            scores = [xp.reshape(s, (s.shape[0], 1)) for s in scores]
+            return xp.hstack(scores)
+
+        scores = xp.full((x.shape[0], self.k), -xp.inf, dtype=x.dtype)
+        for a in _eligible_arms(mask):
+            rows = mask[:, a]
+            c_x = as_variable(x.data[rows, :])
+            scores[rows, a] = score(self.regressors[a], c_x).data
+        return scores
+
+    def _fast_scores(self, x, mask=None, ucb=False):
+        """
+        Computes a matrix of per-arm predictions (or upper confidence bounds)
+        directly from the stacked state of all arms, without going through the
+        individual regressors. Intermediate results are written to buffers that
+        are reused between calls with the same batch size.
+
+        :param x: The context vectors
+        :type x: numpy.ndarray|cupy.ndarray
+
+        :param mask: The eligibility mask of shape (n, k) or None
+        :type mask: chainer.Variable|numpy.ndarray|cupy.ndarray|None
+
+        :param ucb: Whether to add the upper confidence bound
+        :type ucb: bool
+
+        :return: The scores, matrix of shape (n, k), where ineligible entries
+                 are -inf, or None if the arm state is not stored in slabs
+        :rtype: numpy.ndarray|cupy.ndarray|None
+        """
+        if isinstance(self.regressors, TieredArmRegistry):
+            return None
+        xp = cuda.get_array_module(x)
+        if isinstance(x, Variable):
+            x = x.data
+        n = x.shape[0]
+        theta = self.regressors.slab('_theta', serving=True)
+        scores = self._workspace('scores', (n, self.k), theta.dtype)
+        xp.matmul(x, theta.T, out=scores)
+        if ucb:
+            dev = self._fast_deviations(x)
+            scores += self.regressors._prototype._alpha * dev.T
+        mask = self._selection_mask(x, mask)
+        if mask is not None:
+            scores[~mask] = -xp.inf
+        return scores
+
+    def _fast_deviations(self, x):
+        """
+        Computes the standard deviations of the per-arm predictions directly
+        from the stacked state of all arms
+
+        :param x: The context vectors
+        :type x: numpy.ndarray|cupy.ndarray
+
+        :return: The deviations, matrix of shape (k, n), which is a buffer that
+                 is overwritten by the next call
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        xp = cuda.get_array_module(x)
+        n = x.shape[0]
+
+        # The variance of arm a for row i is x_i^T A_a^-1 x_i
+        A_inv = self.regressors.slab('_A_inv', serving=True)
+        x_A = self._workspace('x_A', (self.k, n, self.d), A_inv.dtype)
+        xp.matmul(x, A_inv, out=x_A)
+        x_A *= x
+        dev = self._workspace('dev', (self.k, n), A_inv.dtype)
+        xp.sum(x_A, axis=2, out=dev)
+        xp.sqrt(dev, out=dev)
+        return dev
+
+    def _workspace(self, name, shape, dtype):
+        """
+        Returns a named scratch buffer, which is only reallocated when the
+        requested shape or dtype changes. Its contents are undefined.
+
+        :param name: The name of the buffer
+        :type name: str
+
+        :param shape: The shape of the buffer
+        :type shape: tuple of int
+
+        :param dtype: The data type of the buffer
+        :type dtype: numpy.dtype
+
+        :return: The buffer
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self._buffers[name] = self.regressors.xp.empty(shape,
+                                                                    dtype)
+        return buffer
+
+
+def _as_mask(mask):
+    """
+    Converts an eligibility mask to a boolean array
+
+    :param mask: The eligibility mask
+    :type mask: chainer.Variable|numpy.ndarray|cupy.ndarray
+
+    :return: The eligibility mask as a boolean array
+    :rtype: numpy.ndarray|cupy.ndarray
+    """
+    if isinstance(mask, Variable):
+        mask = mask.data
+    return mask.astype(bool, copy=False)
+
+
+def _eligible_arms(mask):
+    """
+    Lists the arms that are eligible for at least one row of the mask
+
+    :param mask: The boolean eligibility mask of shape (n, k)
+    :type mask: numpy.ndarray|cupy.ndarray
+
+    :return: The indices of the eligible arms
+    :rtype: list of int
+    """
+    xp = cuda.get_array_module(mask)
+    return [int(a) for a in xp.flatnonzero(xp.any(mask, axis=0))]
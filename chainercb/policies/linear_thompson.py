@@ -1,7 +1,10 @@
 from math import factorial
-from chainer import cuda, functions as F, as_variable
 
-from chainercb.policies.linear import LinearPolicy
+import numpy as np
+from chainer import cuda, functions as F, as_variable, Variable
+
+from chainercb.policies.linear import LinearPolicy, _eligible_arms
+from chainercb.util import TieredArmRegistry
 from chainercb.util import select_items_per_row
 
 
@@ -9,24 +12,78 @@ class ThompsonPolicy(LinearPolicy):
     """
     A strictly linear policy that uses thompson sampling to draw actions.
     """
-    def draw(self, x):
-        xp = cuda.get_array_module(x)
-        ts = [self.regressors[a].thompson(x).data for a in range(self.k)]
-        ts = [xp.reshape(t, (t.shape[0], 1)) for t in ts]
-        ts = xp.hstack(ts)
+    def draw(self, x, mask=None):
+        ts = self._scores(x, lambda r, c_x: r.thompson(c_x), mask)
         return F.argmax(ts, axis=1)
 
-    def propensity(self, x, action):
+    def fast_draw(self, x, mask=None):
+        xp = cuda.get_array_module(x)
+        if isinstance(x, Variable):
+            x = x.data
+
+        # Sample one parameter vector per arm and score all arms with a single
+        # product. The normal noise is drawn in the same order as draw, so both
+        # consume the random state identically
+        mask = self._selection_mask(x, mask)
+        arms = list(range(self.k)) if mask is None else _eligible_arms(mask)
+        thetas = self._workspace('thetas', (self.k, self.d), np.float64)
+        thetas.fill(0.0)
+        u = xp.random.standard_normal(size=(len(arms), self.d))
+        if isinstance(self.regressors, TieredArmRegistry):
+            for i, a in enumerate(arms):
+                regressor = self.regressors[a]
+                theta = getattr(regressor, regressor.serving_field('_theta'))
+                thetas[a] = theta + xp.matmul(
+                    regressor._cholesky_decomposition(), u[i])
+        elif len(arms) > 0:
+            # The cached decompositions are read from their slab, only the
+            # arms that were updated since are decomposed again, in a batch
+            cho = self.regressors.slab('_cho')
+            valid = self.regressors.slab('_cho_valid')
+            stale = [a for a in arms if not valid[a, 0]]
+            if stale:
+                try:
+                    cho[stale] = xp.linalg.cholesky(
+                        self.regressors.slab('_A_inv')[stale])
+                    valid[stale] = True
+                except np.linalg.LinAlgError:
+                    # Some inverse drifted and is no longer positive definite
+                    for a in stale:
+                        self.regressors[a]._cholesky_decomposition()
+            cho = cho[arms]
+            theta = self.regressors.slab('_theta', serving=True)[arms]
+            thetas[arms] = theta + xp.matmul(cho, u[:, :, None])[:, :, 0]
+        scores = self._workspace('scores', (x.shape[0], self.k), np.float64)
+        xp.matmul(x, thetas.T, out=scores)
+        if mask is not None:
+            scores[~mask] = -xp.inf
+        return scores.argmax(axis=1).astype(np.int32)
+
+    def propensity(self, x, action, mask=None):
         xp = cuda.get_array_module(x)
         """: type: numpy"""
 
+        # Only the arms that are eligible for some row take part in the
+        # computation, all other arms can never be drawn
+        mask = self._mask(x, mask)
+        if mask is None:
+            arms = list(range(self.k))
+            eligible = None
+        else:
+            arms = _eligible_arms(mask)
+            eligible = mask[:, arms]
+            if len(arms) == 0:
+                return as_variable(xp.zeros(action.shape))
+
         # Compute independent thompson sample distributions
-        z_means = xp.zeros((x.shape[0], self.k))
-        z_std = xp.zeros((x.shape[0], self.k))
-        for a in range(self.k):
-            m, s = self.regressors[a].thompson_distribution(x)
-            z_means[:, a] = m.data
-            z_std[:, a] = s.data
+        z_means = xp.zeros((x.shape[0], len(arms)))
+        z_std = xp.ones((x.shape[0], len(arms)))
+        for i, a in enumerate(arms):
+            rows = slice(None) if eligible is None else eligible[:, i]
+            m, s = self.regressors[a].thompson_distribution(
+                as_variable(as_variable(x).data[rows, :]))
+            z_means[rows, i] = m.data
+            z_std[rows, i] = s.data
 
         # Compute the argmax probability
         m_i, m_j = _tiles(z_means)
@@ -37,14 +94,29 @@ class ThompsonPolicy(LinearPolicy):
 
         opts = factorial(self.k - 1)
 
-        res = xp.prod(0.5 * (1 + F.erf(c_m / (xp.sqrt(2) * c_s)).data), axis=2)
+        res = 0.5 * (1 + F.erf(c_m / (xp.sqrt(2) * c_s)).data)
+        if eligible is not None:
+            # Ineligible arms are never drawn, so comparisons against them
+            # always succeed and their own propensity is zero
+            e_j = _cut_diagonals(_tiles(eligible * 1.0)[1]).data
+            res = xp.where(e_j > 0.0, res, 1.0)
+        res = xp.prod(res, axis=2)
+
+        if eligible is None:
+            a = F.reshape(action, (action.shape[0], 1))
+            res = select_items_per_row(as_variable(res), a)
+            return F.reshape(res, action.shape)
 
-        a = F.reshape(action, (action.shape[0], 1))
+        res *= eligible
+        arms = xp.asarray(arms, dtype=action.dtype)
+        column = xp.minimum(xp.searchsorted(arms, action.data), len(arms) - 1)
+        found = (arms[column] == action.data) * 1.0
+        a = as_variable(xp.reshape(column, (action.shape[0], 1)))
         res = select_items_per_row(as_variable(res), a)
-        return F.reshape(res, action.shape)
+        return F.reshape(res, action.shape) * found
 
-    def log_propensity(self, x, action):
-        return F.log(self.propensity(x, action))
+    def log_propensity(self, x, action, mask=None):
+        return F.log(self.propensity(x, action, mask))
 
 
 def _tiles(x):
@@ -1,6 +1,9 @@
-from chainer import cuda, functions as F, as_variable
+import chainer
+import numpy as np
+from chainer import cuda, functions as F, as_variable, Variable
 
 from chainercb.policies.linear import LinearPolicy
+from chainercb.util import TieredArmRegistry
 
 
 class LinUCBPolicy(LinearPolicy):
@@ -8,15 +11,114 @@ class LinUCBPolicy(LinearPolicy):
     A strictly linear policy that uses a per-arm Upper Confidence Bound
     estimation of performance.
     """
-    def draw(self, x):
-        xp = cuda.get_array_module(x)
-        ucbs = [self.regressors[a].ucb(x).data for a in range(self.k)]
-        ucbs = [xp.reshape(ucb, (ucb.shape[0], 1)) for ucb in ucbs]
-        ucbs = xp.hstack(ucbs)
+    def draw(self, x, mask=None):
+        ucbs = self._scores(x, lambda r, c_x: r.ucb(c_x), mask)
         return F.argmax(ucbs, axis=1)
 
-    def propensity(self, x, action):
-        return as_variable(1.0 * (self.draw(x).data == action.data))
+    def fast_draw(self, x, mask=None):
+        scores = self._fast_scores(x, mask, ucb=True)
+        if scores is None:
+            with chainer.no_backprop_mode():
+                return self.draw(x, mask).data
+        return scores.argmax(axis=1).astype(np.int32)
+
+    def propensity(self, x, action, mask=None):
+        return as_variable(1.0 * (self.draw(x, mask).data == action.data))
+
+    def log_propensity(self, x, action, mask=None):
+        return F.log(self.propensity(x, action, mask))
+
+    def draw_alphas(self, x, alphas, mask=None):
+        """
+        Draws actions for every value of the variance scaling factor alpha in
+        a grid. The means and deviations are computed only once, so evaluating
+        many alphas costs little more than evaluating one.
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param alphas: The values of alpha, vector of shape (m)
+        :type alphas: numpy.ndarray|cupy.ndarray|list of float
+
+        :param mask: The eligibility mask of shape (n, k) or None
+        :type mask: chainer.Variable|numpy.ndarray|cupy.ndarray|None
+
+        :return: The actions for every alpha, matrix of shape (m, n)
+        :rtype: chainer.Variable
+        """
+        mean, dev = self._moments(x, mask)
+        return as_variable(_argmax_alphas(mean, dev, alphas))
+
+    def propensity_alphas(self, x, action, alphas, mask=None):
+        """
+        Computes the propensity scores of a batch of actions for every value of
+        alpha in a grid
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param action: The actions
+        :type action: chainer.Variable
+
+        :param alphas: The values of alpha, vector of shape (m)
+        :type alphas: numpy.ndarray|cupy.ndarray|list of float
+
+        :param mask: The eligibility mask of shape (n, k) or None
+        :type mask: chainer.Variable|numpy.ndarray|cupy.ndarray|None
+
+        :return: The propensity scores for every alpha, matrix of shape (m, n)
+        :rtype: chainer.Variable
+        """
+        drawn = self.draw_alphas(x, alphas, mask).data
+        return as_variable(1.0 * (drawn == action.data[None, :]))
 
-    def log_propensity(self, x, action):
-        return F.log(self.propensity(x, action))
+    def log_propensity_alphas(self, x, action, alphas, mask=None):
+        return F.log(self.propensity_alphas(x, action, alphas, mask))
+
+    def _moments(self, x, mask=None):
+        """
+        Computes the per-arm means and standard deviations of the predictions
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param mask: The eligibility mask of shape (n, k) or None
+        :type mask: chainer.Variable|numpy.ndarray|cupy.ndarray|None
+
+        :return: The means and deviations, both matrices of shape (n, k), where
+                 ineligible entries have a mean of -inf and a deviation of 0
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        xp = cuda.get_array_module(x)
+        if isinstance(self.regressors, TieredArmRegistry):
+            mean = self._scores(x, lambda r, c_x: r.predict(c_x), mask)
+            dev = self._scores(
+                x, lambda r, c_x: r.thompson_distribution(c_x)[1], mask)
+        else:
+            x = x.data if isinstance(x, Variable) else x
+            mean = self._fast_scores(x, mask).copy()
+            dev = self._fast_deviations(x).T.copy()
+        dev[~xp.isfinite(mean)] = 0.0
+        return mean, dev
+
+
+def _argmax_alphas(mean, dev, alphas):
+    """
+    Computes the arg max of the upper confidence bounds for every alpha
+
+    :param mean: The means, matrix of shape (n, k)
+    :type mean: numpy.ndarray|cupy.ndarray
+
+    :param dev: The standard deviations, matrix of shape (n, k)
+    :type dev: numpy.ndarray|cupy.ndarray
+
+    :param alphas: The values of alpha, vector of shape (m)
+    :type alphas: numpy.ndarray|cupy.ndarray|list of float
+
+    :return: The arg max for every alpha, matrix of shape (m, n)
+    :rtype: numpy.ndarray|cupy.ndarray
+    """
+    xp = cuda.get_array_module(mean)
+    alphas = xp.asarray(alphas, dtype=mean.dtype)
+    ucbs = mean[None, :, :] + alphas[:, None, None] * dev[None, :, :]
+    return xp.argmax(ucbs, axis=2).astype(np.int32)
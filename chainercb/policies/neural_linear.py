@@ -0,0 +1,139 @@
+import chainer
+from chainer import as_variable, Variable
+
+from chainercb.policy import Policy
+
+
+class NeuralLinearPolicy(Policy):
+    def __init__(self, features, head, replay=None):
+        """
+        A policy that combines a learned representation with the closed-form
+        uncertainty of a linear policy. A feature extractor maps contexts to
+        embeddings on which a linear head (e.g. a LinUCBPolicy or a
+        ThompsonPolicy with a ridge regression per arm) acts.
+
+        The embedding of the most recent batch is cached, so calling draw,
+        propensity and update on the same batch runs the feature extractor only
+        once. The cache is keyed by the identity of the context array, so a
+        batch should not be modified in place between calls.
+
+        Updates only update the head. When the feature extractor is retrained,
+        the statistics of the head no longer match the embeddings and they are
+        rebuilt in bulk from the logged feedback in a replay buffer with
+        rebuild.
+
+        :param features: The feature extractor, mapping contexts to embeddings
+                         of the dimensionality of the head
+        :type features: chainer.Link
+
+        :param head: The linear policy acting on the embeddings
+        :type head: chainercb.policies.linear.LinearPolicy
+
+        :param replay: A replay buffer to which every update is logged, so
+                       that rebuild can refit the head, or None
+        :type replay: chainercb.util.ReplayBuffer|None
+        """
+        super().__init__(features=features, head=head)
+        self.replay = replay
+        self._cache = None
+
+    def embed(self, x):
+        """
+        Computes the embeddings of a batch of contexts, without building a
+        computational graph and with the feature extractor in test mode. The
+        embeddings of the most recent batch are cached.
+
+        :param x: The context vectors
+        :type x: chainer.Variable|numpy.ndarray|cupy.ndarray
+
+        :return: The embeddings
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        if isinstance(x, Variable):
+            x = x.data
+        if self._cache is not None and self._cache[0] is x:
+            return self._cache[1]
+        z = self._embed_uncached(x)
+        self._cache = (x, z)
+        return z
+
+    def invalidate(self):
+        """
+        Clears the cached embeddings, this is required after the feature
+        extractor changed
+        """
+        self._cache = None
+
+    def rebuild(self, replay=None, batch_size=1024):
+        """
+        Refits the head on the embeddings of all logged feedback in a replay
+        buffer, e.g. after the feature extractor was retrained. The buffer is
+        traversed in large batches, so every arm only solves its regression
+        once per batch.
+
+        :param replay: The replay buffer or None to use the replay buffer of
+                       this policy
+        :type replay: chainercb.util.ReplayBuffer|None
+
+        :param batch_size: The number of rows per batch
+        :type batch_size: int
+        """
+        replay = replay if replay is not None else self.replay
+        if replay is None:
+            raise ValueError('no replay buffer to rebuild from is given')
+        self.invalidate()
+        self.head.reset()
+        for batch in replay.views(batch_size):
+            z = self._embed_uncached(batch.x)
+            self.head.update(as_variable(z), batch.actions, batch.log_p,
+                             batch.rewards)
+
+    def draw(self, x, mask=None):
+        return self.head.draw(as_variable(self.embed(x)), mask)
+
+    def max(self, x, mask=None):
+        return self.head.max(as_variable(self.embed(x)), mask)
+
+    def uniform(self, x, mask=None):
+        # Uniform actions only depend on the batch size
+        return self.head.uniform(x, mask)
+
+    def fast_draw(self, x, mask=None):
+        return self.head.fast_draw(self.embed(x), mask)
+
+    def fast_max(self, x, mask=None):
+        return self.head.fast_max(self.embed(x), mask)
+
+    def fast_uniform(self, x, mask=None):
+        return self.head.fast_uniform(x, mask)
+
+    def nr_actions(self, x, mask=None):
+        return self.head.nr_actions(x, mask)
+
+    def log_nr_actions(self, x, mask=None):
+        return self.head.log_nr_actions(x, mask)
+
+    def propensity(self, x, action, mask=None):
+        return self.head.propensity(as_variable(self.embed(x)), action, mask)
+
+    def log_propensity(self, x, action, mask=None):
+        return self.head.log_propensity(as_variable(self.embed(x)), action,
+                                        mask)
+
+    def update(self, x, actions, log_p, rewards):
+        if self.replay is not None:
+            self.replay.append(x, actions, log_p, rewards)
+        self.head.update(as_variable(self.embed(x)), actions, log_p, rewards)
+
+    def _embed_uncached(self, x):
+        """
+        Computes embeddings without touching the cache
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :return: The embeddings
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        with chainer.no_backprop_mode(), chainer.using_config('train', False):
+            return self.features(as_variable(x)).data
@@ -0,0 +1,98 @@
+import numpy as np
+from chainer import as_variable, cuda, functions as F
+from chainercb.policies.softmax import Softmax
+from chainercb.util import select_items_per_row
+
+
+class PlackettLuce(Softmax):
+    def __init__(self, predictor, slate_size, tau=1.0):
+        """
+        A policy that ranks actions into ordered slates. Slates are sampled
+        without replacement from the Plackett-Luce distribution induced by the
+        output of a prediction function, which is the ranking generalization of
+        a softmax. Actions are matrices of shape (n, slate_size) where every
+        row contains the ranked action indices for one context.
+
+        :param predictor: The predictor function
+        :type predictor: chainer.Link
+
+        :param slate_size: The number of actions in every slate
+        :type slate_size: int
+
+        :param tau: The temperature parameter dictating the smoothness of the
+                    distribution
+        :type tau: float
+        """
+        super().__init__(predictor, tau)
+        self.slate_size = slate_size
+
+    def draw(self, x):
+        # Perturbing the scores with Gumbel noise and taking the top of the
+        # resulting ranking samples an entire slate from the Plackett-Luce
+        # distribution in a single pass
+        xp = cuda.get_array_module(x)
+        scores = self._predict(x).data
+        u = xp.random.uniform(0.0, 1.0, scores.shape).astype(scores.dtype)
+        return as_variable(_top(scores - xp.log(-xp.log(u)), self.slate_size))
+
+    def max(self, x):
+        return as_variable(_top(self.predictor(x).data, self.slate_size))
+
+    def uniform(self, x):
+        xp = cuda.get_array_module(x)
+        shape = (x.shape[0], self.predictor(x).shape[1])
+        return as_variable(_top(xp.random.random(shape), self.slate_size))
+
+    def nr_actions(self, x):
+        return F.exp(self.log_nr_actions(x))
+
+    def log_nr_actions(self, x):
+        # There are k! / (k - slate_size)! ordered slates
+        xp = cuda.get_array_module(x)
+        k = self.predictor(x).shape[1]
+        log_nr = np.sum(np.log(np.arange(k - self.slate_size + 1, k + 1)))
+        return as_variable(xp.ones(x.shape[0]) * log_nr)
+
+    def propensity(self, x, action):
+        return F.exp(self.log_propensity(x, action))
+
+    def log_propensity(self, x, action):
+        xp = cuda.get_array_module(x)
+        """:type : numpy"""
+        logits = self._predict(x)
+        n, k = logits.shape
+        s = action.shape[1]
+
+        # For every position of the slate, mask out the actions that were
+        # placed at earlier positions
+        placed = xp.zeros((n, s, k), dtype=np.int32)
+        placed[xp.arange(n)[:, None], xp.arange(s)[None, :], action.data] = 1
+        removed = (xp.cumsum(placed, axis=1) - placed) > 0
+
+        # The log-propensity of a slate is the sum over positions of the chosen
+        # logit minus the log-partition over the remaining actions
+        remaining = F.broadcast_to(F.expand_dims(logits, 1), (n, s, k))
+        remaining = F.where(removed, xp.full((n, s, k), -np.inf,
+                                             dtype=logits.dtype), remaining)
+        log_z = F.logsumexp(remaining, axis=2)
+        chosen = select_items_per_row(logits, action)
+        return F.sum(chosen - log_z, axis=1)
+
+
+def _top(values, s):
+    """
+    Computes the indices of the s largest values per row, in decreasing order
+
+    :param values: The values, matrix of shape (n, k)
+    :type values: numpy.ndarray|cupy.ndarray
+
+    :param s: The number of indices to select per row
+    :type s: int
+
+    :return: The indices, matrix of shape (n, s)
+    :rtype: numpy.ndarray|cupy.ndarray
+    """
+    xp = cuda.get_array_module(values)
+    idx = xp.argpartition(-values, s - 1, axis=1)[:, :s]
+    order = xp.argsort(-xp.take_along_axis(values, idx, axis=1), axis=1)
+    return xp.take_along_axis(idx, order, axis=1).astype(np.int32)
@@ -0,0 +1,115 @@
+import numpy as np
+from chainer import as_variable, cuda, functions as F
+from chainercb.policies.softmax import Softmax
+
+
+class SampledSoftmax(Softmax):
+    def __init__(self, predictor, output, tau=1.0, nr_samples=64,
+                 proposal=None):
+        """
+        A softmax policy whose scores are produced by a linear output layer on
+        top of a learned representation. Besides the exact methods of a
+        softmax, it provides an approximate log-propensity for training on very
+        large action spaces that only scores the given action and a set of
+        sampled negative actions, costing O(nr_samples) instead of O(k) per
+        training step.
+
+        The partition function is estimated by importance sampling: negatives
+        are drawn from the proposal distribution q (shared by the mini batch)
+        and every sampled action j contributes exp(s_j) / (nr_samples q_j),
+        where sampled copies of the given action itself are discarded. This
+        estimate of the partition function is unbiased, but its logarithm is
+        not, so the approximate log-propensity overestimates the exact one by
+        an amount that shrinks as O(1 / nr_samples). The variance is smallest
+        when q resembles the softmax itself (e.g. the popularity of actions)
+        and largest when q puts little mass on high-scoring actions.
+
+        :param predictor: The predictor function producing a representation of
+                          the context vectors
+        :type predictor: chainer.Link
+
+        :param output: The linear output layer producing one score per action
+        :type output: chainer.links.Linear
+
+        :param tau: The temperature parameter dictating the smoothness of the
+                    softmax
+        :type tau: float
+
+        :param nr_samples: The number of negative actions to sample for the
+                           approximate log-propensity
+        :type nr_samples: int
+
+        :param proposal: The proposal distribution over actions to sample
+                         negatives from, vector of shape (k) or None for a
+                         uniform distribution
+        :type proposal: numpy.ndarray|cupy.ndarray|None
+        """
+        super().__init__(predictor, tau)
+        with self.init_scope():
+            self.output = output
+        self.nr_samples = nr_samples
+        self.proposal = proposal
+
+    def max(self, x):
+        return F.argmax(self._predict(x), axis=1)
+
+    def uniform(self, x):
+        xp = cuda.get_array_module(x)
+        k = self.output.W.shape[0]
+        return as_variable(xp.random.randint(k, size=(x.shape[0])))
+
+    def nr_actions(self, x):
+        xp = cuda.get_array_module(x)
+        return as_variable(xp.ones(x.shape[0]) * self.output.W.shape[0])
+
+    def sampled_log_propensity(self, x, action):
+        """
+        Approximates the logarithm of the propensity score of a batch of
+        actions for a given batch of context vectors x by sampled softmax
+
+        :param x: The context vectors
+        :type x: chainer.Variable
+
+        :param action: The actions to execute
+        :type action: chainer.Variable
+
+        :return: The approximate log propensity score(s) of the given action(s)
+        :rtype: chainer.Variable
+        """
+        xp = cuda.get_array_module(x)
+        h = self.predictor(x)
+        W = self.output.W
+        k = W.shape[0]
+        m = self.nr_samples
+        action = as_variable(action).data.astype(np.int32)
+
+        # Sample negatives (shared by the mini batch) from the proposal
+        if self.proposal is None:
+            negatives = xp.random.randint(k, size=m).astype(np.int32)
+            log_q = xp.full(m, -np.log(k), dtype=h.dtype)
+        else:
+            negatives = xp.random.choice(k, size=m, p=self.proposal)
+            negatives = negatives.astype(np.int32)
+            log_q = xp.log(self.proposal[negatives]).astype(h.dtype)
+
+        # Score only the given actions and the sampled negatives
+        target = F.sum(h * F.embed_id(action, W), axis=1)
+        sampled = F.matmul(h, F.embed_id(negatives, W), transb=True)
+        if self.output.b is not None:
+            b = F.reshape(self.output.b, (k, 1))
+            target += F.reshape(F.embed_id(action, b), target.shape)
+            sampled += F.reshape(F.embed_id(negatives, b), (1, m))
+        target /= self.tau
+        sampled /= self.tau
+
+        # Importance weight the negatives and discard accidental hits of the
+        # given action
+        sampled = sampled - F.broadcast_to(log_q + np.log(m), sampled.shape)
+        hits = negatives[None, :] == action[:, None]
+        sampled = F.where(hits, xp.full(hits.shape, -np.inf, dtype=h.dtype),
+                          sampled)
+        logits = F.concat((F.expand_dims(target, 1), sampled), axis=1)
+        return target - F.logsumexp(logits, axis=1)
+
+    def _predict(self, x):
+        return self.output(self.predictor(x)) / self.tau
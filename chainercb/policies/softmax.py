@@ -52,6 +52,24 @@ class Softmax(Policy):
         log_probabilities = self._log_propensities(x)
         return F.select_item(log_probabilities, action.data)
 
+    def _log_propensity(self, prediction, action):
+        """
+        Computes the log propensity scores from the (unscaled) output of the
+        predictor, so that it can be shared by softmax policies that use the
+        same predictor with different temperatures
+
+        :param prediction: The output of the predictor
+        :type prediction: chainer.Variable
+
+        :param action: The actions
+        :type action: chainer.Variable
+
+        :return: The log propensity score(s) of the given action(s)
+        :rtype: chainer.Variable
+        """
+        log_probabilities = F.log_softmax(prediction / self.tau)
+        return F.select_item(log_probabilities, action.data)
+
     def _log_propensities(self, x):
         """
         Computes the log propensity (or log probability) of executing the
@@ -1,11 +1,26 @@
+import chainer
 from chainer import Chain, functions as F, cuda
 
+from chainercb.util.instrumentation import instrumented
+
 
 class Policy(Chain):
     """
     Abstract class representing a policy
     """
 
+    # Methods that are recorded by chainercb.util.instrumentation when it is
+    # enabled
+    _instrumented = ('draw', 'max', 'uniform', 'fast_draw', 'fast_max',
+                     'fast_uniform', 'propensity', 'log_propensity', 'update')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in cls._instrumented:
+            fn = cls.__dict__.get(name)
+            if fn is not None and not hasattr(fn, '__instrumented__'):
+                setattr(cls, name, instrumented(name, method=True)(fn))
+
     def draw(self, x):
         """
         Draws actions stochastically for given batch of context vectors x
@@ -43,6 +58,49 @@ class Policy(Chain):
         """
         raise NotImplementedError
 
+    def fast_draw(self, x):
+        """
+        Draws actions like draw, but without building a computational graph.
+        Policies can override this with a plain array implementation that
+        avoids the per-call overhead of chainer for small batches, such as
+        single requests while serving.
+
+        :param x: The context vectors
+        :type x: numpy.ndarray|cupy.ndarray
+
+        :return: The actions drawn stochastically from the policy
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        with chainer.no_backprop_mode():
+            return self.draw(x).data
+
+    def fast_max(self, x):
+        """
+        Selects actions like max, but without building a computational graph
+
+        :param x: The context vectors
+        :type x: numpy.ndarray|cupy.ndarray
+
+        :return: The best actions according to the policy
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        with chainer.no_backprop_mode():
+            return self.max(x).data
+
+    def fast_uniform(self, x):
+        """
+        Selects actions like uniform, but without building a computational
+        graph
+
+        :param x: The context vectors
+        :type x: numpy.ndarray|cupy.ndarray
+
+        :return: Actions selected uniformly at random
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        with chainer.no_backprop_mode():
+            return self.uniform(x).data
+
     def nr_actions(self, x):
         """
         The number of actions that the policy can possibly execute for given
@@ -0,0 +1,254 @@
+import asyncio
+import time
+from collections import Counter, deque
+
+import chainer
+import numpy as np
+from chainer import cuda
+
+
+class MicroBatcher:
+    """
+    An asyncio front-end that serves a policy to callers that each submit a
+    single context. Concurrent requests are coalesced into a batch which is
+    executed with a single call to the policy, so the vectorization of the
+    policy is used even when requests arrive one at a time.
+
+    A batch is executed as soon as it holds max_batch_size contexts or when the
+    oldest context in it has waited for max_wait seconds, whichever comes first.
+
+    The returned log propensity scores are those of the selected actions under
+    the method: the policy's propensities for 'draw', 0 for the deterministic
+    'max' and minus the log number of actions for 'uniform'.
+    """
+
+    def __init__(self, policy, max_batch_size=64, max_wait=0.001,
+                 method='draw', executor=None, clock=time.perf_counter):
+        """
+        :param policy: The policy to serve
+        :type policy: chainercb.policy.Policy
+
+        :param max_batch_size: The maximum number of contexts per batch
+        :type max_batch_size: int
+
+        :param max_wait: The maximum time (in seconds) a context waits for
+                         other contexts to join its batch
+        :type max_wait: float
+
+        :param method: The policy method used to select actions, one of 'draw',
+                       'max' or 'uniform'
+        :type method: str
+
+        :param executor: The executor in which batches are executed or None to
+                         execute them on the event loop, which blocks the loop
+                         while the policy runs
+        :type executor: concurrent.futures.Executor|None
+
+        :param clock: The clock that time stamps requests
+        :type clock: callable
+        """
+        if method not in ('draw', 'max', 'uniform'):
+            raise ValueError(f"only 'draw', 'max' and 'uniform' are valid for "
+                             f"'method', but '{method}' is given")
+        self.policy = policy
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.method = method
+        self.executor = executor
+        self.clock = clock
+        self.metrics = BatchingMetrics()
+        self._queue = None
+        self._task = None
+        self._batch = []
+        self._stopping = False
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def start(self):
+        """
+        Starts processing requests on the running event loop
+        """
+        if self._task is None:
+            self._stopping = False
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops processing requests after all queued requests have been served
+        """
+        if self._task is not None:
+            self._stopping = True
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+
+    async def act(self, x):
+        """
+        Selects an action for a single context
+
+        :param x: The context, an array without the batch dimension
+        :type x: numpy.ndarray
+
+        :return: The selected action and its log propensity score
+        :rtype: (int, float)
+        """
+        if self._stopping or (self._task is not None and self._task.done()):
+            raise RuntimeError('the micro batcher is stopped')
+        if self._task is None:
+            raise RuntimeError('the micro batcher is not started')
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((x, future, self.clock()))
+        return await future
+
+    async def _run(self):
+        """
+        Serves requests until stopped, the requests that are still pending when
+        serving ends unexpectedly fail rather than wait forever
+        """
+        self._batch = []
+        try:
+            await self._serve()
+        finally:
+            error = RuntimeError('the micro batcher stopped serving')
+            pending = [future for _, future, _ in self._batch]
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not None:
+                    pending.append(item[1])
+            for future in pending:
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _serve(self):
+        """
+        Collects requests into batches and executes them until stopped
+        """
+        loop = asyncio.get_running_loop()
+        stopping = False
+        carried = None
+        while not stopping:
+            if carried is None:
+                first = await self._queue.get()
+            else:
+                first, carried = carried, None
+            if first is None:
+                break
+            batch = self._batch = [first]
+            deadline = first[2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - self.clock()
+                    if remaining <= 0.0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(),
+                                                      remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                if item[2] > deadline:
+                    # The request arrived after the batch was due, it starts
+                    # the next batch
+                    carried = item
+                    break
+                batch.append(item)
+
+            # Errors, such as contexts of mismatching shapes, are passed to the
+            # callers of the batch
+            try:
+                start = self.clock()
+                self.metrics.record([start - enqueued
+                                     for _, _, enqueued in batch])
+                xs = np.stack([x for x, _, _ in batch])
+                if self.executor is None:
+                    actions, log_p = self._execute(xs)
+                else:
+                    actions, log_p = await loop.run_in_executor(
+                        self.executor, self._execute, xs)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future, _), a, p in zip(batch, actions, log_p):
+                if not future.done():
+                    future.set_result((int(a), float(p)))
+            self._batch = []
+
+    def _execute(self, xs):
+        """
+        Executes the policy on a batch of contexts
+
+        :param xs: The contexts
+        :type xs: numpy.ndarray
+
+        :return: The selected actions and their log propensity scores
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        with chainer.no_backprop_mode():
+            x = self.policy.xp.asarray(xs)
+            actions = getattr(self.policy, self.method)(x)
+            if self.method == 'draw':
+                log_p = self.policy.log_propensity(x, actions).data
+            elif self.method == 'uniform':
+                log_p = -self.policy.log_nr_actions(x).data
+            else:
+                log_p = self.policy.xp.zeros(actions.shape, dtype=x.dtype)
+        return cuda.to_cpu(actions.data), cuda.to_cpu(log_p)
+
+
+class BatchingMetrics:
+    """
+    Queueing delay and batch size statistics of a micro batcher. Delays are
+    kept for a sliding window of recent requests.
+    """
+
+    def __init__(self, window=10000):
+        """
+        :param window: The number of recent queueing delays to keep
+        :type window: int
+        """
+        self.requests = 0
+        self.batches = 0
+        self.batch_sizes = Counter()
+        self.delays = deque(maxlen=window)
+
+    def record(self, delays):
+        """
+        Records a batch
+
+        :param delays: The queueing delay (in seconds) of every request in the
+                       batch
+        :type delays: list of float
+        """
+        self.requests += len(delays)
+        self.batches += 1
+        self.batch_sizes[len(delays)] += 1
+        self.delays.extend(delays)
+
+    def summary(self):
+        """
+        :return: The number of requests and batches, the mean batch size and
+                 the median, 99th percentile and maximum queueing delay (in
+                 seconds) over the window
+        :rtype: dict
+        """
+        delays = np.array(self.delays) if self.delays else np.zeros(1)
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / max(1, self.batches),
+            'delay_p50': float(np.percentile(delays, 50)),
+            'delay_p99': float(np.percentile(delays, 99)),
+            'delay_max': float(np.max(delays))
+        }
@@ -0,0 +1,178 @@
+"""
+Simulation of many independent bandit experiments (replicas) on a supervised
+dataset. Every replica is a policy, built by a factory from its parameters,
+that is run over its own shuffled pass of the data through a bandify chain.
+Its cumulative reward and regret curves are streamed to a JSON lines file per
+replica.
+
+Replicas are not vectorized: the policies of chainercb draw from the global
+random state of numpy, so stacking the batches of several replicas into a
+single draw would mix their random streams. Instead, every replica runs on its
+own and the replicas are fanned out over a process pool, which is the only
+source of parallelism.
+
+Every replica derives its random streams (data order and policy randomness)
+from its own seed, so its results do not depend on the number of processes, on
+the order in which replicas are scheduled or on the other replicas of the
+simulation. The global random state of numpy is restored after a replica ran.
+"""
+import json
+import os
+from multiprocessing import Pool
+
+import numpy as np
+from chainer import as_variable
+
+from chainercb.bandify import MultiClassBandify
+
+
+class Replica:
+    def __init__(self, name, factory, seed, **params):
+        """
+        A single simulated experiment
+
+        :param name: The name of the replica, its curve is written to
+                     <name>.jsonl
+        :type name: str
+
+        :param factory: A picklable callable that builds the policy from the
+                        parameters
+        :type factory: callable
+
+        :param seed: The seed of all random streams of the replica
+        :type seed: int
+
+        :param params: The parameters passed to the factory
+        :type params: dict
+        """
+        self.name = name
+        self.factory = factory
+        self.seed = seed
+        self.params = params
+
+    def __repr__(self):
+        return f'Replica({self.name!r}, seed={self.seed}, {self.params})'
+
+
+def simulate(replicas, x, y, directory, batch_size=32, epochs=1,
+             processes=None, bandify=MultiClassBandify):
+    """
+    Runs all replicas and streams their curves to disk. Every record contains
+    the replica name, its parameters and seed, the step, the number of samples
+    seen so far and the reward and regret of the step and in total. The regret
+    of a sample is the reward of playing its label minus the obtained reward.
+
+    :param replicas: The replicas to run
+    :type replicas: list of chainercb.simulation.Replica
+
+    :param x: The contexts of the dataset
+    :type x: numpy.ndarray
+
+    :param y: The labels of the dataset
+    :type y: numpy.ndarray
+
+    :param directory: The directory to write the curves to
+    :type directory: str
+
+    :param batch_size: The number of samples per step
+    :type batch_size: int
+
+    :param epochs: The number of passes over the data
+    :type epochs: int
+
+    :param processes: The number of worker processes or None to use one per
+                      CPU, 1 runs everything in the current process
+    :type processes: int|None
+
+    :param bandify: The bandify chain that turns the dataset into a bandit
+                    problem
+    :type bandify: type
+    """
+    names = [replica.name for replica in replicas]
+    if len(set(names)) != len(names):
+        raise ValueError('the names of the replicas are not unique')
+    os.makedirs(directory, exist_ok=True)
+    tasks = [(replica, x, y, directory, batch_size, epochs, bandify)
+             for replica in replicas]
+    if processes == 1:
+        for task in tasks:
+            _run(task)
+    else:
+        with Pool(processes) as pool:
+            for _ in pool.imap_unordered(_run, tasks):
+                pass
+
+
+def _run(task):
+    """
+    Runs a single replica
+
+    :param task: The replica, the dataset, the output directory, the batch
+                 size, the number of epochs and the bandify chain
+    :type task: tuple
+    """
+    replica, x, y, directory, batch_size, epochs, bandify = task
+    order, policy_seed = np.random.SeedSequence(replica.seed).spawn(2)
+    order = np.random.default_rng(order)
+
+    # The policies of chainercb draw from the global random state of numpy, so
+    # it is seeded from the policy stream of the replica and restored after
+    outer = np.random.get_state()
+    np.random.set_state(np.random.RandomState(
+        np.random.MT19937(policy_seed)).get_state())
+    path = os.path.join(directory, f'{replica.name}.jsonl')
+    try:
+        with open(path, 'w') as f:
+            policy = replica.factory(**replica.params)
+            chain = bandify(policy)
+            chain.update_policy(policy)
+            n = x.shape[0]
+            totals = np.zeros(2)
+            samples = 0
+            step = 0
+            for _ in range(epochs):
+                perm = order.permutation(n)
+                for start in range(0, n, batch_size):
+                    idx = perm[start:start + batch_size]
+                    c_x = as_variable(x[idx])
+                    c_y = as_variable(y[idx])
+                    _, _, _, rewards = chain(c_x, c_y)
+                    best = chain.reward(c_y, c_y, dtype=np.float64)
+                    reward = float(rewards.data.sum())
+                    regret = float(best.data.sum()) - reward
+                    totals += (reward, regret)
+                    samples += idx.shape[0]
+                    step += 1
+                    record = {
+                        'replica': replica.name,
+                        'seed': replica.seed,
+                        'params': replica.params,
+                        'step': step,
+                        'samples': samples,
+                        'reward': reward,
+                        'regret': regret,
+                        'cumulative_reward': float(totals[0]),
+                        'cumulative_regret': float(totals[1])
+                    }
+                    f.write(json.dumps(record))
+                    f.write('\n')
+                    f.flush()
+    finally:
+        np.random.set_state(outer)
+
+
+def load(directory, name):
+    """
+    Loads the curve of a replica
+
+    :param directory: The directory the curves were written to
+    :type directory: str
+
+    :param name: The name of the replica
+    :type name: str
+
+    :return: The records of the replica, in order
+    :rtype: list of dict
+    """
+    with open(os.path.join(directory, f'{name}.jsonl')) as f:
+        return [json.loads(line) for line in f if line.strip()]
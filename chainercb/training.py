@@ -0,0 +1,189 @@
+"""
+Training of policies on logged bandit feedback with chainer.training. A logged
+dataset yields (x, action, log_p, reward) examples, which a BanditUpdater turns
+into optimization steps of a bandit loss and an OffPolicyEvaluator turns into
+IPS and SNIPS estimates of the value of the policy.
+
+Batches are loaded by an iterator, so a MultiprocessIterator (see
+prefetch_iterator) loads and collates the next batches in worker processes
+while the current batch is being trained on.
+"""
+import chainer
+from chainer import as_variable, functions as F
+from chainer.dataset import convert
+from chainer.datasets import TupleDataset
+from chainer.iterators import MultiprocessIterator
+from chainer.training import StandardUpdater
+from chainer.training.extensions import Evaluator
+
+from chainercb import loss
+
+
+def logged_dataset(x, actions, log_p, rewards):
+    """
+    Creates a dataset of logged bandit feedback
+
+    :param x: The context vectors
+    :type x: numpy.ndarray
+
+    :param actions: The logged actions
+    :type actions: numpy.ndarray
+
+    :param log_p: The log propensity scores of the logging policy
+    :type log_p: numpy.ndarray
+
+    :param rewards: The observed rewards
+    :type rewards: numpy.ndarray
+
+    :return: The dataset of (x, action, log_p, reward) examples
+    :rtype: chainer.datasets.TupleDataset
+    """
+    return TupleDataset(x, actions, log_p, rewards)
+
+
+def prefetch_iterator(dataset, batch_size, repeat=True, shuffle=True,
+                      n_processes=None, n_prefetch=2, shared_mem=None):
+    """
+    Creates an iterator that loads batches in worker processes, ahead of the
+    training loop
+
+    :param dataset: The dataset
+    :type dataset: chainer.dataset.DatasetMixin|chainer.datasets.TupleDataset
+
+    :param batch_size: The number of examples per batch
+    :type batch_size: int
+
+    :param repeat: Whether to iterate over the dataset endlessly
+    :type repeat: bool
+
+    :param shuffle: Whether to shuffle the order of the examples
+    :type shuffle: bool
+
+    :param n_processes: The number of worker processes or None to use one per
+                        CPU
+    :type n_processes: int|None
+
+    :param n_prefetch: The number of batches to load ahead
+    :type n_prefetch: int
+
+    :param shared_mem: The size (in bytes) of the shared memory per example or
+                       None to determine it from the first batch
+    :type shared_mem: int|None
+
+    :return: The iterator
+    :rtype: chainer.iterators.MultiprocessIterator
+    """
+    return MultiprocessIterator(dataset, batch_size, repeat=repeat,
+                                shuffle=shuffle, n_processes=n_processes,
+                                n_prefetch=n_prefetch, shared_mem=shared_mem)
+
+
+class BanditUpdater(StandardUpdater):
+    def __init__(self, iterator, optimizer, loss_func=loss.ips,
+                 converter=convert.concat_examples, device=None,
+                 **loss_kwargs):
+        """
+        An updater that trains the policy of an optimizer by a bandit loss on
+        batches of logged feedback. The loss is reported as 'main/loss'.
+
+        :param iterator: The iterator over logged (x, action, log_p, reward)
+                         examples
+        :type iterator: chainer.dataset.Iterator
+
+        :param optimizer: The optimizer, its target is the policy to train
+        :type optimizer: chainer.Optimizer
+
+        :param loss_func: The loss, called as loss_func(x, actions, log_p,
+                          rewards, policy, **loss_kwargs), e.g. loss.ips
+        :type loss_func: callable
+
+        :param converter: The function that collates a batch of examples
+        :type converter: callable
+
+        :param device: The device to which batches are sent
+        :type device: int|None
+
+        :param loss_kwargs: Further arguments of the loss, e.g. the lagrange
+                            multiplier or clipping of loss.ips
+        :type loss_kwargs: dict
+        """
+        super().__init__(iterator, optimizer, converter=converter,
+                         device=device)
+        self.bandit_loss = loss_func
+        self.loss_kwargs = loss_kwargs
+
+    def update_core(self):
+        batch = self.get_iterator('main').next()
+        x, actions, log_p, rewards = (as_variable(v) for v in self.converter(
+            batch, self.device))
+        optimizer = self.get_optimizer('main')
+        policy = optimizer.target
+        value = self.bandit_loss(x, actions, log_p, rewards, policy,
+                                 **self.loss_kwargs)
+        chainer.report({'loss': value}, policy)
+        policy.cleargrads()
+        value.backward()
+        optimizer.update()
+
+
+class OffPolicyEvaluator(Evaluator):
+    """
+    An extension that estimates the value (the expected reward) of a policy
+    on logged feedback with inverse propensity scoring (IPS) and self
+    normalized IPS (SNIPS). The estimates are reported as
+    'validation/main/ips' and 'validation/main/snips', together with the mean
+    importance weight as 'validation/main/weight'.
+
+    The estimates are computed over all batches of the iterator, so they are
+    exact estimates over the whole validation set rather than averages of
+    per-batch estimates.
+    """
+
+    def __init__(self, iterator, policy, converter=convert.concat_examples,
+                 device=None, clip=None):
+        """
+        :param iterator: The iterator over logged (x, action, log_p, reward)
+                         examples, it should not repeat
+        :type iterator: chainer.dataset.Iterator
+
+        :param policy: The policy to evaluate
+        :type policy: chainercb.policy.Policy
+
+        :param converter: The function that collates a batch of examples
+        :type converter: callable
+
+        :param device: The device to which batches are sent
+        :type device: int|None
+
+        :param clip: The largest importance weight or None to not clip
+        :type clip: float|None
+        """
+        super().__init__(iterator, policy, converter=converter, device=device)
+        self.clip = clip
+
+    def evaluate(self):
+        iterator = self.get_iterator('main')
+        policy = self.get_target('main')
+        if hasattr(iterator, 'reset'):
+            iterator.reset()
+        weighted = 0.0
+        weights = 0.0
+        n = 0
+        with chainer.no_backprop_mode(), chainer.using_config('train', False):
+            for batch in iterator:
+                x, actions, log_p, rewards = (as_variable(v) for v in
+                                              self.converter(batch,
+                                                             self.device))
+                w = F.exp(policy.log_propensity(x, actions) - log_p).data
+                if self.clip is not None:
+                    w = w.clip(max=self.clip)
+                weighted += float((w * rewards.data).sum())
+                weights += float(w.sum())
+                n += w.shape[0]
+        observation = {}
+        with chainer.reporter.report_scope(observation):
+            chainer.report({'ips': weighted / max(n, 1),
+                            'snips': weighted / weights if weights > 0.0
+                            else 0.0,
+                            'weight': weights / max(n, 1)}, policy)
+        return observation
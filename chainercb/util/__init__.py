@@ -1,2 +1,23 @@
-from chainercb.util.ridge import RidgeRegression
-from chainercb.util.select_items import select_items_per_row, inverse_select_items_per_row
+from chainercb.util.lazy import lazy_exports
+
+# Public names are imported on first access, so that the numpy-only parts (e.g.
+# the ridge regression) can be used without importing chainer
+_exports = {
+    'RidgeRegression': 'chainercb.util.ridge',
+    'DiscountedRidgeRegression': 'chainercb.util.ridge',
+    'WindowedRidgeRegression': 'chainercb.util.ridge',
+    'LogisticRegression': 'chainercb.util.logistic',
+    'RandomFourierFeatures': 'chainercb.util.kernel',
+    'Nystroem': 'chainercb.util.kernel',
+    'ArmRegistry': 'chainercb.util.arms',
+    'TieredArmRegistry': 'chainercb.util.arms',
+    'RingBuffer': 'chainercb.util.ring',
+    'ReplayBuffer': 'chainercb.util.replay',
+    'SumTree': 'chainercb.util.replay',
+    'FeatureHasher': 'chainercb.util.hashing',
+    'SparseBatch': 'chainercb.util.hashing',
+    'select_items_per_row': 'chainercb.util.select_items',
+    'inverse_select_items_per_row': 'chainercb.util.select_items',
+}
+__all__ = list(_exports)
+__getattr__, __dir__ = lazy_exports(__name__, _exports)
@@ -0,0 +1,519 @@
+import os
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+from copy import copy
+
+import numpy as np
+
+from chainercb.util.ridge import RidgeRegression
+
+
+class ArmRegistry:
+    """
+    A registry of per-arm regressors whose state lives in contiguous,
+    preallocated slabs (one array of shape (capacity, ...) per state field).
+    Arms are identified by stable integer ids that index into the slabs. Ids of
+    removed arms are recycled through a free-list, so adding and removing arms
+    only touches a single slot and costs O(d^2). Every id has a generation that
+    is incremented whenever the id is handed out, so feedback logged for an
+    arm can be told apart from feedback for a later arm with the same id.
+    """
+
+    def __init__(self, d, alpha=1.0, regularization=1.0, device=None,
+                 capacity=16, regressor=RidgeRegression):
+        """
+        :param d: The dimensionality
+        :type d: int
+
+        :param alpha: The variance scaling factor
+        :type alpha: float
+
+        :param regularization: The regularization parameter
+        :type regularization: float
+
+        :param device: Device on which to perform ridge regression
+        :type device: int|None
+
+        :param capacity: The number of arms to preallocate storage for. When
+                         more arms are added the storage doubles in size, which
+                         copies all state, so this should be set large enough
+                         to avoid reallocation while serving
+        :type capacity: int
+
+        :param regressor: The regressor class (or factory taking d, alpha,
+                          regularization and device) of every arm
+        :type regressor: callable
+        """
+        self._prototype = regressor(d, alpha, regularization, device)
+        self.xp = self._prototype.xp
+        self._slabs = {}
+        self._regressors = {}
+        self._free = []
+        self._size = 0
+        self._count = 0
+        self._active = self.xp.zeros(0, dtype=bool)
+        self._generations = np.zeros(0, dtype=np.int64)
+        self._grow(max(1, capacity))
+
+    @property
+    def capacity(self):
+        """
+        :return: The number of arm ids for which storage is allocated
+        :rtype: int
+        """
+        return self._active.shape[0]
+
+    @property
+    def size(self):
+        """
+        :return: One more than the largest arm id ever handed out, this is the
+                 width of the action space
+        :rtype: int
+        """
+        return self._size
+
+    @property
+    def active(self):
+        """
+        :return: Boolean vector of shape (size) indicating which arm ids are
+                 currently in use
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        return self._active[:self._size]
+
+    @property
+    def generations(self):
+        """
+        :return: Vector of shape (size) with the generation of every arm id,
+                 which is -1 for ids that are not in use
+        :rtype: numpy.ndarray
+        """
+        active = _to_host(self.active)
+        return np.where(active, self._generations[:self._size], -1)
+
+    @property
+    def ids(self):
+        """
+        :return: The ids of all arms currently in use, in increasing order
+        :rtype: list of int
+        """
+        return [int(a) for a in self.xp.flatnonzero(self.active)]
+
+    @property
+    def bytes_per_arm(self):
+        """
+        :return: The number of bytes of state stored for every arm
+        :rtype: int
+        """
+        return sum(getattr(self._prototype, name).nbytes
+                   for name in self._prototype._slab_fields)
+
+    def add(self):
+        """
+        Adds a new arm with a freshly initialized regressor
+
+        :return: The id of the new arm
+        :rtype: int
+        """
+        if self._free:
+            arm = self._free.pop()
+        else:
+            if self._size == self.capacity:
+                self._grow(2 * self.capacity)
+            arm = self._size
+            self._size += 1
+        self._regressors[arm] = self._reset(arm)
+        self._active[arm] = True
+        self._generations[arm] += 1
+        self._count += 1
+        return arm
+
+    def remove(self, arm):
+        """
+        Removes an arm, its id will be reused by a subsequent call to add
+
+        :param arm: The id of the arm to remove
+        :type arm: int
+        """
+        arm = self._check(arm)
+        self._release(arm)
+        self._active[arm] = False
+        self._count -= 1
+        self._free.append(arm)
+
+    def reset(self, arm):
+        """
+        Resets the regressor of an arm to a freshly initialized one, keeping
+        its id
+
+        :param arm: The id of the arm to reset
+        :type arm: int
+        """
+        arm = self._check(arm)
+        self._release(arm)
+        self._regressors[arm] = self._reset(arm)
+
+    def slab(self, name, serving=False):
+        """
+        Returns the stacked state of all arm ids for given state field. Rows of
+        ids that are not in use contain stale values.
+
+        :param name: The name of the state field (e.g. '_theta')
+        :type name: str
+
+        :param serving: Whether to return the serving copy of the field, which
+                        is the field itself if the regressors do not keep
+                        serving copies
+        :type serving: bool
+
+        :return: An array of shape (size, ...)
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        if serving:
+            name = self._prototype.serving_field(name)
+        return self._slabs[name][:self._size]
+
+    def __getitem__(self, arm):
+        return self._regressors[self._check(arm)]
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def _check(self, arm):
+        """
+        Validates an arm id
+
+        :param arm: The arm id
+        :type arm: int
+
+        :return: The arm id as a python integer
+        :rtype: int
+        """
+        arm = int(arm)
+        if not 0 <= arm < self._size or not self._active[arm]:
+            raise KeyError(f'arm {arm} is not in use')
+        return arm
+
+    def _reset(self, arm):
+        """
+        Initializes the state of an arm to that of a fresh regressor
+
+        :param arm: The arm id
+        :type arm: int
+
+        :return: The regressor of the arm
+        :rtype: chainercb.util.RidgeRegression
+        """
+        for name in self._prototype._slab_fields:
+            self._slabs[name][arm] = getattr(self._prototype, name)
+        return self._bind(arm)
+
+    def _release(self, arm):
+        """
+        Releases the storage held by an arm that is being removed
+
+        :param arm: The arm id
+        :type arm: int
+        """
+        del self._regressors[arm]
+
+    def _bind(self, slot):
+        """
+        Creates a regressor whose state is backed by the slabs at given slot
+
+        :param slot: The slot to bind to
+        :type slot: int
+
+        :return: The regressor
+        :rtype: chainercb.util.RidgeRegression
+        """
+        regressor = copy(self._prototype)
+        for name in self._prototype._slab_fields:
+            setattr(regressor, name, self._slabs[name][slot])
+        return regressor
+
+    def _grow(self, capacity):
+        """
+        Grows the space of arm ids to given capacity
+
+        :param capacity: The new capacity
+        :type capacity: int
+        """
+        active = self.xp.zeros(capacity, dtype=bool)
+        active[:self._size] = self._active[:self._size]
+        self._active = active
+        generations = np.zeros(capacity, dtype=np.int64)
+        generations[:self._size] = self._generations[:self._size]
+        self._generations = generations
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        """
+        Reallocates the slabs to given capacity and rebinds all regressors
+
+        :param capacity: The new capacity
+        :type capacity: int
+        """
+        for name in self._prototype._slab_fields:
+            field = getattr(self._prototype, name)
+            slab = self.xp.zeros((capacity,) + field.shape, dtype=field.dtype)
+            if name in self._slabs:
+                slab[:self._size] = self._slabs[name][:self._size]
+            self._slabs[name] = slab
+        for arm, regressor in self._regressors.items():
+            for name in self._prototype._slab_fields:
+                setattr(regressor, name, self._slabs[name][arm])
+
+    def __getstate__(self):
+        # This customizes pickle behavior (views into the slabs can not be
+        # pickled without losing the sharing, so regressors are rebuilt)
+        d = dict(self.__dict__)
+        del d['xp']
+        del d['_regressors']
+        return d
+
+    def __setstate__(self, d):
+        # This customizes pickle behavior (make sure xp and the regressors are
+        # properly reloaded)
+        self.__dict__.update(d)
+        self.xp = self._prototype.xp
+        self._regressors = {arm: self._bind(arm) for arm in self.ids}
+
+
+class TieredArmRegistry(ArmRegistry):
+    """
+    An arm registry that only keeps a bounded number of recently used arms
+    resident in memory. When the resident set is full, the least recently used
+    arm is evicted to a memory-mapped on-disk store and it is transparently
+    faulted back in whenever it is accessed again.
+
+    Regressors returned by this registry are only valid until the next access
+    to the registry, which can evict them, so they should not be held on to.
+
+    A temporary directory created by the registry is removed when the registry
+    is closed or garbage collected, and pickles of such a registry embed the
+    on-disk store, so they can be loaded anywhere. Pickles of a registry with
+    a given directory reference that directory.
+    """
+
+    def __init__(self, d, alpha=1.0, regularization=1.0, device=None,
+                 capacity=16, resident=1024, directory=None,
+                 regressor=RidgeRegression):
+        """
+        :param d: The dimensionality
+        :type d: int
+
+        :param alpha: The variance scaling factor
+        :type alpha: float
+
+        :param regularization: The regularization parameter
+        :type regularization: float
+
+        :param device: Device on which to perform ridge regression
+        :type device: int|None
+
+        :param capacity: The number of arm ids to preallocate disk storage for
+        :type capacity: int
+
+        :param resident: The maximum number of arms kept in memory, the memory
+                         budget is resident * bytes_per_arm
+        :type resident: int
+
+        :param directory: The directory holding the on-disk store or None to
+                          use a fresh temporary directory, which is removed
+                          when the registry is closed
+        :type directory: str|None
+
+        :param regressor: The regressor class (or factory taking d, alpha,
+                          regularization and device) of every arm
+        :type regressor: callable
+        """
+        self._temporary(directory)
+        self._disk = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        super().__init__(d, alpha, regularization, device, capacity,
+                         regressor)
+
+        # The resident slabs are indexed by slot rather than by arm id
+        for name in self._prototype._slab_fields:
+            field = getattr(self._prototype, name)
+            self._slabs[name] = self.xp.zeros((resident,) + field.shape,
+                                              dtype=field.dtype)
+        self._regressors = OrderedDict()
+        self._slots = {}
+        self._free_slots = list(range(resident - 1, -1, -1))
+
+    @property
+    def resident(self):
+        """
+        :return: The number of arms currently resident in memory
+        :rtype: int
+        """
+        return len(self._regressors)
+
+    def close(self):
+        """
+        Closes the on-disk store and removes its directory if the registry
+        created it. The registry can not be used afterwards.
+        """
+        for disk in self._disk.values():
+            disk.flush()
+        self._disk = {}
+        self._regressors = OrderedDict()
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def slab(self, name, serving=False):
+        raise NotImplementedError('a tiered arm registry does not keep the '
+                                  'state of all arms in a single slab')
+
+    def __getitem__(self, arm):
+        arm = self._check(arm)
+        regressor = self._regressors.get(arm)
+        if regressor is None:
+            self.misses += 1
+            slot = self._acquire(arm)
+            for name in self._prototype._slab_fields:
+                self._slabs[name][slot] = self.xp.asarray(self._disk[name][arm])
+            regressor = self._regressors[arm] = self._bind(slot)
+        else:
+            self.hits += 1
+            self._regressors.move_to_end(arm)
+        return regressor
+
+    def _reset(self, arm):
+        slot = self._acquire(arm)
+        for name in self._prototype._slab_fields:
+            self._slabs[name][slot] = getattr(self._prototype, name)
+        return self._bind(slot)
+
+    def _release(self, arm):
+        if arm in self._regressors:
+            del self._regressors[arm]
+            self._free_slots.append(self._slots.pop(arm))
+
+    def _acquire(self, arm):
+        """
+        Assigns a resident slot to an arm, evicting the least recently used arm
+        if there is no free slot
+
+        :param arm: The arm id
+        :type arm: int
+
+        :return: The slot
+        :rtype: int
+        """
+        if not self._free_slots:
+            victim, _ = self._regressors.popitem(last=False)
+            self._write(victim)
+            self._free_slots.append(self._slots.pop(victim))
+            self.evictions += 1
+        slot = self._slots[arm] = self._free_slots.pop()
+        return slot
+
+    def _write(self, arm):
+        """
+        Writes the resident state of an arm to the on-disk store
+
+        :param arm: The arm id
+        :type arm: int
+        """
+        slot = self._slots[arm]
+        for name in self._prototype._slab_fields:
+            self._disk[name][arm] = _to_host(self._slabs[name][slot])
+
+    def _temporary(self, directory):
+        """
+        Sets the directory of the on-disk store, creating a temporary directory
+        that is removed with the registry if none is given
+
+        :param directory: The directory or None
+        :type directory: str|None
+        """
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='chainercb-')
+            self._finalizer = weakref.finalize(self, shutil.rmtree, directory,
+                                               ignore_errors=True)
+        else:
+            self._finalizer = None
+        self._directory = directory
+
+    def _allocate(self, capacity):
+        # Only the on-disk store is indexed by arm id
+        self._open(capacity, grow=True)
+
+    def _open(self, capacity, grow=False):
+        """
+        Opens (and optionally grows) the memory-mapped on-disk store
+
+        :param capacity: The number of arm ids to map
+        :type capacity: int
+
+        :param grow: Whether the files should be created or extended
+        :type grow: bool
+        """
+        for name in self._prototype._slab_fields:
+            field = getattr(self._prototype, name)
+            shape = (capacity,) + field.shape
+            path = os.path.join(self._directory, f'{name.strip("_")}.dat')
+            if name in self._disk:
+                self._disk[name].flush()
+                del self._disk[name]
+            if grow:
+                with open(path, 'ab') as f:
+                    f.truncate(int(np.prod(shape)) * field.dtype.itemsize)
+            self._disk[name] = np.memmap(path, dtype=field.dtype, mode='r+',
+                                         shape=shape)
+
+    def __getstate__(self):
+        # This customizes pickle behavior (the resident arms are written to
+        # the on-disk store, which is referenced by its directory)
+        for arm in self._regressors:
+            self._write(arm)
+        for disk in self._disk.values():
+            disk.flush()
+        d = super().__getstate__()
+        del d['_disk']
+        del d['_finalizer']
+        if self._finalizer is not None:
+            d['_directory'] = None
+            d['_stored'] = {name: np.array(disk)
+                            for name, disk in self._disk.items()}
+        d['_slots'] = {}
+        d['_free_slots'] = list(range(len(self._slots) + len(self._free_slots)
+                                      - 1, -1, -1))
+        return d
+
+    def __setstate__(self, d):
+        # This customizes pickle behavior (the memory maps are reopened, or
+        # recreated from the embedded store, and all arms start out on disk)
+        stored = d.pop('_stored', None)
+        self.__dict__.update(d)
+        self.xp = self._prototype.xp
+        self._regressors = OrderedDict()
+        self._disk = {}
+        self._temporary(self._directory)
+        self._open(self.capacity, grow=stored is not None)
+        if stored is not None:
+            for name, array in stored.items():
+                self._disk[name][...] = array
+
+
+def _to_host(array):
+    """
+    Moves an array to host memory
+
+    :param array: The array
+    :type array: numpy.ndarray|cupy.ndarray
+
+    :return: The array in host memory
+    :rtype: numpy.ndarray
+    """
+    return array.get() if hasattr(array, 'get') else array
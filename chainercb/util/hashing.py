@@ -0,0 +1,195 @@
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+SparseBatch = namedtuple('SparseBatch', ['indptr', 'indices', 'values',
+                                         'shape'])
+SparseBatch.__doc__ = """
+A batch of hashed feature vectors in compressed sparse row (CSR) format: the
+entries of row i are indices[indptr[i]:indptr[i + 1]] with values
+values[indptr[i]:indptr[i + 1]]. Colliding features of a row are kept as
+separate entries, which sum when the batch is densified.
+"""
+
+
+class FeatureHasher:
+    """
+    Encodes records of (feature, value) pairs, such as high-cardinality
+    categorical features, into vectors of a fixed dimensionality by the
+    hashing trick. Every feature is hashed (with crc32) to an index and,
+    optionally, a sign, so that collisions cancel out in expectation.
+
+    A record is either a dict or a list of (feature, value) pairs, where
+    features are strings (other objects are converted with str). A plain
+    string in a list is shorthand for the pair (feature, 1.0), e.g. a one-hot
+    categorical feature 'country=NL'.
+
+    Hashes are cached per feature, so a batch only hashes the features that
+    were not seen before, and the vectors of a whole batch are assembled with
+    a few array operations.
+    """
+
+    def __init__(self, d, signed=True, seed=0, dtype=np.float32,
+                 cache_size=1 << 20):
+        """
+        :param d: The dimensionality of the hashed vectors
+        :type d: int
+
+        :param signed: Whether every feature gets a random sign
+        :type signed: bool
+
+        :param seed: The seed of the hash function
+        :type seed: int
+
+        :param dtype: The data type of the hashed vectors
+        :type dtype: numpy.dtype
+
+        :param cache_size: The maximum number of cached feature hashes, the
+                           cache is cleared when it is full
+        :type cache_size: int
+        """
+        self.d = d
+        self.signed = signed
+        self.seed = seed
+        self.dtype = dtype
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def __call__(self, records):
+        """
+        Encodes a batch of records into dense vectors, see transform
+
+        :param records: The records, one per row
+        :type records: list of (dict|list)
+
+        :return: The hashed vectors, matrix of shape (n, d)
+        :rtype: numpy.ndarray
+        """
+        return self.transform(records)
+
+    def transform(self, records, sparse=False):
+        """
+        Encodes a batch of records
+
+        :param records: The records, one per row
+        :type records: list of (dict|list)
+
+        :param sparse: Whether to return a sparse batch instead of a dense
+                       matrix
+        :type sparse: bool
+
+        :return: The hashed vectors, of shape (n, d)
+        :rtype: numpy.ndarray|chainercb.util.hashing.SparseBatch
+        """
+        indptr, indices, values = self._hash(records)
+        shape = (len(records), self.d)
+        if sparse:
+            return SparseBatch(indptr, indices, values, shape)
+        return self._densify(indptr, indices, values, shape)
+
+    def transform_actions(self, records):
+        """
+        Encodes a batch of records with one record per action per row, as
+        used by policies with action-dependent features
+
+        :param records: The records, a list of n lists of k records
+        :type records: list of list of (dict|list)
+
+        :return: The hashed vectors, array of shape (n, k, d)
+        :rtype: numpy.ndarray
+        """
+        n = len(records)
+        k = len(records[0]) if n > 0 else 0
+        if any(len(row) != k for row in records):
+            raise ValueError('every row must have the same number of actions')
+        flat = [record for row in records for record in row]
+        dense = self.transform(flat)
+        return dense.reshape((n, k, self.d))
+
+    def densify(self, batch):
+        """
+        Converts a sparse batch to a dense matrix
+
+        :param batch: The sparse batch
+        :type batch: chainercb.util.hashing.SparseBatch
+
+        :return: The dense matrix
+        :rtype: numpy.ndarray
+        """
+        return self._densify(*batch)
+
+    def _hash(self, records):
+        """
+        Hashes all features of a batch of records
+
+        :param records: The records
+        :type records: list of (dict|list)
+
+        :return: The row pointers, column indices and signed values in CSR
+                 format
+        :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        """
+        cache = self._cache
+        if len(cache) > self.cache_size:
+            cache.clear()
+        lengths = np.empty(len(records), dtype=np.int64)
+        hashes = []
+        values = []
+        for i, record in enumerate(records):
+            if isinstance(record, dict):
+                record = record.items()
+            count = 0
+            for item in record:
+                if isinstance(item, str):
+                    feature, value = item, 1.0
+                else:
+                    feature, value = item
+                # Features are cached by the text that is hashed, features
+                # that compare equal but print differently (1, 1.0 and True)
+                # hash differently
+                if not isinstance(feature, str):
+                    feature = str(feature)
+                h = cache.get(feature)
+                if h is None:
+                    h = cache[feature] = zlib.crc32(
+                        feature.encode('utf-8'), self.seed)
+                hashes.append(h)
+                values.append(value)
+                count += 1
+            lengths[i] = count
+
+        indptr = np.zeros(len(records) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        hashes = np.array(hashes, dtype=np.uint32)
+        indices = (hashes % self.d).astype(np.int64)
+        values = np.array(values, dtype=self.dtype)
+        if self.signed:
+            # The highest bit decides the sign, it is independent of the index
+            # when d is a power of two smaller than 2^31
+            values *= np.where(hashes >> 31, -1.0, 1.0).astype(self.dtype)
+        return indptr, indices, values
+
+    def _densify(self, indptr, indices, values, shape):
+        """
+        Assembles a dense matrix from CSR arrays, summing colliding entries
+
+        :param indptr: The row pointers
+        :type indptr: numpy.ndarray
+
+        :param indices: The column indices
+        :type indices: numpy.ndarray
+
+        :param values: The values
+        :type values: numpy.ndarray
+
+        :param shape: The shape of the matrix
+        :type shape: (int, int)
+
+        :return: The dense matrix
+        :rtype: numpy.ndarray
+        """
+        rows = np.repeat(np.arange(shape[0]), np.diff(indptr))
+        dense = np.zeros(shape, dtype=self.dtype)
+        np.add.at(dense, (rows, indices), values)
+        return dense
@@ -0,0 +1,254 @@
+"""
+Opt-in instrumentation of the hot paths of policies and regressors. When
+enabled, every instrumented call records its wall time (as a log2 histogram)
+and optionally the peak number of bytes it allocated. Calls are keyed by their
+nesting, e.g. 'EpsilonGreedy.draw/LinUCBPolicy.max/RidgeRegression.predict',
+so the cost of a wrapped policy can be attributed to the policy it wraps.
+
+When disabled, an instrumented call costs a single global flag check.
+
+Usage::
+
+    from chainercb.util import instrumentation
+    with instrumentation.enabled(memory=True):
+        policy.draw(x)
+    instrumentation.report()
+"""
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_enabled = False
+_memory = False
+_tracing = False
+_lock = threading.Lock()
+_local = threading.local()
+_records = {}
+
+
+class Stats:
+    """
+    The statistics of all calls made with the same nesting
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+        self.histogram = {}
+
+    def add(self, elapsed, allocated):
+        """
+        Records a call
+
+        :param elapsed: The wall time of the call in nanoseconds
+        :type elapsed: int
+
+        :param allocated: The peak number of bytes allocated during the call
+        :type allocated: int
+        """
+        self.count += 1
+        self.total += elapsed * 1e-9
+        self.max = max(self.max, elapsed * 1e-9)
+        self.bytes = max(self.bytes, allocated)
+        bucket = elapsed.bit_length()
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def to_dict(self):
+        """
+        :return: The statistics, the histogram maps the upper bound of every
+                 bucket (in seconds) to its number of calls
+        :rtype: dict
+        """
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / max(1, self.count),
+            'max': self.max,
+            'peak_bytes': self.bytes,
+            'histogram': {f'{2 ** b * 1e-9:.3g}': n
+                          for b, n in sorted(self.histogram.items())}
+        }
+
+
+def enable(memory=False):
+    """
+    Enables the instrumentation
+
+    :param memory: Whether to trace the allocated bytes, this uses tracemalloc
+                   and slows down all allocations considerably
+    :type memory: bool
+    """
+    global _enabled, _memory, _tracing
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _tracing = True
+    _enabled = True
+
+
+def disable():
+    """
+    Disables the instrumentation, the recorded statistics are kept. Tracing of
+    allocations is only stopped if it was started by enable.
+    """
+    global _enabled, _memory, _tracing
+    _enabled = False
+    _memory = False
+    if _tracing:
+        tracemalloc.stop()
+        _tracing = False
+
+
+def reset():
+    """
+    Clears all recorded statistics
+    """
+    with _lock:
+        _records.clear()
+
+
+@contextmanager
+def enabled(memory=False):
+    """
+    Enables the instrumentation for the duration of a with block
+
+    :param memory: Whether to trace the allocated bytes
+    :type memory: bool
+    """
+    enable(memory)
+    try:
+        yield
+    finally:
+        disable()
+
+
+def snapshot():
+    """
+    :return: The statistics of all recorded nestings
+    :rtype: dict
+    """
+    with _lock:
+        return {path: stats.to_dict() for path, stats in _records.items()}
+
+
+def report(out=None, format='text'):
+    """
+    Writes the recorded statistics to a metrics sink
+
+    :param out: The stream to write to or None to use stdout
+    :type out: io.TextIOBase|None
+
+    :param format: Either 'text' for a table or 'json' for a JSON object
+    :type format: str
+    """
+    out = out or sys.stdout
+    stats = snapshot()
+    if format == 'json':
+        out.write(json.dumps(stats))
+        out.write('\n')
+    elif format == 'text':
+        out.write(f'{"calls":>8s} {"total (s)":>10s} {"mean (s)":>10s} '
+                  f'{"max (s)":>10s} {"peak (B)":>10s}  path\n')
+        for path in sorted(stats):
+            s = stats[path]
+            depth = path.count('/')
+            name = '  ' * depth + path.rsplit('/', 1)[-1]
+            out.write(f'{s["count"]:8d} {s["total"]:10.4g} {s["mean"]:10.4g} '
+                      f'{s["max"]:10.4g} {s["peak_bytes"]:10d}  {name}\n')
+    else:
+        raise ValueError(f"only 'text' and 'json' are valid for 'format', but "
+                         f"'{format}' is given")
+    out.flush()
+
+
+def instrumented(name, method=False):
+    """
+    Decorates a function so that its calls are recorded under given name
+
+    :param name: The name under which calls are recorded
+    :type name: str
+
+    :param method: Whether the function is a method, in which case calls are
+                   recorded as '<class of self>.<name>'
+    :type method: bool
+
+    :return: The decorator
+    :rtype: callable
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            if method:
+                return _call(f'{type(args[0]).__name__}.{name}', fn, args,
+                             kwargs)
+            return _call(name, fn, args, kwargs)
+        wrapper.__instrumented__ = True
+        return wrapper
+    return decorator
+
+
+def _call(name, fn, args, kwargs):
+    """
+    Calls a function and records its statistics. A call made directly within a
+    call of the same name, such as a super() call of an instrumented method, is
+    not recorded separately.
+
+    :param name: The name under which the call is recorded
+    :type name: str
+
+    :param fn: The function
+    :type fn: callable
+
+    :param args: The positional arguments
+    :type args: tuple
+
+    :param kwargs: The keyword arguments
+    :type kwargs: dict
+
+    :return: The result of the function
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    if stack and stack[-1][2] == name:
+        return fn(*args, **kwargs)
+    path = f'{stack[-1][0]}/{name}' if stack else name
+
+    # Every frame keeps the largest peak of its children, since tracemalloc has
+    # a single peak that is reset on entry of every instrumented call
+    memory = _memory and tracemalloc.is_tracing()
+    start_bytes = 0
+    if memory:
+        start_bytes, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+    frame = [path, 0, name]
+    stack.append(frame)
+    start = time.perf_counter_ns()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter_ns() - start
+        stack.pop()
+        allocated = 0
+        if memory:
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, frame[1])
+            allocated = peak - start_bytes
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+        with _lock:
+            stats = _records.get(path)
+            if stats is None:
+                stats = _records[path] = Stats()
+            stats.add(elapsed, allocated)
@@ -0,0 +1,153 @@
+"""
+Fixed-size approximations of the feature map of the radial basis function
+(RBF) kernel k(x, y) = exp(-gamma |x - y|^2). A linear model on these features
+approximates a kernel machine, while its cost is bounded by the number of
+features rather than by the number of observations.
+
+Both feature maps are links without trainable parameters: their state is
+stored as persistent values, so it is serialized with the link but never
+touched by an optimizer.
+"""
+import numpy as np
+from chainer import Link, functions as F
+
+
+class RandomFourierFeatures(Link):
+    def __init__(self, d, size, gamma=1.0, dtype=np.float32):
+        """
+        Random Fourier features (Rahimi and Recht, 2007), where the inner
+        product of two feature vectors is an unbiased estimate of the RBF
+        kernel. The error shrinks with the square root of the number of
+        features.
+
+        :param d: The dimensionality of the inputs
+        :type d: int
+
+        :param size: The number of features
+        :type size: int
+
+        :param gamma: The inverse width of the kernel
+        :type gamma: float
+
+        :param dtype: The data type of the features
+        :type dtype: numpy.dtype
+        """
+        super().__init__()
+        self.size = size
+        self.gamma = gamma
+        W = np.random.normal(0.0, np.sqrt(2.0 * gamma), size=(size, d))
+        b = np.random.uniform(0.0, 2.0 * np.pi, size=size)
+        self.add_persistent('W', W.astype(dtype))
+        self.add_persistent('b', b.astype(dtype))
+
+    def forward(self, x):
+        """
+        Maps a batch of inputs to their features
+
+        :param x: The inputs, matrix of shape (n, d)
+        :type x: chainer.Variable
+
+        :return: The features, matrix of shape (n, size)
+        :rtype: chainer.Variable
+        """
+        x = F.cast(x, self.W.dtype)
+        return F.cos(F.linear(x, self.W, self.b)) * np.sqrt(2.0 / self.size)
+
+
+class Nystroem(Link):
+    def __init__(self, landmarks, gamma=1.0, dtype=np.float32):
+        """
+        The Nystroem approximation, which represents inputs by their kernel
+        values with a fixed set of landmarks, whitened by the inverse square
+        root of the kernel matrix of the landmarks. The approximation is exact
+        on the span of the landmarks.
+
+        :param landmarks: The landmarks, matrix of shape (size, d)
+        :type landmarks: numpy.ndarray
+
+        :param gamma: The inverse width of the kernel
+        :type gamma: float
+
+        :param dtype: The data type of the features
+        :type dtype: numpy.dtype
+        """
+        super().__init__()
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        self.size = landmarks.shape[0]
+        self.gamma = gamma
+
+        # Directions with a negligible eigenvalue, such as those of repeated
+        # landmarks, are not spanned by the landmarks and are dropped rather
+        # than amplified
+        K = _rbf(landmarks, landmarks, gamma)
+        s, U = np.linalg.eigh(K)
+        keep = s > 1e-10 * s.max()
+        U = U[:, keep]
+        self.add_persistent('landmarks', landmarks.astype(dtype))
+        self.add_persistent('normalization',
+                            (U / np.sqrt(s[keep])).dot(U.T).astype(dtype))
+
+    @classmethod
+    def sample(cls, x, size, gamma=1.0, dtype=np.float32):
+        """
+        Creates a Nystroem approximation with landmarks sampled uniformly
+        without replacement from given inputs, e.g. the contexts in a replay
+        buffer
+
+        :param x: The inputs to sample from, matrix of shape (n, d)
+        :type x: numpy.ndarray
+
+        :param size: The number of landmarks
+        :type size: int
+
+        :param gamma: The inverse width of the kernel
+        :type gamma: float
+
+        :param dtype: The data type of the features
+        :type dtype: numpy.dtype
+
+        :return: The Nystroem approximation
+        :rtype: chainercb.util.kernel.Nystroem
+        """
+        x = np.asarray(getattr(x, 'array', x))
+        rows = np.random.choice(x.shape[0], size=min(size, x.shape[0]),
+                                replace=False)
+        return cls(x[rows], gamma, dtype)
+
+    def forward(self, x):
+        """
+        Maps a batch of inputs to their features
+
+        :param x: The inputs, matrix of shape (n, d)
+        :type x: chainer.Variable
+
+        :return: The features, matrix of shape (n, size)
+        :rtype: chainer.Variable
+        """
+        x = F.cast(x, self.landmarks.dtype)
+        distances = F.sum(x * x, axis=1, keepdims=True) - 2.0 * F.matmul(
+            x, self.landmarks, transb=True) + self.xp.sum(
+            self.landmarks ** 2, axis=1)
+        K = F.exp(-self.gamma * F.relu(distances))
+        return F.matmul(K, self.normalization)
+
+
+def _rbf(x, y, gamma):
+    """
+    Computes the RBF kernel matrix
+
+    :param x: The first inputs, matrix of shape (n, d)
+    :type x: numpy.ndarray
+
+    :param y: The second inputs, matrix of shape (m, d)
+    :type y: numpy.ndarray
+
+    :param gamma: The inverse width of the kernel
+    :type gamma: float
+
+    :return: The kernel matrix of shape (n, m)
+    :rtype: numpy.ndarray
+    """
+    distances = np.sum(x ** 2, axis=1)[:, None] - 2.0 * x.dot(y.T) + \
+        np.sum(y ** 2, axis=1)
+    return np.exp(-gamma * np.maximum(distances, 0.0))
@@ -0,0 +1,33 @@
+import importlib
+
+
+def lazy_exports(package, exports):
+    """
+    Creates the module level __getattr__ and __dir__ functions (PEP 562) of a
+    package whose public names are only imported from their submodules when
+    they are first accessed
+
+    :param package: The name of the package
+    :type package: str
+
+    :param exports: A mapping from every public name to the submodule that
+                    defines it
+    :type exports: dict
+
+    :return: The __getattr__ and __dir__ functions of the package
+    :rtype: (callable, callable)
+    """
+    module = importlib.import_module(package)
+
+    def __getattr__(name):
+        if name not in exports:
+            raise AttributeError(f"module '{package}' has no attribute "
+                                 f"'{name}'")
+        value = getattr(importlib.import_module(exports[name]), name)
+        setattr(module, name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(module)) | set(exports))
+
+    return __getattr__, __dir__
@@ -0,0 +1,77 @@
+from chainercb.util.instrumentation import instrumented
+from chainercb.util.ridge import RidgeRegression, _as_variable, _data
+
+
+class LogisticRegression(RidgeRegression):
+    """
+    A Bayesian logistic regression for binary (e.g. click) rewards, fitted
+    online with a Laplace approximation of the posterior. The posterior is a
+    normal distribution with mean theta and precision A, and the
+    regularization is the precision of the normal prior on theta.
+
+    Every observation takes a single Newton step: the precision grows by the
+    curvature p (1 - p) x x^T of the log-likelihood at the current mean, which
+    is a rank-one update of A and its inverse, and the mean moves by the
+    inverse precision times the gradient. An observation thus costs O(d^2) and
+    no history is refitted.
+
+    Predictions, upper confidence bounds and thompson samples are on the scale
+    of the logits, which preserves the ranking of the arms. Use predict_proba
+    for click probabilities.
+    """
+
+    @instrumented('LogisticRegression.update')
+    def update(self, x, r):
+        """
+        Updates the logistic regression estimate, one observation at a time
+
+        :param x: Batch of feature vectors, matrix of shape (n, d)
+        :type x: chainer.Variable
+
+        :param r: Batch of rewards in [0, 1], vector of shape (n)
+        :type r: chainer.Variable
+        """
+        x = _data(x)
+        r = _data(r)
+        for x_i, r_i in zip(x, r):
+            p = _sigmoid(self.xp, x_i.dot(self._theta))
+            w = p * (1.0 - p)
+            self._A += w * self.xp.outer(x_i, x_i)
+            self._rank_one(self.xp.sqrt(w) * x_i, 1.0)
+            self._theta -= self._A_inv.dot((p - r_i) * x_i)
+        self._maintain(x.shape[0])
+        self._refresh()
+
+    def _solve(self):
+        # The mean is updated directly by the Newton steps rather than solved
+        # from the accumulated targets
+        self._refresh()
+
+    def predict_proba(self, x):
+        """
+        Predicts the probability of a positive reward for given batch of
+        feature vectors x, at the posterior mean
+
+        :param x: Batch of feature vectors, matrix of shape (n, d)
+        :type x: chainer.Variable
+
+        :return: The predicted probabilities, vector of shape (n)
+        :rtype: chainer.Variable
+        """
+        return _as_variable(_sigmoid(self.xp, self.predict(x).data))
+
+
+def _sigmoid(xp, z):
+    """
+    Computes the logistic function
+
+    :param xp: The array module
+    :type xp: module
+
+    :param z: The logits
+    :type z: float|numpy.ndarray|cupy.ndarray
+
+    :return: The probabilities
+    :rtype: float|numpy.ndarray|cupy.ndarray
+    """
+    return 1.0 / (1.0 + xp.exp(-z))
@@ -0,0 +1,264 @@
+from collections import namedtuple
+
+import numpy as np
+
+from chainercb.util.ring import RingBuffer
+
+Batch = namedtuple('Batch', ['x', 'actions', 'log_p', 'rewards', 'slots',
+                             'weights'])
+Batch.__doc__ = """
+A minibatch of logged bandit feedback. The first four fields are chainer
+variables that can be passed straight to the loss functions, e.g.
+loss.ips(*batch[:4], policy). The slots identify the sampled rows (to update
+their priorities) and the weights are the importance weights 1 / (N P(i))
+that correct for prioritized sampling (all ones for uniform sampling).
+"""
+
+
+class ReplayBuffer:
+    """
+    A fixed-capacity buffer of logged bandit feedback (contexts, actions, log
+    propensities and rewards) stored in preallocated columns. Appending costs
+    O(1) per row and once the buffer is full the oldest rows are overwritten.
+
+    Minibatches are sampled uniformly or, when the buffer is prioritized,
+    proportional to a priority per row (e.g. the importance weight of the
+    row) using a sum-tree, which costs O(log capacity) per sampled row.
+    """
+
+    def __init__(self, capacity, prioritized=False):
+        """
+        :param capacity: The maximum number of rows
+        :type capacity: int
+
+        :param prioritized: Whether to sample proportional to priorities
+        :type prioritized: bool
+        """
+        self._ring = RingBuffer(capacity)
+        self._tree = SumTree(capacity) if prioritized else None
+        self._max_priority = 1.0
+
+    @property
+    def capacity(self):
+        return self._ring.capacity
+
+    @property
+    def prioritized(self):
+        return self._tree is not None
+
+    def __len__(self):
+        return len(self._ring)
+
+    def append(self, x, actions, log_p, rewards, priorities=None):
+        """
+        Appends a batch of logged feedback, for example the output of a bandify
+        chain or the arguments of its hooks
+
+        :param x: The context vectors
+        :type x: chainer.Variable|numpy.ndarray
+
+        :param actions: The executed actions
+        :type actions: chainer.Variable|numpy.ndarray
+
+        :param log_p: The log propensity scores of the actions
+        :type log_p: chainer.Variable|numpy.ndarray
+
+        :param rewards: The rewards
+        :type rewards: chainer.Variable|numpy.ndarray
+
+        :param priorities: The (positive) priorities of the rows or None to
+                           use the largest priority seen so far
+        :type priorities: numpy.ndarray|None
+
+        :return: The slots the rows were written to
+        :rtype: numpy.ndarray
+        """
+        x, actions, log_p, rewards = (_data(v) for v in
+                                      (x, actions, log_p, rewards))
+        n = x.shape[0]
+        if n > self.capacity:
+            # Only the newest rows would survive
+            x, actions, log_p, rewards = (v[-self.capacity:] for v in
+                                          (x, actions, log_p, rewards))
+            if priorities is not None:
+                priorities = priorities[-self.capacity:]
+            n = self.capacity
+        slots = self._ring.push(n, x=x, actions=actions, log_p=log_p,
+                                rewards=rewards)
+        if self._tree is not None:
+            if priorities is None:
+                priorities = np.full(n, self._max_priority)
+            self.update_priorities(slots, priorities)
+        return slots
+
+    def update_priorities(self, slots, priorities):
+        """
+        Updates the priorities of rows
+
+        :param slots: The slots of the rows
+        :type slots: numpy.ndarray
+
+        :param priorities: The new (positive) priorities
+        :type priorities: numpy.ndarray
+        """
+        if self._tree is None:
+            raise RuntimeError('the replay buffer is not prioritized')
+        priorities = np.asarray(_data(priorities), dtype=np.float64)
+        self._max_priority = max(self._max_priority, float(priorities.max()))
+        self._tree.set(np.asarray(slots), priorities)
+
+    def sample(self, batch_size):
+        """
+        Samples a minibatch (with replacement)
+
+        :param batch_size: The number of rows to sample
+        :type batch_size: int
+
+        :return: The minibatch
+        :rtype: chainercb.util.replay.Batch
+        """
+        if len(self) == 0:
+            raise RuntimeError('can not sample from an empty replay buffer')
+        if self._tree is None:
+            slots = np.random.randint(len(self), size=batch_size)
+            weights = np.ones(batch_size)
+        else:
+            # Stratified sampling: one sample from every equal share of the
+            # total priority
+            total = self._tree.total
+            u = (np.arange(batch_size) + np.random.random(batch_size)) * \
+                (total / batch_size)
+            slots = np.minimum(self._tree.find(u), len(self) - 1)
+            weights = total / (len(self) * self._tree.get(slots))
+        return self._batch(slots, weights.astype(np.float32))
+
+    def views(self, batch_size):
+        """
+        Iterates over all rows in minibatches that are views of the underlying
+        storage, no data is copied. Rows are visited in storage order.
+
+        :param batch_size: The number of rows per minibatch
+        :type batch_size: int
+
+        :return: The minibatches
+        :rtype: generator of chainercb.util.replay.Batch
+        """
+        weights = np.ones(batch_size, dtype=np.float32)
+        for start in range(0, len(self), batch_size):
+            stop = min(start + batch_size, len(self))
+            yield self._batch(slice(start, stop), weights[:stop - start])
+
+    def _batch(self, slots, weights):
+        """
+        Creates a minibatch of given rows
+
+        :param slots: The slots of the rows, a slice gives views
+        :type slots: numpy.ndarray|slice
+
+        :param weights: The importance weights
+        :type weights: numpy.ndarray
+
+        :return: The minibatch
+        :rtype: chainercb.util.replay.Batch
+        """
+        from chainer import Variable
+        columns = self._ring.columns
+        if isinstance(slots, slice):
+            index = np.arange(slots.start, slots.stop)
+        else:
+            index = slots
+        return Batch(Variable(columns['x'][slots]),
+                     Variable(columns['actions'][slots]),
+                     Variable(columns['log_p'][slots]),
+                     Variable(columns['rewards'][slots]),
+                     index, weights)
+
+
+class SumTree:
+    """
+    A binary tree where every internal node holds the sum of its children. The
+    leaves hold non-negative values and a value can be found by a prefix sum
+    of all leaves in O(log n).
+    """
+
+    def __init__(self, size):
+        """
+        :param size: The number of leaves
+        :type size: int
+        """
+        self.size = size
+        self._leaves = 1 << max(0, (size - 1).bit_length())
+        self._tree = np.zeros(2 * self._leaves - 1)
+
+    @property
+    def total(self):
+        """
+        :return: The sum of all leaves
+        :rtype: float
+        """
+        return float(self._tree[0])
+
+    def get(self, index):
+        """
+        :param index: The indices of the leaves
+        :type index: numpy.ndarray
+
+        :return: The values of the leaves
+        :rtype: numpy.ndarray
+        """
+        return self._tree[index + self._leaves - 1]
+
+    def set(self, index, values):
+        """
+        Sets the values of leaves and updates the sums on their paths to the
+        root
+
+        :param index: The indices of the leaves
+        :type index: numpy.ndarray
+
+        :param values: The new values
+        :type values: numpy.ndarray
+        """
+        node = np.asarray(index) + self._leaves - 1
+        self._tree[node] = values
+        while node[0] > 0:
+            node = np.unique((node - 1) // 2)
+            self._tree[node] = self._tree[2 * node + 1] + \
+                self._tree[2 * node + 2]
+
+    def find(self, prefix):
+        """
+        Finds the leaves at which the cumulative sums of the leaves reach given
+        prefix sums
+
+        :param prefix: The prefix sums, in [0, total)
+        :type prefix: numpy.ndarray
+
+        :return: The indices of the leaves
+        :rtype: numpy.ndarray
+        """
+        prefix = np.array(prefix, dtype=np.float64)
+        node = np.zeros(prefix.shape, dtype=np.int64)
+        for _ in range(self._leaves.bit_length() - 1):
+            left = 2 * node + 1
+            go_right = prefix >= self._tree[left]
+            prefix -= np.where(go_right, self._tree[left], 0.0)
+            node = np.where(go_right, left + 1, left)
+        index = node - (self._leaves - 1)
+
+        # Rounding can make the search end up in an empty leaf past the last
+        # one that holds a value
+        return np.minimum(index, self.size - 1)
+
+
+def _data(x):
+    """
+    Gets the raw array of a variable or array
+
+    :param x: The variable or array
+    :type x: chainer.Variable|numpy.ndarray
+
+    :return: The raw array
+    :rtype: numpy.ndarray
+    """
+    return np.asarray(getattr(x, 'array', x))
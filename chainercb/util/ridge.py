@@ -1,12 +1,45 @@
-from collections import deque
-
 import numpy as np
-from chainer import as_variable
-from chainer.backends import cuda
+
+from chainercb.util.instrumentation import instrumented
 
 
 class RidgeRegression:
-    def __init__(self, d, alpha=1.0, regularization=1.0, device=None):
+    """
+    A ridge regression whose inverse is maintained incrementally: a single
+    observation updates the inverse with a Sherman-Morrison rank-one update in
+    O(d^2). Every rank-one update adds a little rounding error, so the inverse
+    slowly drifts away from the inverse of A. The drift is monitored with a
+    fixed probe vector p as |A A^-1 p - p| and the inverse is recomputed from A
+    (a refactorization) every refactor_every rank-one updates or as soon as the
+    drift exceeds drift_tolerance.
+
+    The state is accumulated in dtype. When a serving dtype is given, the
+    predictions are computed from copies of theta and A^-1 in that dtype, e.g.
+    float64 accumulators with float32 copies for fast scoring.
+
+    The state is updated in place, since it may be backed by the slabs of an
+    arm registry, so its dtype is fixed when the regression is created rather
+    than promoted to the dtype of the observed contexts. The default is
+    float64: rank-one updates of a float32 inverse lose accuracy quickly
+    (predictions after a few hundred updates are off by about 1e-3). This
+    takes twice the memory of float32 state and predictions are float64. Pass
+    dtype=numpy.float32 to halve the memory per arm, or
+    serving_dtype=numpy.float32 to keep float64 accumulators and serve float32
+    predictions.
+    """
+
+    # Attributes holding the model state, these are always updated in place so
+    # that they can be backed by externally allocated storage. The counters
+    # hold the number of rank-one updates since the last refactorization and
+    # the number of refactorizations. The cholesky decomposition of A^-1 is
+    # cached together with a flag that tells whether it is up to date, so that
+    # the decompositions of many arms can be reused from a slab
+    _slab_fields = ('_A', '_A_inv', '_b', '_theta', '_counters', '_cho',
+                    '_cho_valid')
+
+    def __init__(self, d, alpha=1.0, regularization=1.0, device=None,
+                 dtype=np.float64, serving_dtype=None, refactor_every=None,
+                 drift_tolerance=None):
         """
         Initializes the ridge regression estimate
 
@@ -21,21 +54,93 @@ class RidgeRegression:
 
         :param device: Device on which to perform ridge regression
         :type device: int|None
+
+        :param dtype: The data type in which the state is accumulated, see
+                      above for the trade-off of the float64 default
+        :type dtype: numpy.dtype
+
+        :param serving_dtype: The data type of the copies of theta and A^-1
+                              used for predictions or None to predict from the
+                              accumulated state directly
+        :type serving_dtype: numpy.dtype|None
+
+        :param refactor_every: The number of rank-one updates after which the
+                               inverse is recomputed from A or None to never
+                               refactorize on a schedule
+        :type refactor_every: int|None
+
+        :param drift_tolerance: The drift of the inverse after which it is
+                                recomputed from A or None to not monitor the
+                                drift. Checking the drift costs O(d^2) per
+                                update
+        :type drift_tolerance: float|None
         """
         self.device = device
         self._set_xp()
         self._d = d
         self._alpha = alpha
         self._regularization = regularization
+        self._dtype = np.dtype(dtype)
+        self._serving_dtype = None if serving_dtype is None else \
+            np.dtype(serving_dtype)
+        self._refactor_every = refactor_every
+        self._drift_tolerance = drift_tolerance
         self._A = self.xp.identity(self._d,
-                                   dtype=np.float32) * self._regularization
+                                   dtype=self._dtype) * self._regularization
         self._A_inv = self.xp.identity(self._d,
-                                       dtype=np.float32) / self._regularization
-        self._b = self.xp.zeros(self._d, dtype=np.float32)
+                                       dtype=self._dtype) / self._regularization
+        self._b = self.xp.zeros(self._d, dtype=self._dtype)
         self._theta = self._A_inv.dot(self._b)
-        self._compute_cholesky = True
-        self._cho = None
+        self._counters = self.xp.zeros(2, dtype=np.int64)
+        if self._serving_dtype is not None:
+            self._slab_fields = self._slab_fields + ('_theta_serving',
+                                                     '_A_inv_serving')
+            self._theta_serving = self._theta.astype(self._serving_dtype)
+            self._A_inv_serving = self._A_inv.astype(self._serving_dtype)
+
+        # The probe is a fixed unit vector, drawn from its own random state so
+        # that it does not consume the global one
+        probe = np.random.RandomState(d).standard_normal(d)
+        self._probe = self.xp.asarray(probe / np.linalg.norm(probe),
+                                      dtype=self._dtype)
+        self._cho = self.xp.zeros((self._d, self._d), dtype=self._dtype)
+        self._cho_valid = self.xp.zeros(1, dtype=bool)
+
+    @property
+    def updates_since_refactorization(self):
+        """
+        :return: The number of rank-one updates applied to the inverse since
+                 it was last computed from A
+        :rtype: int
+        """
+        return int(self._counters[0])
+
+    @property
+    def refactorizations(self):
+        """
+        :return: The number of times the inverse was recomputed from A because
+                 of the schedule or the drift
+        :rtype: int
+        """
+        return int(self._counters[1])
+
+    def serving_field(self, name):
+        """
+        Gets the name of the attribute from which predictions read a state
+        field
+
+        :param name: The name of the state field, '_theta' or '_A_inv'
+        :type name: str
 
+        :return: The name of the serving copy of the field, or the field itself
+                 if there is no serving dtype
+        :rtype: str
+        """
+        if self._serving_dtype is None:
+            return name
+        return f'{name}_serving'
+
+    @instrumented('RidgeRegression.update')
     def update(self, x, r):
         """
         Updates the ridge regression estimate
@@ -46,19 +151,30 @@ class RidgeRegression:
         :param r: Batch of targets, vector of shape (n)
         :type r: chainer.Variable
         """
-        x = x.data
-        r = r.data
+        x = _data(x)
+        r = _data(r)
         x_m = self.xp.reshape(x, (x.shape[0], x.shape[1], 1))
         x_m_T = self.xp.reshape(x, (x.shape[0], 1, x.shape[1]))
         to_add = self.xp.sum(self.xp.matmul(x_m, x_m_T), axis=0)
         self._A += to_add
         self._b += self.xp.sum(self.xp.broadcast_to(r[:, None], x.shape) * x,
                                axis=0)
+        self._invert(x)
+        self._solve()
+
+    @instrumented('RidgeRegression.inversion')
+    def _invert(self, x):
+        """
+        Updates the inverse of A after the given feature vectors were added
+
+        :param x: Batch of feature vectors, matrix of shape (n, d)
+        :type x: numpy.ndarray
+        """
         if x.shape[0] == 1:
             # Perform Sherman-Morrison fast incremental inversion update
             prev = self._A_inv
-            x_m = x_m[0, :, :]
-            x_m_T = x_m_T[0, :, :]
+            x_m = x[0, :, None]
+            x_m_T = x[0, None, :]
 
             numerator = self.xp.matmul(prev, x_m)
             numerator = self.xp.matmul(numerator, x_m_T)
@@ -68,13 +184,86 @@ class RidgeRegression:
             denominator = self.xp.matmul(denominator, x_m)
             denominator = 1 + denominator
 
-            self._A_inv = prev - numerator / denominator
+            self._A_inv[...] = prev - numerator / denominator
+            self._maintain(1)
         else:
             # Compute actual matrix inverse
-            self._A_inv = self.xp.linalg.inv(self._A)
-        self._compute_cholesky = True
-        self._theta = self._A_inv.dot(self._b)
+            self._A_inv[...] = self.xp.linalg.inv(self._A)
+            self._counters[0] = 0
+
+    def _rank_one(self, x, sign):
+        """
+        Updates the inverse of A after adding (sign 1) or removing (sign -1) a
+        single feature vector, using the Sherman-Morrison formula in O(d^2)
+
+        :param x: The feature vector, vector of shape (d)
+        :type x: numpy.ndarray
+
+        :param sign: 1.0 to add the vector or -1.0 to remove it
+        :type sign: float
+        """
+        A_inv_x = self._A_inv.dot(x)
+        denominator = 1.0 + sign * x.dot(A_inv_x)
+        self._A_inv -= sign * self.xp.outer(A_inv_x, A_inv_x) / denominator
+
+    def _maintain(self, n):
+        """
+        Records rank-one updates of the inverse and refactorizes when the
+        schedule or the drift calls for it
+
+        :param n: The number of rank-one updates that were applied
+        :type n: int
+        """
+        self._counters[0] += n
+        if self._refactor_every is not None and \
+                self._counters[0] >= self._refactor_every:
+            self.refactorize()
+        elif self._drift_tolerance is not None and \
+                self.drift() > self._drift_tolerance:
+            self.refactorize()
+
+    def drift(self):
+        """
+        Measures how far the incrementally maintained inverse has drifted from
+        the inverse of A, as the error |A A^-1 p - p| on a fixed unit probe
+        vector p. This costs O(d^2).
+
+        :return: The drift, 0 for an exact inverse
+        :rtype: float
+        """
+        residual = self._A.dot(self._A_inv.dot(self._probe)) - self._probe
+        return float(self.xp.sqrt(residual.dot(residual)))
 
+    @instrumented('RidgeRegression.refactorization')
+    def refactorize(self):
+        """
+        Recomputes the inverse of A (and theta) from A, which removes the
+        rounding error accumulated by rank-one updates. This costs O(d^3).
+        """
+        A_inv = self.xp.linalg.inv(self._A)
+        self._A_inv[...] = (A_inv + A_inv.T) / 2
+        self._counters[0] = 0
+        self._counters[1] += 1
+        self._solve()
+
+    def _solve(self):
+        """
+        Recomputes theta after the state changed
+        """
+        self._theta[...] = self._A_inv.dot(self._b)
+        self._refresh()
+
+    def _refresh(self):
+        """
+        Invalidates the cached decomposition and refreshes the serving copies
+        after the state changed
+        """
+        self._cho_valid[0] = False
+        if self._serving_dtype is not None:
+            self._theta_serving[...] = self._theta
+            self._A_inv_serving[...] = self._A_inv
+
+    @instrumented('RidgeRegression.predict')
     def predict(self, x):
         """
         Predicts target values for given batch of feature vectors x
@@ -85,8 +274,10 @@ class RidgeRegression:
         :return: Predicted target values, vector of shape (n)
         :rtype: numpy.ndarray
         """
-        return as_variable(self.xp.dot(self._theta, x.data.T))
+        theta = getattr(self, self.serving_field('_theta'))
+        return _as_variable(self.xp.dot(theta, _data(x).T))
 
+    @instrumented('RidgeRegression.ucb')
     def ucb(self, x):
         """
         Computes the upper confidence bound on predictions for given batch of
@@ -100,10 +291,12 @@ class RidgeRegression:
         :rtype: numpy.ndarray
         """
         mean = self.predict(x).data
-        x = x.data
-        dev = self.xp.diag(self.xp.dot(self.xp.dot(x, self._A_inv), x.T))
-        return as_variable(mean + self._alpha * self.xp.sqrt(dev))
+        x = _data(x)
+        A_inv = getattr(self, self.serving_field('_A_inv'))
+        dev = self.xp.sum(self.xp.dot(x, A_inv) * x, axis=1)
+        return _as_variable(mean + self._alpha * self.xp.sqrt(dev))
 
+    @instrumented('RidgeRegression.thompson')
     def thompson(self, x):
         """
         Computes thompson sampled predictions for given batch of feature
@@ -119,14 +312,16 @@ class RidgeRegression:
 
         # This samples a theta from a multivariate normal, we avoid using
         # np.random.multivariate_normal due to numerical stability
-        x = x.data
+        x = _data(x)
+        theta = getattr(self, self.serving_field('_theta'))
         cho = self._cholesky_decomposition()
-        u = self.xp.random.standard_normal(size=self._theta.shape)
-        sampled_theta = self._theta + self.xp.matmul(cho, u)
+        u = self.xp.random.standard_normal(size=theta.shape)
+        sampled_theta = theta + self.xp.matmul(cho, u).astype(theta.dtype)
 
         # Predictions based on the sampled theta
-        return as_variable(self.xp.dot(sampled_theta, x.T))
+        return _as_variable(self.xp.dot(sampled_theta, x.T))
 
+    @instrumented('RidgeRegression.thompson_distribution')
     def thompson_distribution(self, x):
         """
         Computes the distribution of the thompson sampled predictions for given
@@ -139,11 +334,13 @@ class RidgeRegression:
                  and the second entry contains the std for the batch
         :rtype: (chainer.Variable, chainer.Variable)
         """
-        x = x.data
-        mean = self.xp.dot(x, self._theta)
-        std = self.xp.diag(self.xp.matmul(self.xp.matmul(x, self._A_inv), x.T))
+        x = _data(x)
+        theta = getattr(self, self.serving_field('_theta'))
+        A_inv = getattr(self, self.serving_field('_A_inv'))
+        mean = self.xp.dot(x, theta)
+        std = self.xp.sum(self.xp.matmul(x, A_inv) * x, axis=1)
         std = self.xp.sqrt(std)
-        return as_variable(mean), as_variable(std)
+        return _as_variable(mean), _as_variable(std)
 
     def _cholesky_decomposition(self):
         """
@@ -154,11 +351,26 @@ class RidgeRegression:
         :return: The cholesky decomposition of A inverse
         :rtype: numpy.ndarray|cupy.ndarray
         """
-        if self._compute_cholesky:
-            self._cho = self.xp.linalg.cholesky(self._A_inv)
-            self._compute_cholesky = False
+        if not self._cho_valid[0]:
+            try:
+                self._cho[...] = self._decompose()
+            except np.linalg.LinAlgError:
+                # A drifted inverse may no longer be positive definite
+                self.refactorize()
+                self._cho[...] = self._decompose()
+            self._cho_valid[0] = True
         return self._cho
 
+    @instrumented('RidgeRegression.cholesky')
+    def _decompose(self):
+        """
+        Computes the cholesky decomposition of A inverse
+
+        :return: The cholesky decomposition of A inverse
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        return self.xp.linalg.cholesky(self._A_inv)
+
     def __getstate__(self):
         # This customizes pickle behavior (to prevent xp from being pickled)
         d = dict(self.__dict__)
@@ -176,8 +388,175 @@ class RidgeRegression:
         CPU or GPU.
         """
         if self.device is None:
-            self.xp = cuda.get_array_module(np.array([0.0]))
+            self.xp = np
         else:
+            from chainer.backends import cuda
             self.xp = cuda.get_array_module(cuda.to_gpu(np.array([0.0]),
                                                         device=self.device))
 
+
+class DiscountedRidgeRegression(RidgeRegression):
+    """
+    A ridge regression that exponentially forgets old observations, every
+    observation discounts the contribution of all previous observations by a
+    factor gamma. This is recursive least squares with a forgetting factor, so
+    the estimate tracks a drifting target. Only the observations are
+    forgotten, the regularization is restored at every step, so directions
+    that are rarely or never observed (e.g. of one-hot or hashed features) keep
+    their prior rather than an exploding variance.
+
+    Restoring the regularization changes A in every direction, so the inverse
+    of A is recomputed once per update, which costs O(d^3).
+    """
+
+    def __init__(self, d, alpha=1.0, regularization=1.0, device=None,
+                 gamma=0.99, **kwargs):
+        """
+        Initializes the ridge regression estimate
+
+        :param d: The dimensionality
+        :type d: int
+
+        :param alpha: The variance scaling factor
+        :type alpha: float
+
+        :param regularization: The regularization parameter
+        :type regularization: float
+
+        :param device: Device on which to perform ridge regression
+        :type device: int|None
+
+        :param gamma: The forgetting factor in (0, 1], the effective number of
+                      remembered observations is 1 / (1 - gamma)
+        :type gamma: float
+
+        :param kwargs: The precision and refactorization options of
+                       chainercb.util.RidgeRegression
+        :type kwargs: dict
+        """
+        if not 0.0 < gamma <= 1.0:
+            raise ValueError(f'the forgetting factor must be in (0, 1], but '
+                             f'{gamma} is given')
+        super().__init__(d, alpha, regularization, device, **kwargs)
+        self._gamma = gamma
+
+    @instrumented('DiscountedRidgeRegression.update')
+    def update(self, x, r):
+        # Observations are applied to A one at a time, each costs O(d^2), and
+        # the discounted regularization is added back at every step
+        x = _data(x)
+        r = _data(r)
+        diagonal = self.xp.arange(self._d)
+        restore = (1.0 - self._gamma) * self._regularization
+        for x_i, r_i in zip(x, r):
+            self._A *= self._gamma
+            self._A[diagonal, diagonal] += restore
+            self._A += self.xp.outer(x_i, x_i)
+            self._b *= self._gamma
+            self._b += r_i * x_i
+        A_inv = self.xp.linalg.inv(self._A)
+        self._A_inv[...] = (A_inv + A_inv.T) / 2
+        self._counters[0] = 0
+        self._solve()
+
+
+class WindowedRidgeRegression(RidgeRegression):
+    """
+    A ridge regression over the most recent observations only. The last
+    window observations are kept in a ring and when a new observation pushes
+    the oldest one out, its contribution is removed again (a downdate), so
+    every observation costs O(d^2) and memory is bounded by the window.
+    """
+
+    _slab_fields = RidgeRegression._slab_fields + ('_window_x', '_window_r',
+                                                   '_window_pos')
+
+    def __init__(self, d, alpha=1.0, regularization=1.0, device=None,
+                 window=1000, **kwargs):
+        """
+        Initializes the ridge regression estimate
+
+        :param d: The dimensionality
+        :type d: int
+
+        :param alpha: The variance scaling factor
+        :type alpha: float
+
+        :param regularization: The regularization parameter
+        :type regularization: float
+
+        :param device: Device on which to perform ridge regression
+        :type device: int|None
+
+        :param window: The number of most recent observations to fit
+        :type window: int
+
+        :param kwargs: The precision and refactorization options of
+                       chainercb.util.RidgeRegression
+        :type kwargs: dict
+        """
+        super().__init__(d, alpha, regularization, device, **kwargs)
+        self._window = window
+        self._window_x = self.xp.zeros((window, d), dtype=self._dtype)
+        self._window_r = self.xp.zeros(window, dtype=self._dtype)
+        self._window_pos = self.xp.zeros(1, dtype=np.int64)
+
+    @property
+    def size(self):
+        """
+        :return: The number of observations currently in the window
+        :rtype: int
+        """
+        return min(int(self._window_pos[0]), self._window)
+
+    @instrumented('WindowedRidgeRegression.update')
+    def update(self, x, r):
+        # Observations are applied one at a time, each costs O(d^2)
+        x = _data(x)
+        r = _data(r)
+        updates = x.shape[0]
+        for x_i, r_i in zip(x, r):
+            pos = int(self._window_pos[0])
+            slot = pos % self._window
+            if pos >= self._window:
+                x_o = self._window_x[slot]
+                self._A -= self.xp.outer(x_o, x_o)
+                self._b -= self._window_r[slot] * x_o
+                self._rank_one(x_o, -1.0)
+                updates += 1
+            self._A += self.xp.outer(x_i, x_i)
+            self._b += r_i * x_i
+            self._rank_one(x_i, 1.0)
+            self._window_x[slot] = x_i
+            self._window_r[slot] = r_i
+            self._window_pos[0] = pos + 1
+        self._maintain(updates)
+        self._solve()
+
+
+def _data(x):
+    """
+    Gets the raw array of a variable or array
+
+    :param x: The variable or array
+    :type x: chainer.Variable|numpy.ndarray|cupy.ndarray
+
+    :return: The raw array
+    :rtype: numpy.ndarray|cupy.ndarray
+    """
+    return getattr(x, 'array', x)
+
+
+def _as_variable(array):
+    """
+    Wraps an array in a variable. Chainer is imported on first use, so that
+    the regression itself can be imported and updated without it.
+
+    :param array: The array
+    :type array: numpy.ndarray|cupy.ndarray
+
+    :return: The variable
+    :rtype: chainer.Variable
+    """
+    from chainer import as_variable
+    return as_variable(array)
@@ -0,0 +1,116 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    A fixed-capacity buffer of preallocated columns (one array of shape
+    (capacity, ...) per column). Rows are written at a head that wraps around,
+    so once the buffer is full every new row overwrites the oldest one.
+
+    Columns are allocated on first use, from the shape and dtype of a single
+    row, and the buffer only hands out slots: callers read and write the
+    columns directly.
+    """
+
+    def __init__(self, capacity, xp=np):
+        """
+        :param capacity: The maximum number of rows
+        :type capacity: int
+
+        :param xp: The array module to allocate the columns with
+        :type xp: module
+        """
+        if capacity < 1:
+            raise ValueError(f'the capacity of a ring buffer must be '
+                             f'positive, but {capacity} is given')
+        self.capacity = capacity
+        self.xp = xp
+        self.columns = {}
+        self.pushed = 0
+
+    def __len__(self):
+        return min(self.pushed, self.capacity)
+
+    def allocate(self, name, shape=(), dtype=np.float32, fill=0):
+        """
+        Allocates a column if it does not exist yet
+
+        :param name: The name of the column
+        :type name: str
+
+        :param shape: The shape of a single row
+        :type shape: tuple of int
+
+        :param dtype: The data type
+        :type dtype: numpy.dtype
+
+        :param fill: The initial value of all rows
+        :type fill: int|float|bool
+
+        :return: The column
+        :rtype: numpy.ndarray|cupy.ndarray
+        """
+        if name not in self.columns:
+            self.columns[name] = self.xp.full((self.capacity,) + tuple(shape),
+                                              fill, dtype=dtype)
+        return self.columns[name]
+
+    def next_slots(self, n):
+        """
+        Returns the slots that the next push of n rows will write to, without
+        pushing
+
+        :param n: The number of rows (at most the capacity)
+        :type n: int
+
+        :return: The slots
+        :rtype: numpy.ndarray
+        """
+        if n > self.capacity:
+            raise ValueError(f'can not push {n} rows into a ring buffer with '
+                             f'capacity {self.capacity}')
+        return (self.pushed + np.arange(n)) % self.capacity
+
+    def push(self, n=1, **rows):
+        """
+        Advances the head by n rows and writes the given rows
+
+        :param n: The number of rows (at most the capacity)
+        :type n: int
+
+        :param rows: Arrays of n rows by column name, columns that do not
+                     exist yet are allocated from the first row
+        :type rows: dict
+
+        :return: The slots that were written to
+        :rtype: numpy.ndarray
+        """
+        slots = self.next_slots(n)
+        for name, values in rows.items():
+            values = self.xp.asarray(values)
+            column = self.allocate(name, values.shape[1:], values.dtype)
+            column[slots] = values
+        self.pushed += n
+        return slots
+
+    def slots(self):
+        """
+        :return: The slots of all rows from the oldest to the newest
+        :rtype: numpy.ndarray
+        """
+        return (self.pushed - len(self) + np.arange(len(self))) % self.capacity
+
+    def slot(self, position):
+        """
+        Returns the slot of a row by its position in the sequence of all rows
+        ever pushed
+
+        :param position: The position (0 is the first row ever pushed)
+        :type position: int
+
+        :return: The slot, or None if the row was overwritten or not pushed yet
+        :rtype: int|None
+        """
+        if position >= self.pushed or position < self.pushed - self.capacity:
+            return None
+        return position % self.capacity
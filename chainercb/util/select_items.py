@@ -1,5 +1,8 @@
-from chainer import cuda
-import chainer.functions as F
+import threading
+from functools import lru_cache
+
+import numpy as np
+from chainer import cuda, function_node, Variable
 
 
 def select_items_per_row(values2d, idx2d):
@@ -15,17 +18,8 @@ def select_items_per_row(values2d, idx2d):
     :return: A matrix with the same shape as idx2d
     :rtype: chainer.Variable
     """
-    xp = cuda.get_array_module(values2d, idx2d)
-    rows = idx2d.shape[0]
-    cols_idx = idx2d.shape[1]
-    cols_values = values2d.shape[1]
-
-    flattened_idx = xp.ravel(idx2d.data) + xp.repeat(
-        xp.arange(0, rows * cols_values, cols_values), cols_idx)
-
-    flattened_values = F.flatten(values2d)
-    flattened_values = flattened_values[flattened_idx]
-    return F.reshape(flattened_values, idx2d.shape)
+    idx = _indices(idx2d)
+    return SelectItemsPerRow(idx).apply((values2d,))[0]
 
 
 def inverse_select_items_per_row(values2d, idx2d):
@@ -36,24 +30,190 @@ def inverse_select_items_per_row(values2d, idx2d):
     :param values2d: The values to choose from
     :type values2d: chainer.Variable
 
-    :param idx2d: The indices to select
+    :param idx2d: The indices to select, these should be unique per row
     :type idx2d: chainer.Variable
 
     :return: A matrix with the other elements selected
     :rtype: chainer.Variable
     """
     xp = cuda.get_array_module(values2d, idx2d)
-    rows = idx2d.shape[0]
-    cols_idx = idx2d.shape[1]
-    cols_values = values2d.shape[1]
+    idx = _indices(idx2d)
+    rows, cols = values2d.shape
+
+    # Mark the selected items in a reusable mask, the remaining items are then
+    # gathered in their original order by their flat indices
+    mask = _buffer(xp, (rows, cols), np.bool_)
+    mask.fill(True)
+    mask[_row_index(xp, rows), idx] = False
+    remaining = xp.flatnonzero(mask)
+    shape = (rows, cols - idx.shape[1])
+    return GatherFlat(remaining, shape).apply((values2d,))[0]
+
+
+class SelectItemsPerRow(function_node.FunctionNode):
+    """
+    Gathers items per row, y[i, j] = x[i, idx[i, j]]
+    """
+
+    def __init__(self, idx):
+        self.idx = idx
+
+    def forward(self, inputs):
+        xp = cuda.get_array_module(*inputs)
+        values, = inputs
+        self._cols = values.shape[1]
+        return xp.take_along_axis(values, self.idx, axis=1),
+
+    def backward(self, indexes, grad_outputs):
+        gy, = grad_outputs
+        return ScatterItemsPerRow(self.idx, self._cols).apply((gy,))
+
+
+class ScatterItemsPerRow(function_node.FunctionNode):
+    """
+    Adds items per row into a zero matrix, y[i, idx[i, j]] += x[i, j]. This is
+    the adjoint of SelectItemsPerRow.
+    """
+
+    def __init__(self, idx, cols):
+        self.idx = idx
+        self.cols = cols
+
+    def forward(self, inputs):
+        xp = cuda.get_array_module(*inputs)
+        values, = inputs
+        out = xp.zeros((values.shape[0], self.cols), dtype=values.dtype)
+        rows = _row_index(xp, values.shape[0])
+        if xp is np:
+            np.add.at(out, (rows, self.idx), values)
+        else:
+            cuda.cupyx.scatter_add(out, (rows, self.idx), values)
+        return out,
+
+    def backward(self, indexes, grad_outputs):
+        gy, = grad_outputs
+        return SelectItemsPerRow(self.idx).apply((gy,))
+
+
+class GatherFlat(function_node.FunctionNode):
+    """
+    Gathers items by their flat indices into a tensor of given shape, the flat
+    indices must be unique
+    """
+
+    def __init__(self, flat, shape):
+        self.flat = flat
+        self.out_shape = shape
+
+    def forward(self, inputs):
+        values, = inputs
+        self._in_shape = values.shape
+        return values.ravel()[self.flat].reshape(self.out_shape),
+
+    def backward(self, indexes, grad_outputs):
+        gy, = grad_outputs
+        return ScatterFlat(self.flat, self._in_shape).apply((gy,))
+
+
+class ScatterFlat(function_node.FunctionNode):
+    """
+    Writes items to their (unique) flat indices in a zero tensor of given shape.
+    This is the adjoint of GatherFlat.
+    """
 
-    flattened_idx = xp.ravel(idx2d.data) + xp.repeat(
-        xp.arange(0, rows * cols_values, cols_values), cols_idx)
+    def __init__(self, flat, shape):
+        self.flat = flat
+        self.out_shape = shape
 
-    all_idx = xp.arange(0, rows * cols_values, dtype=idx2d.data.dtype)
-    all_idx[flattened_idx.data] = -1
-    remaining_idx = all_idx[all_idx >= 0]
+    def forward(self, inputs):
+        xp = cuda.get_array_module(*inputs)
+        values, = inputs
+        self._in_shape = values.shape
+        out = xp.zeros(self.out_shape, dtype=values.dtype)
+        out.ravel()[self.flat] = values.ravel()
+        return out,
 
-    flattened_values = F.flatten(values2d)
-    flattened_values = flattened_values[remaining_idx]
-    return F.reshape(flattened_values, (rows, cols_values - cols_idx))
+    def backward(self, indexes, grad_outputs):
+        gy, = grad_outputs
+        return GatherFlat(self.flat, self._in_shape).apply((gy,))
+
+
+def _indices(idx2d):
+    """
+    Gets the raw index array from given indices
+
+    :param idx2d: The indices
+    :type idx2d: chainer.Variable|numpy.ndarray|cupy.ndarray
+
+    :return: The indices as an integer array
+    :rtype: numpy.ndarray|cupy.ndarray
+    """
+    if isinstance(idx2d, Variable):
+        idx2d = idx2d.data
+    if idx2d.dtype.kind not in 'iu':
+        idx2d = idx2d.astype(np.int32)
+    return idx2d
+
+
+def _row_index(xp, rows):
+    """
+    Returns a (cached, read-only) column vector with the row indices 0 to rows-1
+    that broadcasts against per-row index matrices
+
+    :param xp: The array module
+    :type xp: module
+
+    :param rows: The number of rows
+    :type rows: int
+
+    :return: The row indices, matrix of shape (rows, 1)
+    :rtype: numpy.ndarray|cupy.ndarray
+    """
+    return _cached_row_index(xp, rows, _device(xp))
+
+
+@lru_cache(maxsize=32)
+def _cached_row_index(xp, rows, device):
+    index = xp.arange(rows)[:, None]
+    if xp is np:
+        index.flags.writeable = False
+    return index
+
+
+def _buffer(xp, shape, dtype):
+    """
+    Returns a scratch buffer that is reused between calls with the same shape
+    from the same thread on the same device, its contents are undefined
+
+    :param xp: The array module
+    :type xp: module
+
+    :param shape: The shape of the buffer
+    :type shape: tuple of int
+
+    :param dtype: The data type of the buffer
+    :type dtype: numpy.dtype
+
+    :return: The buffer
+    :rtype: numpy.ndarray|cupy.ndarray
+    """
+    return _cached_buffer(xp, shape, dtype, threading.get_ident(),
+                          _device(xp))
+
+
+@lru_cache(maxsize=32)
+def _cached_buffer(xp, shape, dtype, thread, device):
+    return xp.empty(shape, dtype=dtype)
+
+
+def _device(xp):
+    """
+    Gets the current device of an array module
+
+    :param xp: The array module
+    :type xp: module
+
+    :return: The id of the current GPU device or None for numpy
+    :rtype: int|None
+    """
+    return None if xp is np else xp.cuda.Device().id
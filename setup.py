@@ -15,8 +15,8 @@ setup(
               'test',
               'test.policies',
               'test.util'],
-    install_requires=['numpy>=1.13.0',
-                      'chainer>=3.0.0'],
+    install_requires=['numpy>=1.17.0',
+                      'chainer>=5.0.0'],
     test_suite='nose.collector',
     tests_require=['nose']
 )
@@ -70,3 +70,37 @@ def test_bandify_update():
     # Drawing at this point should be perfect
     expected = np.array([0, 1, 1])
     assert_allclose(policy.draw(x).data, expected)
+
+
+def test_fast_draw():
+    policy = ADFUCBPolicy(6)
+    np.random.seed(42)
+    for _ in range(20):
+        x = as_variable(np.random.random((8, 4, 6)))
+        a = as_variable(np.random.randint(4, size=8))
+        r = as_variable(np.random.random(8))
+        policy.update(x, a, None, r)
+    x = np.random.random((32, 4, 6)).astype(np.float32)
+    assert_allclose(policy.fast_draw(x), policy.draw(as_variable(x)).data)
+    assert_allclose(policy.fast_max(x), policy.max(as_variable(x)).data)
+    np.random.seed(4200)
+    expected = policy.uniform(as_variable(x)).data
+    np.random.seed(4200)
+    assert_allclose(policy.fast_uniform(x), expected)
+
+
+def test_draw_alphas():
+    alphas = [0.0, 0.5, 4.0]
+    np.random.seed(42)
+    x = as_variable(np.random.random((32, 4, 6)).astype(np.float32))
+    a = as_variable(np.random.randint(4, size=32))
+    r = as_variable(np.random.random(32))
+    policies = [ADFUCBPolicy(6, alpha=alpha) for alpha in alphas]
+    for policy in policies:
+        policy.update(x, a, None, r)
+    actions = policies[0].draw_alphas(x, alphas).data
+    for i, policy in enumerate(policies):
+        assert_allclose(actions[i], policy.draw(x).data)
+    log_p = policies[0].log_propensity_alphas(x, as_variable(actions[1]),
+                                              alphas).data
+    assert_allclose(log_p[1], np.zeros(32))
@@ -0,0 +1,76 @@
+import chainer.links as L
+import numpy as np
+from chainer import as_variable, optimizers
+from chainer.testing import assert_allclose
+
+from chainercb.policies import BootstrapEnsemble
+
+
+def _ensemble(nr_heads=8, k=4, optimizer=None):
+    np.random.seed(42)
+    return BootstrapEnsemble(L.Linear(3, 5), nr_heads, k, 5, optimizer)
+
+
+def test_heads_in_one_pass():
+    policy = _ensemble()
+    x = as_variable(np.random.random((6, 3)).astype(np.float32))
+    predictions = policy.predict_heads(x).data
+    assert predictions.shape == (6, 8, 4)
+
+    # Every head is a slice of the shared output layer
+    h = policy.trunk(x).data
+    W = policy.heads.W.data
+    b = policy.heads.b.data
+    for m in range(8):
+        expected = h.dot(W[m * 4:(m + 1) * 4].T) + b[m * 4:(m + 1) * 4]
+        assert_allclose(predictions[:, m, :], expected, rtol=1e-5)
+
+
+def test_propensity():
+    policy = _ensemble()
+    x = as_variable(np.random.random((6, 3)).astype(np.float32))
+    best = policy.predict_heads(x).data.argmax(axis=2)
+    for a in range(4):
+        action = as_variable(np.full(6, a, dtype=np.int32))
+        assert_allclose(policy.propensity(x, action).data,
+                        np.mean(best == a, axis=1))
+
+    # Draws follow the propensities
+    x1 = as_variable(np.repeat(x.data[:1], 4000, axis=0))
+    counts = np.bincount(policy.draw(x1).data, minlength=4) / 4000
+    expected = [policy.propensity(x, as_variable(
+        np.full(6, a, dtype=np.int32))).data[0] for a in range(4)]
+    assert_allclose(counts, expected, atol=0.03)
+
+    # The max is the action most heads agree on
+    max_action = policy.max(x).data
+    assert_allclose(np.mean(best == max_action[:, None], axis=1),
+                    np.max([np.mean(best == a, axis=1) for a in range(4)],
+                           axis=0))
+
+
+def test_bootstrap_loss():
+    policy = _ensemble()
+    x = as_variable(np.random.random((6, 3)).astype(np.float32))
+    actions = as_variable(np.random.randint(4, size=6).astype(np.int32))
+    rewards = as_variable(np.random.random(6).astype(np.float32))
+    weights = np.random.poisson(1.0, size=(6, 8))
+    predictions = policy.predict_heads(x).data[np.arange(6), :, actions.data]
+    expected = np.mean(weights * (predictions - rewards.data[:, None]) ** 2)
+    assert_allclose(policy.bootstrap_loss(x, actions, rewards, weights).data,
+                    expected, rtol=1e-5)
+
+
+def test_update():
+    policy = _ensemble(optimizer=optimizers.Adam(0.05))
+    for _ in range(200):
+        x = as_variable(np.random.random((32, 3)).astype(np.float32))
+        actions = policy.uniform(x)
+        rewards = as_variable(1.0 * (actions.data == 2))
+        policy.update(x, actions, None, rewards)
+
+    # All heads learn that action 2 is best
+    x = as_variable(np.random.random((16, 3)).astype(np.float32))
+    assert_allclose(policy.max(x).data, np.full(16, 2))
+    assert np.all(policy.propensity(
+        x, as_variable(np.full(16, 2, dtype=np.int32))).data > 0.5)
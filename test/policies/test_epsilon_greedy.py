@@ -129,3 +129,13 @@ def test_log_propensity():
                          -0.23361483, -3.1780539, -3.1780539, -3.1780539,
                          -3.1780539, -3.1780539, -3.1780539, -3.1780539])
     assert_allclose(p.data, expected)
+
+
+def test_fast_draw():
+    policy = EpsilonGreedy(setup_softmax_policy(), epsilon=0.25)
+    np.random.seed(42)
+    x = np.random.random((32, 3)).astype('float32')
+    np.random.seed(4200)
+    expected = policy.draw(Variable(x)).data
+    np.random.seed(4200)
+    assert_allclose(policy.fast_draw(x), expected)
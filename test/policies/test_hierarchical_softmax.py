@@ -0,0 +1,83 @@
+import numpy as np
+from chainer import Variable, as_variable, links as L
+from chainer.testing import assert_allclose
+
+from chainercb.loss import ips
+from chainercb.policies import HierarchicalSoftmax
+
+
+def setup_policy(k=6, tau=1.0):
+    np.random.seed(4242)
+    predictor = L.Linear(3, 4)
+    return HierarchicalSoftmax(predictor, k, 4, tau=tau)
+
+
+def all_log_propensities(policy, x):
+    results = np.zeros((x.shape[0], policy.k))
+    for a in range(policy.k):
+        action = Variable(np.ones(x.shape[0], dtype=np.int32) * a)
+        results[:, a] = policy.log_propensity(x, action).data
+    return results
+
+
+def test_propensity_sums_to_one():
+    for k in [2, 3, 6, 8, 13]:
+        policy = setup_policy(k)
+        np.random.seed(42)
+        x = Variable(np.random.random((32, 3)).astype('float32'))
+        p = np.exp(all_log_propensities(policy, x))
+        assert_allclose(np.sum(p, axis=1), np.ones(32))
+
+
+def test_propensity():
+    policy = setup_policy()
+    np.random.seed(42)
+    x = Variable(np.random.random((32, 3)).astype('float32'))
+    action = Variable(np.random.randint(6, size=32).astype('int32'))
+    assert_allclose(policy.propensity(x, action).data,
+                    np.exp(policy.log_propensity(x, action).data))
+
+
+def test_draw_statistic():
+    policy = setup_policy()
+    np.random.seed(42)
+    x = Variable(np.random.random((4, 3)).astype('float32'))
+    expected = np.exp(all_log_propensities(policy, x))
+
+    nr_samples = 10000
+    samples = np.zeros((4, 6))
+    for _ in range(nr_samples):
+        samples[np.arange(4), policy.draw(x).data] += 1.0
+    assert_allclose(samples / nr_samples, expected, atol=2e-2, rtol=2e-2)
+
+
+def test_max():
+    policy = setup_policy()
+    np.random.seed(42)
+    x = Variable(np.random.random((32, 3)).astype('float32'))
+    expected = np.argmax(all_log_propensities(policy, x), axis=1)
+    assert_allclose(policy.max(x).data, expected)
+
+
+def test_uniform():
+    policy = setup_policy()
+    np.random.seed(42)
+    x = Variable(np.random.random((32, 3)).astype('float32'))
+    actions = policy.uniform(x).data
+    assert np.all((actions >= 0) & (actions < 6))
+    assert_allclose(policy.nr_actions(x).data, np.ones(32) * 6)
+
+
+def test_ips_backward():
+    policy = setup_policy()
+    np.random.seed(42)
+    x = Variable(np.random.random((32, 3)).astype('float32'))
+    actions = Variable(np.random.randint(6, size=32).astype('int32'))
+    log_p = as_variable(np.log(np.ones(32, dtype=np.float32) / 6))
+    rewards = as_variable(np.random.randint(2, size=32).astype('float32'))
+
+    loss = ips(x, actions, log_p, rewards, policy)
+    policy.cleargrads()
+    loss.backward()
+    assert np.any(policy.W.grad != 0.0)
+    assert np.any(policy.predictor.W.grad != 0.0)
@@ -0,0 +1,38 @@
+import numpy as np
+from chainer import as_variable
+
+from chainercb.policies import KernelUCBPolicy, LinUCBPolicy
+from chainercb.util import Nystroem, RandomFourierFeatures
+
+
+def _run(policy, steps=100):
+    # Arm 0 pays off inside the unit circle and arm 1 outside of it, which no
+    # linear policy can represent
+    np.random.seed(7)
+    correct = 0
+    for _ in range(steps):
+        x = np.random.uniform(-2.0, 2.0, size=(16, 2))
+        best = (np.sum(x ** 2, axis=1) > 1.5) * 1
+        a = policy.draw(as_variable(x)).data
+        r = 1.0 * (a == best)
+        correct += r.sum()
+        policy.update(as_variable(x), as_variable(a), None, as_variable(r))
+    x = np.random.uniform(-2.0, 2.0, size=(500, 2))
+    best = (np.sum(x ** 2, axis=1) > 1.5) * 1
+    return np.mean(policy.max(as_variable(x)).data == best)
+
+
+def test_nonlinear_rewards():
+    np.random.seed(42)
+    rff = KernelUCBPolicy(2, RandomFourierFeatures(2, 100, gamma=1.0),
+                          alpha=0.1)
+    np.random.seed(42)
+    landmarks = np.random.uniform(-2.0, 2.0, size=(50, 2))
+    nystroem = KernelUCBPolicy(2, Nystroem(landmarks, gamma=1.0), alpha=0.1)
+    linear = LinUCBPolicy(2, 2, alpha=0.1)
+    assert _run(rff) > 0.9
+    assert _run(nystroem) > 0.9
+    assert _run(linear) < 0.8
+
+    # The state of every arm is bounded by the number of features
+    assert rff.head.regressors.slab('_A').shape == (2, 100, 100)
@@ -1,6 +1,7 @@
 import numpy as np
 from chainer import as_variable
 from chainer.testing import assert_allclose
+from nose.tools import assert_raises
 
 from chainercb.bandify import MultiClassBandify
 from chainercb.policies import ThompsonPolicy
@@ -142,3 +143,97 @@ def test_bandify_propensity_statistic():
             samples[np.arange(samples.shape[0]), actions] += 1.0
 
     samples /= np.sum(samples, axis=1)
+
+
+def test_propensity_mask():
+    k = 4
+    policy = ThompsonPolicy(k, 6)
+
+    # Generate minibatch
+    np.random.seed(42)
+    x = as_variable(np.array([[1.0, 2.0, 3.0, 3.0, -2.0, -1.0],
+                              [2.0, 3.0, 1.0, -1.0, -3.0, -2.0],
+                              [-1.0, -2.0, -1.0, 1.0, 3.0, 1.0],
+                              [-1.0, -2.0, 1.0, 1.0, 3.0, 1.0]]))
+    y = as_variable(np.array([2, 1, 0, 3]))
+    mask = np.array([[True, False, True, False],
+                     [True, True, True, False],
+                     [False, False, False, True],
+                     [True, True, True, True]])
+
+    # Do a perfect update for all actions (full information essentially)
+    for _ in range(100):
+        for a in range(k):
+            log_p = as_variable(np.zeros(y.shape))
+            actions = as_variable(np.ones(4, dtype=np.int32) * a)
+            r = (1.0 * (actions.data == y.data))
+            policy.update(x, actions, log_p, as_variable(r))
+
+    # Propensities should sum to one over the eligible arms only
+    results = np.zeros((x.shape[0], k))
+    for a in range(k):
+        actions = as_variable(np.ones(4, dtype=np.int32) * a)
+        results[:, a] = policy.propensity(x, actions, mask).data
+
+    assert_allclose(results[~mask], 0.0)
+    assert_allclose(results[2, 3], 1.0)
+    assert_allclose(np.sum(results, axis=1), np.ones(4), atol=1e-2, rtol=1e-2)
+
+    # Drawn actions should always be eligible
+    for _ in range(10):
+        actions = policy.draw(x, mask).data
+        assert np.all(mask[np.arange(4), actions])
+
+
+def test_fast_draw():
+    policy = ThompsonPolicy(5, 6)
+    np.random.seed(42)
+    for _ in range(20):
+        x = as_variable(np.random.random((8, 6)))
+        a = as_variable(np.random.randint(5, size=8))
+        r = as_variable(np.random.random(8))
+        policy.update(x, a, None, r)
+    x = np.random.random((32, 6)).astype(np.float32)
+    mask = np.random.random((32, 5)) < 0.5
+    mask[~mask.any(axis=1), 4] = True
+    for m in (None, mask):
+        np.random.seed(4200)
+        expected = policy.draw(as_variable(x), m).data
+        np.random.seed(4200)
+        assert_allclose(policy.fast_draw(x, m), expected)
+
+
+def test_fast_draw_reuses_decompositions():
+    policy = ThompsonPolicy(4, 3)
+    x = np.random.random((2, 3))
+    policy.fast_draw(x)
+    valid = policy.regressors.slab('_cho_valid')
+    assert valid.all()
+
+    # Only the decompositions of updated arms are invalidated
+    policy.update(as_variable(x), as_variable(np.array([1, 1])), None,
+                  as_variable(np.ones(2)))
+    assert_allclose(valid[:, 0], [True, False, True, True])
+    policy.fast_draw(x)
+    assert valid.all()
+    A_inv = policy.regressors.slab('_A_inv')
+    cho = policy.regressors.slab('_cho')
+    assert_allclose(np.matmul(cho, cho.transpose(0, 2, 1)), A_inv)
+
+
+def test_no_eligible_arms():
+    policy = ThompsonPolicy(4, 3)
+    x = np.random.random((2, 3))
+    mask = np.array([[False, True, False, False], [False] * 4])
+    assert_raises(ValueError, policy.draw, x, mask)
+    assert_raises(ValueError, policy.fast_draw, x, mask)
+
+
+def test_fast_draw_tiered():
+    policy = ThompsonPolicy(5, 6, resident=2)
+    np.random.seed(42)
+    x = np.random.random((4, 6)).astype(np.float32)
+    np.random.seed(4200)
+    expected = policy.draw(as_variable(x)).data
+    np.random.seed(4200)
+    assert_allclose(policy.fast_draw(x), expected)
@@ -1,9 +1,13 @@
+from functools import partial
+
 import numpy as np
 from chainer import as_variable
 from chainer.testing import assert_allclose
+from nose.tools import assert_raises
 
 from chainercb.bandify import MultiClassBandify
 from chainercb.policies import LinUCBPolicy
+from chainercb.util import RidgeRegression, WindowedRidgeRegression
 
 
 def test_draw():
@@ -70,3 +74,237 @@ def test_bandify_update():
     # Drawing at this point should be perfect
     expected = np.array([2, 1, 0, 3])
     assert_allclose(policy.draw(x).data, expected)
+
+
+def test_draw_mask():
+    policy = LinUCBPolicy(4, 6)
+
+    # Generate minibatch of 32 random samples and a random eligibility mask
+    np.random.seed(42)
+    x = as_variable(np.random.random((32, 6)).astype(np.float32))
+    mask = np.random.random((32, 4)) < 0.5
+    mask[:, 3] = True
+
+    # Drawn actions should always be eligible
+    actions = policy.draw(x, mask).data
+    assert np.all(mask[np.arange(32), actions])
+    assert_allclose(policy.propensity(x, actions, mask).data, np.ones(32))
+
+
+def test_draw_mask_skips_arms():
+    policy = LinUCBPolicy(4, 6)
+
+    def fail(x):
+        raise AssertionError('ineligible arm was scored')
+
+    policy.regressors[0].ucb = fail
+    policy.regressors[0].predict = fail
+    policy.regressors[2].ucb = fail
+    policy.regressors[2].predict = fail
+
+    # Arms that are eligible for no row should never be touched
+    np.random.seed(42)
+    x = as_variable(np.random.random((8, 6)).astype(np.float32))
+    mask = np.zeros((8, 4), dtype=bool)
+    mask[:4, 1] = True
+    mask[4:, 3] = True
+
+    expected = np.array([1, 1, 1, 1, 3, 3, 3, 3])
+    assert_allclose(policy.draw(x, mask).data, expected)
+    assert_allclose(policy.max(x, mask).data, expected)
+
+
+def test_uniform_mask():
+    policy = LinUCBPolicy(4, 6)
+
+    np.random.seed(42)
+    x = as_variable(np.random.random((100, 6)).astype(np.float32))
+    mask = np.random.random((100, 4)) < 0.5
+    mask[:, 0] = True
+
+    actions = policy.uniform(x, mask).data
+    assert np.all(mask[np.arange(100), actions])
+    assert_allclose(policy.nr_actions(x, mask).data, np.sum(mask, axis=1))
+
+
+def test_no_eligible_arms():
+    policy = LinUCBPolicy(4, 6)
+
+    # A row without eligible arms has no action, even if arm 0 is masked out
+    np.random.seed(42)
+    x = as_variable(np.random.random((3, 6)).astype(np.float32))
+    mask = np.ones((3, 4), dtype=bool)
+    mask[1, :] = False
+    for method in (policy.draw, policy.max, policy.uniform, policy.fast_draw,
+                   policy.fast_max, policy.fast_uniform):
+        assert_raises(ValueError, method, x, mask)
+
+    # Likewise when all arms are removed
+    for a in range(4):
+        policy.remove_arm(a)
+    assert_raises(ValueError, policy.draw, x)
+    assert_raises(ValueError, policy.fast_draw, x)
+
+
+def test_add_remove_arms():
+    policy = LinUCBPolicy(4, 6, capacity=8)
+
+    # Generate minibatch of 32 random samples
+    np.random.seed(42)
+    x = as_variable(np.random.random((32, 6)).astype(np.float32))
+
+    # A removed arm is never played
+    policy.remove_arm(0)
+    assert policy.k == 4
+    assert_allclose(policy.nr_actions(x).data, np.ones(32) * 3)
+    assert np.all(policy.draw(x).data != 0)
+    assert np.all(policy.uniform(x).data != 0)
+
+    # Removed ids are reused before the action space grows
+    assert policy.add_arm() == 0
+    assert policy.add_arm() == 4
+    assert policy.k == 5
+    assert_allclose(policy.nr_actions(x).data, np.ones(32) * 5)
+
+    # New arms can be updated and played
+    a = as_variable(np.ones(32, dtype=np.int32) * 4)
+    r = as_variable(np.ones(32))
+    for _ in range(10):
+        policy.update(x, a, None, r)
+    assert_allclose(policy.max(x).data, np.ones(32) * 4)
+
+
+def test_stale_feedback():
+    policy = LinUCBPolicy(3, 2)
+    x = as_variable(np.array([[1.0, 0.0], [0.0, 1.0]]))
+    a = as_variable(np.array([1, 2], dtype=np.int32))
+    r = as_variable(np.array([1.0, 1.0]))
+    generations = policy.arm_generations(a)
+
+    # Feedback for a removed arm is dropped
+    policy.remove_arm(1)
+    policy.update(x, a, None, r)
+    assert policy.stale_feedback == 1
+    assert_allclose(policy.regressors[2]._b, [0.0, 1.0])
+
+    # And does not reach a new arm that reuses its id
+    assert policy.add_arm() == 1
+    policy.update(x, a, None, r, generations)
+    assert policy.stale_feedback == 2
+    assert_allclose(policy.regressors[1]._b, [0.0, 0.0])
+    assert_allclose(policy.regressors[2]._b, [0.0, 2.0])
+
+
+def test_tiered_update():
+    policy = LinUCBPolicy(4, 6, resident=2)
+
+    x = as_variable(np.array([[1.0, 2.0, 3.0, 3.0, -2.0, -1.0],
+                              [2.0, 3.0, 1.0, -1.0, -3.0, -2.0],
+                              [-1.0, -2.0, -1.0, 1.0, 3.0, 1.0],
+                              [-1.0, -2.0, 1.0, 1.0, 3.0, 1.0]]))
+    y = as_variable(np.array([2, 1, 0, 3]))
+
+    # Learning should work even though only two arms fit in memory
+    np.random.seed(42)
+    log_p = as_variable(np.zeros(y.shape))
+    for _ in range(100):
+        a = as_variable(np.random.randint(4, size=y.shape))
+        r = (1.0 * (a.data == y.data))
+        policy.update(x, a, log_p, as_variable(r))
+
+    expected = np.array([2, 1, 0, 3])
+    assert_allclose(policy.draw(x).data, expected)
+    assert policy.regressors.resident == 2
+    assert policy.regressors.misses > 0
+
+
+def trained_policy(cls=LinUCBPolicy, **kwargs):
+    policy = cls(5, 6, **kwargs)
+    np.random.seed(42)
+    for _ in range(20):
+        x = as_variable(np.random.random((8, 6)))
+        a = as_variable(np.random.randint(5, size=8))
+        r = as_variable(np.random.random(8))
+        policy.update(x, a, None, r)
+    return policy
+
+
+def test_fast_draw():
+    policy = trained_policy()
+    np.random.seed(4200)
+    x = np.random.random((32, 6)).astype(np.float32)
+    assert_allclose(policy.fast_draw(x), policy.draw(as_variable(x)).data)
+    assert_allclose(policy.fast_max(x), policy.max(as_variable(x)).data)
+    assert_allclose(policy.fast_draw(x[:1]),
+                    policy.draw(as_variable(x[:1])).data)
+
+
+def test_fast_draw_mask():
+    policy = trained_policy()
+    policy.remove_arm(1)
+    np.random.seed(4200)
+    x = np.random.random((32, 6)).astype(np.float32)
+    mask = np.random.random((32, 5)) < 0.5
+    mask[:, 0] = True
+    assert_allclose(policy.fast_draw(x, mask),
+                    policy.draw(as_variable(x), mask).data)
+    assert np.all(policy.fast_draw(x) != 1)
+
+
+def test_fast_draw_tiered():
+    policy = trained_policy(resident=2)
+    np.random.seed(4200)
+    x = np.random.random((4, 6)).astype(np.float32)
+    assert_allclose(policy.fast_draw(x), policy.draw(as_variable(x)).data)
+
+
+def test_draw_alphas():
+    alphas = [0.0, 0.5, 1.0, 4.0]
+    np.random.seed(4200)
+    x = as_variable(np.random.random((32, 6)).astype(np.float32))
+    mask = np.random.random((32, 5)) < 0.5
+    mask[:, 0] = True
+    for resident in (None, 2):
+        policy = trained_policy(resident=resident)
+        for m in (None, mask):
+            actions = policy.draw_alphas(x, alphas, m).data
+            assert actions.shape == (4, 32)
+            for i, alpha in enumerate(alphas):
+                expected = trained_policy(alpha=alpha, resident=resident)
+                assert_allclose(actions[i], expected.draw(x, m).data)
+            p = policy.propensity_alphas(x, as_variable(actions[2]), alphas,
+                                         m).data
+            assert_allclose(p[2], np.ones(32))
+
+
+def test_windowed_regressor():
+    policy = LinUCBPolicy(3, 4, capacity=4, regressor=partial(
+        WindowedRidgeRegression, window=5))
+    np.random.seed(42)
+    x = as_variable(np.random.random((20, 4)))
+    a = as_variable(np.zeros(20, dtype=np.int32))
+    policy.update(x, a, None, as_variable(np.ones(20)))
+    assert policy.regressors[0].size == 5
+    policy.add_arm()
+
+    # The window of every arm is stored in the slabs of the registry
+    window = policy.regressors.slab('_window_x')
+    assert window.shape == (4, 5, 4)
+    assert_allclose(window[0][[0, 1, 2, 3, 4]], x.data[[15, 16, 17, 18, 19]])
+    assert_allclose(policy.fast_draw(x.data), policy.draw(x).data)
+
+
+def test_serving_dtype():
+    policy = LinUCBPolicy(4, 6, regressor=partial(
+        RidgeRegression, serving_dtype=np.float32, refactor_every=8))
+    np.random.seed(42)
+    for _ in range(20):
+        x = as_variable(np.random.random((1, 6)))
+        a = as_variable(np.random.randint(4, size=1).astype(np.int32))
+        policy.update(x, a, None, as_variable(np.random.random(1)))
+
+    # The fast path scores with the single precision copies in the slabs
+    assert policy.regressors.slab('_theta', serving=True).dtype == np.float32
+    x = np.random.random((16, 6)).astype(np.float32)
+    assert_allclose(policy.fast_draw(x), policy.draw(as_variable(x)).data)
+    assert_allclose(policy.fast_max(x), policy.max(as_variable(x)).data)
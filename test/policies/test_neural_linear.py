@@ -0,0 +1,103 @@
+import chainer.links as L
+import numpy as np
+from chainer import as_variable
+from chainer.testing import assert_allclose
+
+from chainercb.bandify import MultiClassBandify
+from chainercb.policies import (LinUCBPolicy, NeuralLinearPolicy,
+                                ThompsonPolicy)
+from chainercb.util import ReplayBuffer
+
+
+class CountingLinear(L.Linear):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    def forward(self, x):
+        self.calls += 1
+        return super().forward(x)
+
+
+def _policy(k=4, d_in=6, d=3, replay=None, head=LinUCBPolicy):
+    np.random.seed(42)
+    features = CountingLinear(d_in, d)
+    return NeuralLinearPolicy(features, head(k, d), replay)
+
+
+def _feedback(n=32, k=4, d_in=6):
+    x = as_variable(np.random.random((n, d_in)).astype(np.float32))
+    a = as_variable(np.random.randint(k, size=n).astype(np.int32))
+    log_p = as_variable(np.log(np.ones(n, dtype=np.float32) / k))
+    r = as_variable(np.random.random(n))
+    return x, a, log_p, r
+
+
+def test_acts_on_embeddings():
+    policy = _policy()
+    x, a, log_p, r = _feedback()
+    policy.update(x, a, log_p, r)
+    z = as_variable(policy.features(x).data)
+    assert_allclose(policy.draw(x).data, policy.head.draw(z).data)
+    assert_allclose(policy.max(x).data, policy.head.max(z).data)
+    assert_allclose(policy.fast_draw(x.data), policy.head.draw(z).data)
+    assert_allclose(policy.log_propensity(x, a).data,
+                    policy.head.log_propensity(z, a).data)
+
+
+def test_cache():
+    policy = _policy()
+    x, a, log_p, r = _feedback()
+
+    # Drawing, scoring and updating a batch embeds it once
+    actions = policy.draw(x)
+    policy.log_propensity(x, actions)
+    policy.update(x, actions, log_p, r)
+    assert policy.features.calls == 1
+
+    # A new batch is embedded again
+    x2, _, _, _ = _feedback()
+    policy.draw(x2)
+    assert policy.features.calls == 2
+
+    policy.invalidate()
+    policy.draw(x2)
+    assert policy.features.calls == 3
+
+
+def test_rebuild():
+    replay = ReplayBuffer(256)
+    policy = _policy(replay=replay)
+    for _ in range(4):
+        policy.update(*_feedback())
+    assert len(replay) == 128
+
+    # Retrain (here: perturb) the features, after which the head is stale
+    policy.features.W.data += 0.5
+    policy.rebuild(batch_size=48)
+
+    # The head matches a fresh head fitted on the new embeddings
+    expected = LinUCBPolicy(4, 3)
+    for batch in replay.views(256):
+        z = as_variable(policy.features(batch.x).data)
+        expected.update(z, batch.actions, batch.log_p, batch.rewards)
+    for a in range(4):
+        assert_allclose(policy.head.regressors[a]._A,
+                        expected.regressors[a]._A, rtol=1e-5)
+        assert_allclose(policy.head.regressors[a]._theta,
+                        expected.regressors[a]._theta, rtol=1e-4, atol=1e-5)
+
+
+def test_thompson_head_bandify():
+    policy = _policy(k=3, d_in=6, d=4, head=ThompsonPolicy)
+    mcb = MultiClassBandify(policy)
+    mcb.update_policy(policy)
+    np.random.seed(42)
+    for _ in range(10):
+        x = as_variable(np.random.random((8, 6)).astype(np.float32))
+        y = as_variable(np.random.randint(3, size=8).astype(np.int32))
+        mcb(x, y)
+
+    # Every step embeds its batch only once and feeds the head
+    assert policy.features.calls == 10
+    assert sum(policy.head.regressors[a]._A.trace() for a in range(3)) > 12.0
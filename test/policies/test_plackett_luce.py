@@ -0,0 +1,128 @@
+from itertools import permutations
+
+import numpy as np
+from chainer import Variable, as_variable
+from chainer.testing import assert_allclose
+
+from chainercb.bandify import MultiClassSlateBandify
+from chainercb.loss import ips
+from chainercb.policies import EpsilonGreedy, PlackettLuce
+from test.policy import setup_softmax_policy
+
+
+def setup_policy(slate_size=2, tau=1.0):
+    softmax = setup_softmax_policy(tau=tau)
+    return PlackettLuce(softmax.predictor, slate_size, tau=tau)
+
+
+def all_slates(k, slate_size):
+    return [list(s) for s in permutations(range(k), slate_size)]
+
+
+def test_propensity_sums_to_one():
+    policy = setup_policy(slate_size=2)
+    np.random.seed(42)
+    x = Variable(np.random.random((8, 3)).astype('float32'))
+    total = np.zeros(8)
+    for slate in all_slates(6, 2):
+        action = Variable(np.array([slate] * 8, dtype=np.int32))
+        total += policy.propensity(x, action).data
+    assert_allclose(total, np.ones(8))
+
+
+def test_log_propensity_single_position():
+    policy = setup_policy(slate_size=1)
+    softmax = setup_softmax_policy()
+    np.random.seed(42)
+    x = Variable(np.random.random((32, 3)).astype('float32'))
+    action = Variable(np.random.randint(6, size=32).astype('int32'))
+    assert_allclose(policy.log_propensity(x, action[:, None]).data,
+                    softmax.log_propensity(x, action).data)
+
+
+def test_log_propensity():
+    policy = setup_policy(slate_size=3)
+    np.random.seed(42)
+    x = Variable(np.random.random((4, 3)).astype('float32'))
+    action = Variable(np.array([[0, 1, 2], [5, 4, 3], [2, 0, 5], [1, 3, 4]],
+                               dtype=np.int32))
+
+    # Compare against a sequential computation
+    scores = policy.predictor(x).data.astype(np.float64)
+    expected = np.zeros(4)
+    for i in range(4):
+        remaining = list(range(6))
+        for a in action.data[i]:
+            expected[i] += scores[i, a] - np.log(
+                np.sum(np.exp(scores[i, remaining])))
+            remaining.remove(a)
+    assert_allclose(policy.log_propensity(x, action).data, expected)
+
+
+def test_draw():
+    policy = setup_policy(slate_size=3)
+    np.random.seed(42)
+    x = Variable(np.random.random((32, 3)).astype('float32'))
+    actions = policy.draw(x).data
+    assert actions.shape == (32, 3)
+    for row in actions:
+        assert len(set(row)) == 3
+
+
+def test_draw_statistic():
+    policy = setup_policy(slate_size=2)
+    np.random.seed(42)
+    x = Variable(np.random.random((1, 3)).astype('float32'))
+    slates = all_slates(6, 2)
+    expected = np.array([policy.propensity(
+        x, Variable(np.array([s], dtype=np.int32))).data[0] for s in slates])
+
+    nr_samples = 10000
+    counts = {tuple(s): 0 for s in slates}
+    for _ in range(nr_samples):
+        counts[tuple(policy.draw(x).data[0])] += 1
+    observed = np.array([counts[tuple(s)] for s in slates]) / nr_samples
+    assert_allclose(observed, expected, atol=2e-2, rtol=2e-2)
+
+
+def test_max():
+    policy = setup_policy(slate_size=3)
+    np.random.seed(42)
+    x = Variable(np.random.random((32, 3)).astype('float32'))
+    expected = np.argsort(-policy.predictor(x).data, axis=1)[:, :3]
+    assert_allclose(policy.max(x).data, expected)
+
+
+def test_nr_actions():
+    policy = setup_policy(slate_size=3)
+    np.random.seed(42)
+    x = Variable(np.random.random((32, 3)).astype('float32'))
+    assert_allclose(policy.nr_actions(x).data, np.ones(32) * 120)
+
+
+def test_epsilon_greedy_bandify():
+    policy = EpsilonGreedy(setup_policy(slate_size=2), epsilon=0.25)
+    mcb = MultiClassSlateBandify(policy)
+    np.random.seed(42)
+    x = Variable(np.random.random((32, 3)).astype('float32'))
+    y = Variable(np.random.randint(6, size=32).astype('int32'))
+    _, actions, log_p, rewards = mcb(x, y)
+    assert actions.shape == (32, 2)
+    assert np.all(log_p.data <= 0.0)
+    gains = np.array([0.0, 1.0, 1.0 / np.log2(3.0)])
+    assert np.all(np.min(np.abs(rewards.data[:, None] - gains), axis=1) < 1e-6)
+
+
+def test_ips_backward():
+    policy = setup_policy(slate_size=2)
+    np.random.seed(42)
+    x = Variable(np.random.random((32, 3)).astype('float32'))
+    y = Variable(np.random.randint(6, size=32).astype('int32'))
+    mcb = MultiClassSlateBandify(policy)
+    _, actions, log_p, rewards = mcb(x, y)
+
+    loss = ips(x, actions, as_variable(log_p.data), rewards, policy)
+    policy.cleargrads()
+    loss.backward()
+    assert np.all(np.isfinite(policy.predictor.W.grad))
+    assert np.any(policy.predictor.W.grad != 0.0)
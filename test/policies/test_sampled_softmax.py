@@ -0,0 +1,81 @@
+import numpy as np
+from chainer import Sequential, Variable, links as L
+from chainer.testing import assert_allclose
+
+from chainercb.loss import ips, policy_gradient
+from chainercb.policies import SampledSoftmax, Softmax
+
+
+def setup_policy(k=6, tau=1.0, nr_samples=64, proposal=None):
+    np.random.seed(42)
+    trunk = L.Linear(3, 4)
+    output = L.Linear(4, k)
+    return SampledSoftmax(trunk, output, tau=tau, nr_samples=nr_samples,
+                          proposal=proposal)
+
+
+def test_exact_matches_softmax():
+    policy = setup_policy(tau=0.5)
+    softmax = Softmax(Sequential(policy.predictor, policy.output), tau=0.5)
+    np.random.seed(42)
+    x = Variable(np.random.random((16, 3)).astype('float32'))
+    action = Variable(np.random.randint(6, size=16).astype('int32'))
+    assert_allclose(policy.log_propensity(x, action).data,
+                    softmax.log_propensity(x, action).data)
+    assert_allclose(policy.max(x).data, softmax.max(x).data)
+    assert_allclose(policy.nr_actions(x).data, np.ones(16) * 6)
+    assert np.all(policy.uniform(x).data < 6)
+
+
+def test_sampled_log_propensity_approximates_exact():
+    policy = setup_policy(k=50, nr_samples=2000)
+    np.random.seed(42)
+    x = Variable(np.random.random((16, 3)).astype('float32'))
+    action = Variable(np.random.randint(50, size=16).astype('int32'))
+    assert_allclose(policy.sampled_log_propensity(x, action).data,
+                    policy.log_propensity(x, action).data, atol=5e-2,
+                    rtol=0.0)
+
+
+def test_sampled_log_propensity_proposal():
+    proposal = np.linspace(1.0, 2.0, 50)
+    proposal /= np.sum(proposal)
+    policy = setup_policy(k=50, nr_samples=2000, proposal=proposal)
+    np.random.seed(4200)
+    x = Variable(np.random.random((16, 3)).astype('float32'))
+    action = Variable(np.random.randint(50, size=16).astype('int32'))
+    assert_allclose(policy.sampled_log_propensity(x, action).data,
+                    policy.log_propensity(x, action).data, atol=5e-2,
+                    rtol=0.0)
+
+
+def test_sampled_log_propensity_upper_bound():
+    # A single accidental hit is discarded, so with all negatives equal to the
+    # given action the estimated partition only contains the action itself
+    policy = setup_policy(k=6, nr_samples=8,
+                          proposal=np.array([1.0, 0, 0, 0, 0, 0]))
+    x = Variable(np.random.random((4, 3)).astype('float32'))
+    action = Variable(np.zeros(4, dtype=np.int32))
+    assert_allclose(policy.sampled_log_propensity(x, action).data,
+                    np.zeros(4))
+
+
+def test_sampled_loss_gradient():
+    policy = setup_policy(k=1000, nr_samples=16)
+    np.random.seed(42)
+    x = Variable(np.random.random((8, 3)).astype('float32'))
+    action = Variable(np.random.randint(1000, size=8).astype('int32'))
+    log_p = Variable(np.log(np.ones(8, dtype='float32') / 1000))
+    reward = Variable(np.random.random(8).astype('float32'))
+    policy.cleargrads()
+    ips(x, action, log_p, reward, policy, sampled=True).backward()
+
+    # Only the output rows of the given and sampled actions receive gradient
+    touched = np.sum(np.any(policy.output.W.grad != 0.0, axis=1))
+    assert 8 <= touched <= 8 + 16
+    assert policy.predictor.W.grad is not None
+
+    policy.cleargrads()
+    policy_gradient(x, action, reward, policy, sampled=True).backward()
+    touched = np.sum(np.any(policy.output.W.grad != 0.0, axis=1))
+    assert 8 <= touched <= 8 + 16
@@ -0,0 +1,208 @@
+import numpy as np
+from chainer import Variable
+from chainer.testing import assert_allclose
+from nose.tools import raises
+
+from chainercb.bandify import DelayedBandify, MultiClassBandify
+from chainercb.policies import EpsilonGreedy, Exploit, LinUCBPolicy, Softmax
+from chainercb.util import FeatureHasher
+from test.policy import setup_softmax_policy
+
+
+class Counting:
+    def __init__(self, predictor):
+        self.predictor = predictor
+        self.calls = 0
+
+    def __call__(self, x):
+        self.calls += 1
+        return self.predictor(x)
+
+
+def test_shadow_log_propensities():
+    softmax = setup_softmax_policy()
+    predictor = Counting(softmax.predictor)
+    shadows = {
+        'softmax-0.5': Softmax(softmax.predictor, tau=0.5),
+        'softmax-2.0': Softmax(softmax.predictor, tau=2.0),
+        'eps-0.1': EpsilonGreedy(softmax, 0.1),
+        'eps-0.2': EpsilonGreedy(softmax, 0.2),
+        'exploit': Exploit(softmax),
+    }
+    bandify = MultiClassBandify(EpsilonGreedy(softmax, 0.3))
+    for name, policy in shadows.items():
+        bandify.shadow_policy(name, policy)
+
+    np.random.seed(42)
+    x = Variable(np.random.random((32, 3)).astype('float32'))
+    y = Variable(np.random.randint(6, size=32).astype('int32'))
+    _, actions, _, _ = bandify(x, y)
+    actions = Variable(actions.data.astype('int32'))
+
+    # The softmax shadows share a single evaluation of the predictor
+    for name in ('softmax-0.5', 'softmax-2.0'):
+        shadows[name].predictor = predictor
+    log_p = bandify.shadow_log_propensities(x, actions)
+    assert predictor.calls == 1
+
+    assert list(log_p.keys()) == list(shadows.keys())
+    for name, policy in shadows.items():
+        assert_allclose(log_p[name].data,
+                        policy.log_propensity(x, actions).data)
+
+
+def test_shadow_hook():
+    softmax = setup_softmax_policy()
+    bandify = MultiClassBandify(softmax)
+    bandify.shadow_policy('eps', EpsilonGreedy(softmax, 0.1))
+    received = []
+    bandify.shadow_hook(lambda x, a, log_p, r, shadow: received.append(shadow))
+
+    np.random.seed(42)
+    x = Variable(np.random.random((8, 3)).astype('float32'))
+    y = Variable(np.random.randint(6, size=8).astype('int32'))
+    bandify(x, y)
+    bandify(x, y)
+    assert len(received) == 2
+    assert received[0]['eps'].shape == (8,)
+
+
+@raises(ValueError)
+def test_shadow_unique_names():
+    softmax = setup_softmax_policy()
+    bandify = MultiClassBandify(softmax)
+    bandify.shadow_policy('a', softmax)
+    bandify.shadow_policy('a', softmax)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def setup_delayed(**kwargs):
+    softmax = setup_softmax_policy()
+    bandify = DelayedBandify(softmax, **kwargs)
+    batches = []
+    bandify._hooks.append(lambda x, a, log_p, r: batches.append(
+        (x.data, a.data, log_p.data, r.data)))
+    return bandify, batches
+
+
+def test_delayed_join():
+    bandify, batches = setup_delayed(flush_size=3)
+    np.random.seed(42)
+    x = Variable(np.random.random((4, 3)).astype('float32'))
+    _, actions, log_p = bandify(x, ['a', 'b', 'c', 'd'])
+    assert bandify.pending == 4
+
+    assert bandify.join(['c', 'x'], [1.0, 1.0]) == 1
+    assert bandify.unmatched == 1
+    assert batches == []
+    bandify.join(['a', 'd'], np.array([0.5, 0.0]))
+    assert bandify.pending == 1
+
+    x_j, a_j, log_p_j, r_j = batches[0]
+    assert_allclose(x_j, x.data[[2, 0, 3]])
+    assert_allclose(a_j, actions.data[[2, 0, 3]])
+    assert_allclose(log_p_j, log_p.data[[2, 0, 3]])
+    assert_allclose(r_j, [1.0, 0.5, 0.0])
+
+    # Events are joined at most once
+    assert bandify.join(['a'], [1.0]) == 0
+
+
+def test_delayed_expiry():
+    clock = Clock()
+    bandify, batches = setup_delayed(ttl=10.0, clock=clock)
+    x = Variable(np.random.random((2, 3)).astype('float32'))
+    bandify(x, [1, 2])
+    clock.now = 5.0
+    bandify(x, [3, 4])
+    clock.now = 12.0
+    assert bandify.join([1, 3], [1.0, 1.0]) == 1
+    assert bandify.expired == 2
+    assert bandify.pending == 1
+    assert len(batches) == 1
+
+
+def test_delayed_eviction():
+    bandify, batches = setup_delayed(capacity=4, flush_size=10)
+    x = Variable(np.random.random((3, 3)).astype('float32'))
+    bandify(x, [1, 2, 3])
+    bandify.join([1], [1.0])
+    bandify(x, [4, 5, 6])
+
+    # The joined event is flushed before it is overwritten, the oldest pending
+    # events are evicted
+    assert len(batches) == 1
+    assert bandify.evicted == 1
+    assert bandify.pending == 4
+    assert bandify.join([2, 3, 4, 5, 6], np.ones(5)) == 4
+    assert bandify.flush() == 4
+
+
+def test_delayed_duplicate_ids():
+    clock = Clock()
+    bandify, batches = setup_delayed(capacity=4, ttl=1.0, clock=clock)
+    x = Variable(np.random.random((1, 3)).astype('float32'))
+    bandify(x, ['a'])
+    bandify(x, ['a'])
+
+    # The second event supersedes the first
+    assert bandify.evicted == 1
+    assert bandify.pending == 1
+    assert bandify.join(['a'], [1.0]) == 1
+    clock.now = 2.0
+    assert bandify.join(['zz'], [1.0]) == 0
+    assert bandify.expired == 0
+
+    # Duplicates within a batch and evictions of superseded events
+    bandify, batches = setup_delayed(capacity=2)
+    x = Variable(np.random.random((2, 3)).astype('float32'))
+    bandify(x, ['a', 'a'])
+    bandify(x[:1], ['b'])
+    bandify(x[:1], ['c'])
+    assert bandify.pending == 2
+    assert bandify.join(['a', 'b', 'c'], np.ones(3)) == 2
+
+
+def test_delayed_stale_arms():
+    policy = LinUCBPolicy(3, 3, alpha=0.0)
+    x = Variable(np.identity(3, dtype=np.float32))
+    policy.update(x, Variable(np.arange(3, dtype=np.int32)), None,
+                  Variable(np.ones(3)))
+    bandify = DelayedBandify(policy, flush_size=10)
+    updates = []
+    bandify._hooks.append(lambda x, a, log_p, r: updates.append(a.data))
+    _, actions, _ = bandify(x, ['a', 'b', 'c'])
+    assert_allclose(actions.data, [0, 1, 2])
+    policy.remove_arm(0)
+    policy.add_arm()
+
+    # The event of the replaced arm is dropped
+    assert bandify.join(['a', 'b', 'c'], np.ones(3)) == 3
+    assert bandify.flush() == 2
+    assert bandify.stale == 1
+    assert_allclose(updates[0], actions.data[1:])
+
+
+def test_encoder():
+    policy = LinUCBPolicy(3, 32)
+    hasher = FeatureHasher(32)
+    bandify = MultiClassBandify(policy, encoder=hasher)
+    bandify.update_policy(policy)
+    np.random.seed(42)
+    for _ in range(50):
+        labels = np.random.randint(3, size=16)
+        records = [[f'label={y}', f'noise={np.random.randint(100)}']
+                   for y in labels]
+        x, _, _, _ = bandify(records, Variable(labels.astype(np.int32)))
+        assert x.shape == (16, 32)
+
+    # The policy learns from the hashed contexts
+    records = [[f'label={y}'] for y in range(3)]
+    assert_allclose(policy.max(Variable(hasher(records))).data, [0, 1, 2])
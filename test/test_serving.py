@@ -0,0 +1,164 @@
+import asyncio
+
+import numpy as np
+from chainer import Variable
+from chainer.testing import assert_allclose
+from nose.tools import raises
+
+from chainercb.serving import MicroBatcher
+from test.policy import setup_softmax_policy
+
+
+def serve(batcher, xs, spacing=0.0):
+    async def request(i, x):
+        await asyncio.sleep(i * spacing)
+        return await batcher.act(x)
+
+    async def run():
+        async with batcher:
+            return await asyncio.gather(*[request(i, x)
+                                          for i, x in enumerate(xs)])
+    return asyncio.run(run())
+
+
+def test_results_routed_to_callers():
+    policy = setup_softmax_policy()
+    batcher = MicroBatcher(policy, max_batch_size=4, max_wait=1.0,
+                           method='max')
+    np.random.seed(42)
+    xs = np.random.random((10, 3)).astype('float32')
+    results = serve(batcher, xs)
+    actions = np.array([a for a, _ in results])
+    log_p = np.array([p for _, p in results])
+    assert_allclose(actions, policy.max(xs).data)
+
+    # The argmax is deterministic
+    assert_allclose(log_p, np.zeros(10))
+
+
+def test_log_propensities():
+    policy = setup_softmax_policy()
+    np.random.seed(42)
+    xs = np.random.random((10, 3)).astype('float32')
+
+    batcher = MicroBatcher(policy, max_batch_size=4, max_wait=1.0,
+                           method='uniform')
+    log_p = np.array([p for _, p in serve(batcher, xs)])
+    assert_allclose(log_p, -policy.log_nr_actions(xs).data)
+
+    batcher = MicroBatcher(policy, max_batch_size=4, max_wait=1.0)
+    results = serve(batcher, xs)
+    actions = np.array([a for a, _ in results], dtype=np.int32)
+    log_p = np.array([p for _, p in results])
+    assert_allclose(log_p, policy.log_propensity(xs, Variable(actions)).data)
+
+
+def test_max_batch_size():
+    policy = setup_softmax_policy()
+    batcher = MicroBatcher(policy, max_batch_size=4, max_wait=1.0)
+    np.random.seed(42)
+    serve(batcher, np.random.random((10, 3)).astype('float32'))
+    assert batcher.metrics.batches == 3
+    assert batcher.metrics.batch_sizes == {4: 2, 2: 1}
+    assert batcher.metrics.summary()['requests'] == 10
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_max_wait():
+    clock = Clock()
+    batcher = MicroBatcher(setup_softmax_policy(), max_batch_size=64,
+                           max_wait=1.0, clock=clock)
+    np.random.seed(42)
+    xs = np.random.random((5, 3)).astype('float32')
+
+    async def run():
+        async with batcher:
+            requests = []
+            for now, x in zip([0.0, 0.5, 2.0, 2.2, 5.0], xs):
+                clock.now = now
+                requests.append(asyncio.ensure_future(batcher.act(x)))
+                await asyncio.sleep(0)
+            await asyncio.gather(*requests)
+    asyncio.run(run())
+
+    # Requests that arrive after the oldest request of a batch has waited for
+    # max_wait start a new batch
+    assert batcher.metrics.batches == 3
+    assert batcher.metrics.batch_sizes == {2: 2, 1: 1}
+
+
+@raises(RuntimeError)
+def test_act_after_stop():
+    batcher = MicroBatcher(setup_softmax_policy())
+
+    async def run():
+        async with batcher:
+            pass
+        await batcher.act(np.zeros(3, dtype='float32'))
+    asyncio.run(run())
+
+
+def test_exceptions_routed_to_callers():
+    policy = setup_softmax_policy()
+    batcher = MicroBatcher(policy, max_batch_size=4, max_wait=1.0)
+    xs = np.random.random((2, 5)).astype('float32')
+    try:
+        serve(batcher, xs)
+    except Exception:
+        return
+    assert False
+
+
+def test_mismatching_shapes():
+    batcher = MicroBatcher(setup_softmax_policy(), max_batch_size=4,
+                           max_wait=1.0)
+
+    async def run():
+        async with batcher:
+            results = await asyncio.wait_for(asyncio.gather(
+                batcher.act(np.ones(3, dtype='float32')),
+                batcher.act(np.ones(4, dtype='float32')),
+                return_exceptions=True), 5.0)
+            assert all(isinstance(r, ValueError) for r in results)
+
+            # The batcher keeps serving
+            action, _ = await asyncio.wait_for(
+                batcher.act(np.ones(3, dtype='float32')), 5.0)
+            assert 0 <= action < 6
+    asyncio.run(run())
+
+
+def test_pending_fail_when_serving_ends():
+    batcher = MicroBatcher(setup_softmax_policy(), max_batch_size=4,
+                           max_wait=10.0)
+
+    async def run():
+        batcher.start()
+        request = asyncio.ensure_future(
+            batcher.act(np.ones(3, dtype='float32')))
+        await asyncio.sleep(0.01)
+        batcher._task.cancel()
+        try:
+            await asyncio.wait_for(request, 5.0)
+        except RuntimeError:
+            pass
+        else:
+            assert False
+        try:
+            await batcher.act(np.ones(3, dtype='float32'))
+        except RuntimeError:
+            return
+        assert False
+    asyncio.run(run())
+
+
+@raises(ValueError)
+def test_invalid_method():
+    MicroBatcher(setup_softmax_policy(), method='argmax')
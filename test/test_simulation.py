@@ -0,0 +1,82 @@
+import tempfile
+
+import numpy as np
+from chainer.testing import assert_allclose
+from nose.tools import raises
+
+from chainercb.policies import LinUCBPolicy
+from chainercb.simulation import Replica, simulate, load
+from test.policy import setup_softmax_policy
+
+
+def linucb(alpha):
+    return LinUCBPolicy(3, 3, alpha=alpha)
+
+
+def softmax(tau):
+    return setup_softmax_policy(tau)
+
+
+def dataset():
+    rng = np.random.RandomState(42)
+    x = rng.random_sample((50, 3)).astype('float32')
+    y = np.argmax(x, axis=1).astype('int32')
+    return x, y
+
+
+def test_curves():
+    x, y = dataset()
+    replicas = [Replica('linucb', linucb, 1, alpha=0.5),
+                Replica('softmax-1', softmax, 1, tau=1.0),
+                Replica('softmax-2', softmax, 2, tau=1.0)]
+    with tempfile.TemporaryDirectory() as directory:
+        simulate(replicas, x, y, directory, batch_size=16, epochs=2,
+                 processes=1)
+        for replica in replicas:
+            records = load(directory, replica.name)
+            assert len(records) == 8
+            assert records[-1]['samples'] == 100
+            total = records[-1]['cumulative_reward'] + \
+                records[-1]['cumulative_regret']
+            assert_allclose(total, 100.0)
+            assert_allclose(sum(r['reward'] for r in records),
+                            records[-1]['cumulative_reward'])
+
+
+def test_deterministic():
+    x, y = dataset()
+    replicas = [Replica(f'linucb-{s}', linucb, s, alpha=0.5)
+                for s in range(3)]
+    curves = []
+    for processes in (1, 2):
+        with tempfile.TemporaryDirectory() as directory:
+            simulate(replicas, x, y, directory, batch_size=8,
+                     processes=processes)
+            curves.append([load(directory, r.name) for r in replicas])
+    assert curves[0] == curves[1]
+
+
+def test_replicas_independent():
+    x, y = dataset()
+    replica = Replica('softmax-1', softmax, 1, tau=1.0)
+    others = [Replica(f'softmax-{s}', softmax, s, tau=1.0)
+              for s in range(2, 5)]
+    curves = []
+    np.random.seed(7)
+    state = np.random.get_state()
+    for replicas in ([replica], [replica] + others, others[:1] + [replica]):
+        with tempfile.TemporaryDirectory() as directory:
+            simulate(replicas, x, y, directory, batch_size=8, processes=1)
+            curves.append(load(directory, replica.name))
+    assert curves[0] == curves[1] == curves[2]
+
+    # The global random state of the caller is left untouched
+    assert np.array_equal(np.random.get_state()[1], state[1])
+
+
+@raises(ValueError)
+def test_unique_names():
+    x, y = dataset()
+    replicas = [Replica('a', linucb, 1, alpha=1.0),
+                Replica('a', linucb, 2, alpha=1.0)]
+    simulate(replicas, x, y, tempfile.mkdtemp(), processes=1)
@@ -0,0 +1,74 @@
+import tempfile
+
+import numpy as np
+from chainer import as_variable, optimizers, training
+from chainer.iterators import SerialIterator
+from chainer.testing import assert_allclose
+from chainer.training import extensions
+
+from chainercb import loss
+from chainercb.bandify import MultiClassBandify
+from chainercb.policies import Explore
+from chainercb.training import (BanditUpdater, OffPolicyEvaluator,
+                                logged_dataset, prefetch_iterator)
+from test.policy import setup_softmax_policy
+
+
+def _logged(n=512):
+    # A uniform logging policy on a 6-class problem whose label is the arg
+    # max of a linear function of the context
+    np.random.seed(42)
+    x = np.random.random((n, 3)).astype(np.float32)
+    y = np.argmax(x.dot(np.random.randn(3, 6)), axis=1).astype(np.int32)
+    logger = Explore(setup_softmax_policy())
+    _, actions, log_p, rewards = MultiClassBandify(logger)(as_variable(x),
+                                                          as_variable(y))
+    return logged_dataset(x, actions.data.astype(np.int32),
+                          log_p.data.astype(np.float32),
+                          rewards.data.astype(np.float32))
+
+
+def test_evaluator():
+    dataset = _logged()
+    policy = setup_softmax_policy()
+    evaluator = OffPolicyEvaluator(SerialIterator(dataset, 100, repeat=False,
+                                                  shuffle=False), policy)
+    evaluator.name = 'validation'
+    result = evaluator()
+    x, actions, log_p, rewards = (np.array(c) for c in zip(*dataset))
+    w = np.exp(policy.log_propensity(as_variable(x),
+                                     as_variable(actions)).data - log_p)
+    assert_allclose(result['validation/main/ips'], np.mean(w * rewards),
+                    rtol=1e-5)
+    assert_allclose(result['validation/main/snips'],
+                    np.sum(w * rewards) / np.sum(w), rtol=1e-5)
+
+    # The evaluator can be run again, the iterator is reset
+    assert_allclose(evaluator()['validation/main/ips'],
+                    result['validation/main/ips'])
+
+
+def test_trainer():
+    dataset = _logged()
+    policy = setup_softmax_policy()
+    optimizer = optimizers.Adam(0.05)
+    optimizer.setup(policy)
+    before = OffPolicyEvaluator(SerialIterator(dataset, 128, repeat=False),
+                                policy)()['main/snips']
+
+    train = prefetch_iterator(dataset, 64, n_processes=2)
+    updater = BanditUpdater(train, optimizer, loss.ips, lagrange=0.5)
+    log = extensions.LogReport(trigger=(20, 'epoch'))
+    with tempfile.TemporaryDirectory() as out:
+        trainer = training.Trainer(updater, (20, 'epoch'), out=out)
+        trainer.extend(OffPolicyEvaluator(SerialIterator(
+            dataset, 128, repeat=False), policy))
+        trainer.extend(log)
+        try:
+            trainer.run()
+        finally:
+            train.finalize()
+
+    entry = log.log[-1]
+    assert 'main/loss' in entry
+    assert entry['validation/main/snips'] > before + 0.2
@@ -0,0 +1,168 @@
+import os
+import pickle
+import tempfile
+
+import numpy as np
+from chainer import as_variable
+from chainer.testing import assert_allclose
+from nose.tools import raises
+
+from chainercb.util import ArmRegistry, RidgeRegression, TieredArmRegistry
+
+
+def test_add():
+    registry = ArmRegistry(3, capacity=2)
+    assert [registry.add() for _ in range(5)] == [0, 1, 2, 3, 4]
+    assert len(registry) == 5
+    assert registry.size == 5
+    assert registry.capacity == 8
+    assert_allclose(registry.active, np.ones(5))
+
+
+def test_remove_reuses_ids():
+    registry = ArmRegistry(3, capacity=4)
+    for _ in range(4):
+        registry.add()
+    registry.remove(1)
+    registry.remove(2)
+    assert registry.ids == [0, 3]
+    assert_allclose(registry.active, np.array([1, 0, 0, 1]))
+    assert registry.add() == 2
+    assert registry.add() == 1
+    assert registry.add() == 4
+
+
+@raises(KeyError)
+def test_remove_unknown():
+    registry = ArmRegistry(3)
+    registry.add()
+    registry.remove(1)
+
+
+def test_storage_is_shared():
+    registry = ArmRegistry(3, capacity=1)
+    x = as_variable(np.array([[1.0, 2.0, 3.0], [-1.0, 0.0, 2.0]]))
+    r = as_variable(np.array([1.0, -1.0]))
+    registry.add()
+    registry[0].update(x, r)
+
+    # Growing the registry keeps the regressors backed by the slabs
+    registry.add()
+    registry[1].update(x[:1, :], r[:1])
+    assert_allclose(registry.slab('_theta')[0], registry[0]._theta)
+    assert_allclose(registry.slab('_theta')[1], registry[1]._theta)
+
+    # The state should match a regressor that is not backed by the slabs
+    expected = RidgeRegression(3)
+    expected.update(x, r)
+    assert_allclose(registry[0].predict(x).data, expected.predict(x).data)
+
+
+def test_new_arm_is_reset():
+    registry = ArmRegistry(3)
+    x = as_variable(np.array([[1.0, 2.0, 3.0]]))
+    r = as_variable(np.array([1.0]))
+    registry.add()
+    registry[0].update(x, r)
+    registry.remove(0)
+    registry.add()
+    assert_allclose(registry[0].predict(x).data, np.zeros(1))
+    assert_allclose(registry[0]._A_inv, np.identity(3))
+
+
+def test_pickle():
+    registry = ArmRegistry(3)
+    x = as_variable(np.array([[1.0, 2.0, 3.0]]))
+    r = as_variable(np.array([1.0]))
+    registry.add()
+    registry.add()
+    registry.remove(0)
+    registry[1].update(x, r)
+
+    restored = pickle.loads(pickle.dumps(registry))
+    assert restored.ids == [1]
+    assert_allclose(restored[1].predict(x).data, registry[1].predict(x).data)
+
+    # Updates after unpickling still write to the slabs
+    restored[1].update(x, r)
+    assert_allclose(restored.slab('_theta')[1], restored[1]._theta)
+
+
+def test_tiered_eviction():
+    registry = TieredArmRegistry(3, capacity=2, resident=2)
+    x = as_variable(np.array([[1.0, 2.0, 3.0], [-1.0, 0.0, 2.0]]))
+    for a in range(4):
+        registry.add()
+        registry[a].update(x, as_variable(np.array([a, -a], dtype=np.float64)))
+    assert registry.resident == 2
+    assert registry.evictions == 2
+
+    # Evicted arms are faulted back in with their state intact
+    for a in range(4):
+        expected = RidgeRegression(3)
+        expected.update(x, as_variable(np.array([a, -a], dtype=np.float64)))
+        assert_allclose(registry[a].predict(x).data, expected.predict(x).data)
+    assert registry.resident == 2
+
+
+def test_tiered_counters():
+    registry = TieredArmRegistry(3, resident=2)
+    for _ in range(3):
+        registry.add()
+    registry[2]
+    registry[1]
+    assert (registry.hits, registry.misses) == (2, 0)
+    registry[0]
+    assert (registry.hits, registry.misses) == (2, 1)
+    registry[2]
+    assert (registry.hits, registry.misses) == (2, 2)
+
+
+def test_tiered_remove():
+    registry = TieredArmRegistry(3, resident=2)
+    for _ in range(3):
+        registry.add()
+    registry.remove(2)
+    registry.remove(0)
+    assert registry.ids == [1]
+    assert registry.add() == 0
+    assert registry.resident == 2
+
+
+def test_tiered_pickle():
+    registry = TieredArmRegistry(3, resident=1)
+    x = as_variable(np.array([[1.0, 2.0, 3.0]]))
+    registry.add()
+    registry.add()
+    registry[0].update(x, as_variable(np.array([1.0])))
+    registry[1].update(x, as_variable(np.array([-1.0])))
+
+    restored = pickle.loads(pickle.dumps(registry))
+    assert restored.resident == 0
+    assert_allclose(restored[0].predict(x).data, np.array([0.93333333]))
+    assert_allclose(restored[1].predict(x).data, np.array([-0.93333333]))
+
+
+def test_tiered_directory():
+    registry = TieredArmRegistry(3, resident=1)
+    registry.add()
+    directory = registry._directory
+    assert os.path.isdir(directory)
+
+    # A pickle does not depend on the temporary directory
+    data = pickle.dumps(registry)
+    registry.close()
+    assert not os.path.exists(directory)
+    restored = pickle.loads(data)
+    assert restored._directory != directory
+    assert restored.ids == [0]
+    directory = restored._directory
+    del restored
+    assert not os.path.exists(directory)
+
+    # A given directory is kept
+    with tempfile.TemporaryDirectory() as directory:
+        registry = TieredArmRegistry(3, resident=1, directory=directory)
+        registry.add()
+        registry.close()
+        assert os.listdir(directory)
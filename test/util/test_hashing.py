@@ -0,0 +1,71 @@
+import zlib
+
+import numpy as np
+from chainer.testing import assert_allclose
+
+from chainercb.util import FeatureHasher
+
+
+def _expected(records, d, signed=True):
+    out = np.zeros((len(records), d))
+    for i, record in enumerate(records):
+        items = record.items() if isinstance(record, dict) else record
+        for item in items:
+            feature, value = (item, 1.0) if isinstance(item, str) else item
+            h = zlib.crc32(str(feature).encode('utf-8'))
+            sign = -1.0 if signed and h >> 31 else 1.0
+            out[i, h % d] += sign * value
+    return out
+
+
+def test_dense():
+    records = [['country=NL', 'device=mobile', ('age', 0.3)],
+               {'country=US': 1.0, 'age': 0.5},
+               []]
+    hasher = FeatureHasher(16)
+    x = hasher(records)
+    assert x.shape == (3, 16)
+    assert x.dtype == np.float32
+    assert_allclose(x, _expected(records, 16))
+    assert_allclose(FeatureHasher(16, signed=False)(records),
+                    _expected(records, 16, signed=False))
+
+    # Hashes are cached per feature
+    assert len(hasher._cache) == 4
+    assert_allclose(hasher(records), x)
+
+
+def test_equal_features():
+    # Features that compare equal but print differently hash differently,
+    # regardless of which of them was cached first
+    records = [[(1, 1.0), (True, 1.0)], [(1.0, 1.0)]]
+    hasher = FeatureHasher(1024)
+    assert_allclose(hasher(records), _expected(records, 1024))
+    assert len(hasher._cache) == 3
+    assert_allclose(FeatureHasher(1024)(records[1:]), hasher(records)[1:])
+
+
+def test_sparse():
+    np.random.seed(42)
+    records = [[f'user={u}', f'item={i}'] for u, i in
+               zip(np.random.randint(10000, size=50),
+                   np.random.randint(10000, size=50))]
+    hasher = FeatureHasher(64)
+    batch = hasher.transform(records, sparse=True)
+    assert batch.shape == (50, 64)
+    assert_allclose(batch.indptr, np.arange(0, 101, 2))
+    assert_allclose(hasher.densify(batch), hasher(records))
+
+    # Colliding features sum up
+    colliding = [['a', 'a', 'b']]
+    assert_allclose(FeatureHasher(4)(colliding), _expected(colliding, 4))
+
+
+def test_actions():
+    records = [[['item=1'], ['item=2'], ['item=3']],
+               [['item=4'], ['item=5'], ['item=1']]]
+    hasher = FeatureHasher(8)
+    x = hasher.transform_actions(records)
+    assert x.shape == (2, 3, 8)
+    assert_allclose(x[0, 0], x[1, 2])
+    assert_allclose(x[1, 1], hasher([['item=5']])[0])
@@ -0,0 +1,102 @@
+import io
+import json
+import tracemalloc
+
+import numpy as np
+from chainer import as_variable
+from nose.tools import raises
+
+from chainercb.policies import EpsilonGreedy, LinUCBPolicy
+from chainercb.util import instrumentation
+from chainercb.util.instrumentation import instrumented
+
+
+def run_policy():
+    policy = EpsilonGreedy(LinUCBPolicy(3, 4), 0.1)
+    np.random.seed(42)
+    x = as_variable(np.random.random((8, 4)))
+    a = as_variable(np.random.randint(3, size=8))
+    r = as_variable(np.random.random(8))
+    policy.draw(x)
+    policy.policy.update(x, a, None, r)
+    policy.policy.update(x[:1], a[:1], None, r[:1])
+
+
+def test_disabled():
+    instrumentation.reset()
+    run_policy()
+    assert instrumentation.snapshot() == {}
+
+
+def test_nesting():
+    instrumentation.reset()
+    with instrumentation.enabled():
+        run_policy()
+    stats = instrumentation.snapshot()
+    assert stats['EpsilonGreedy.draw']['count'] == 1
+    assert stats['EpsilonGreedy.draw/EpsilonGreedy.max/'
+                 'LinUCBPolicy.max']['count'] == 1
+    assert stats['EpsilonGreedy.draw/EpsilonGreedy.max/LinUCBPolicy.max/'
+                 'RidgeRegression.predict']['count'] == 3
+    assert stats['LinUCBPolicy.update']['count'] == 2
+    assert stats['LinUCBPolicy.update/RidgeRegression.update/'
+                 'RidgeRegression.inversion']['count'] == 4
+    assert sum(stats['EpsilonGreedy.draw']['histogram'].values()) == 1
+    assert stats['EpsilonGreedy.draw']['peak_bytes'] == 0
+
+
+def test_memory():
+    instrumentation.reset()
+    with instrumentation.enabled(memory=True):
+        run_policy()
+    stats = instrumentation.snapshot()
+    outer = stats['LinUCBPolicy.update']['peak_bytes']
+    inner = stats['LinUCBPolicy.update/RidgeRegression.update']['peak_bytes']
+    assert 0 < inner <= outer
+
+
+def test_report():
+    instrumentation.reset()
+    with instrumentation.enabled():
+        run_policy()
+    out = io.StringIO()
+    instrumentation.report(out, format='json')
+    assert json.loads(out.getvalue()) == instrumentation.snapshot()
+    out = io.StringIO()
+    instrumentation.report(out)
+    assert '    RidgeRegression.predict' in out.getvalue()
+
+
+def test_foreign_tracing():
+    tracemalloc.start()
+    try:
+        with instrumentation.enabled(memory=True):
+            run_policy()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+class Base:
+    @instrumented('step', method=True)
+    def step(self):
+        return 1
+
+
+class Derived(Base):
+    @instrumented('step', method=True)
+    def step(self):
+        return super().step() + 1
+
+
+def test_super_calls():
+    instrumentation.reset()
+    with instrumentation.enabled():
+        assert Derived().step() == 2
+    assert instrumentation.snapshot()['Derived.step']['count'] == 1
+    assert len(instrumentation.snapshot()) == 1
+
+
+@raises(ValueError)
+def test_report_invalid_format():
+    instrumentation.report(io.StringIO(), format='xml')
@@ -0,0 +1,51 @@
+import numpy as np
+from chainer import as_variable
+from chainer.testing import assert_allclose
+
+from chainercb.util import Nystroem, RandomFourierFeatures
+
+
+def _rbf(x, y, gamma):
+    return np.exp(-gamma * np.sum((x[:, None, :] - y[None, :, :]) ** 2,
+                                  axis=2))
+
+
+def test_random_fourier_features():
+    np.random.seed(42)
+    x = np.random.randn(6, 3)
+    features = RandomFourierFeatures(3, 5000, gamma=0.5)
+    z = features(as_variable(x)).data
+    assert z.shape == (6, 5000)
+    assert_allclose(z.dot(z.T), _rbf(x, x, 0.5), atol=0.05)
+
+    # The random projection is persistent, not trainable
+    assert len(list(features.params())) == 0
+    assert 'W' in features._persistent
+
+
+def test_nystroem():
+    np.random.seed(42)
+    x = np.random.randn(200, 3)
+    features = Nystroem.sample(x, 50, gamma=0.5)
+    assert features.size == 50
+    landmarks = features.landmarks
+
+    # The approximation is exact on the landmarks
+    z = features(as_variable(landmarks)).data
+    assert_allclose(z.dot(z.T), _rbf(landmarks, landmarks, 0.5), atol=1e-4)
+
+    # And close to the kernel elsewhere
+    z = features(as_variable(x[:10])).data
+    assert_allclose(z.dot(z.T), _rbf(x[:10], x[:10], 0.5), atol=0.1)
+
+
+def test_nystroem_duplicate_landmarks():
+    np.random.seed(42)
+    points = np.array([[(i >> j) & 1 for j in range(4)] for i in range(16)],
+                      dtype=np.float64)
+    x = points[np.random.randint(16, size=500)]
+    features = Nystroem.sample(x, 64)
+
+    # Repeated landmarks do not amplify rounding errors
+    z = features(as_variable(x[:50])).data
+    assert_allclose(z.dot(z.T), _rbf(x[:50], x[:50], 1.0), atol=1e-4)
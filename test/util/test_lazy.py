@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+from nose.tools import raises
+
+import chainercb.util
+
+
+def run(code):
+    return subprocess.run([sys.executable, '-c', code], check=True,
+                          stdout=subprocess.PIPE).stdout.decode().strip()
+
+
+def test_ridge_without_chainer():
+    out = run('import sys, numpy as np\n'
+              'from chainercb.util import RidgeRegression, ArmRegistry\n'
+              'r = RidgeRegression(3)\n'
+              'r.update(np.ones((2, 3)), np.ones(2))\n'
+              'ArmRegistry(3).add()\n'
+              'print("chainer" in sys.modules)')
+    assert out == 'False'
+
+
+def test_policies_loaded_on_access():
+    out = run('import sys\n'
+              'from chainercb.policies import Softmax\n'
+              'print("chainercb.policies.linear_ucb" in sys.modules)')
+    assert out == 'False'
+
+
+def test_dir():
+    assert 'RidgeRegression' in dir(chainercb.util)
+    assert set(chainercb.util.__all__) <= set(dir(chainercb.util))
+
+
+@raises(AttributeError)
+def test_missing_attribute():
+    chainercb.util.DoesNotExist
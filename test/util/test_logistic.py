@@ -0,0 +1,75 @@
+from functools import partial
+
+import numpy as np
+from chainer import as_variable
+from chainer.testing import assert_allclose
+
+from chainercb.policies import ADFUCBPolicy, ThompsonPolicy
+from chainercb.util import LogisticRegression
+
+
+def _clicks(n, theta):
+    x = np.random.randn(n, theta.shape[0])
+    p = 1.0 / (1.0 + np.exp(-x.dot(theta)))
+    return x, 1.0 * (np.random.random(n) < p), p
+
+
+def test_fit():
+    np.random.seed(42)
+    theta = np.array([1.5, -1.0, 0.5, 0.0])
+    x, y, p = _clicks(4000, theta)
+    r = LogisticRegression(4)
+    for start in range(0, 4000, 10):
+        r.update(as_variable(x[start:start + 10]),
+                 as_variable(y[start:start + 10]))
+    assert_allclose(r._theta, theta, atol=0.15)
+    assert_allclose(r.predict_proba(as_variable(x)).data, p, atol=0.15)
+
+    # The inverse precision is maintained by rank-one updates
+    assert_allclose(r._A_inv, np.linalg.inv(r._A), rtol=1e-6, atol=1e-10)
+
+    # The curvature of every observation is at most 1 / 4
+    assert np.all(np.linalg.eigvalsh(r._A - np.identity(4)) > 0.0)
+    assert np.trace(r._A) - 4.0 <= 0.25 * np.sum(x ** 2)
+
+
+def test_refactorize_keeps_mean():
+    np.random.seed(42)
+    x, y, _ = _clicks(50, np.array([1.0, -1.0, 0.5]))
+    r = LogisticRegression(3, refactor_every=20)
+    for start in range(0, 50, 10):
+        r.update(as_variable(x[start:start + 10]),
+                 as_variable(y[start:start + 10]))
+    assert r.refactorizations == 2
+    theta = r._theta.copy()
+    r.refactorize()
+    assert_allclose(r._theta, theta)
+
+
+def test_policies():
+    np.random.seed(42)
+    thetas = np.array([[1.0, -1.0], [-1.0, 1.0], [0.2, 0.2]])
+
+    # Per-arm logistic regressions
+    policy = ThompsonPolicy(3, 2, regressor=LogisticRegression)
+    for _ in range(100):
+        x = np.random.randn(8, 2)
+        a = policy.draw(as_variable(x)).data
+        p = 1.0 / (1.0 + np.exp(-np.sum(x * thetas[a], axis=1)))
+        r = 1.0 * (np.random.random(8) < p)
+        policy.update(as_variable(x), as_variable(a), None, as_variable(r))
+    x = np.random.randn(200, 2)
+    best = x.dot(thetas.T).argmax(axis=1)
+    assert np.mean(policy.max(as_variable(x)).data == best) > 0.9
+
+    # A single logistic regression over action-dependent features
+    policy = ADFUCBPolicy(2, alpha=0.5, regressor=partial(
+        LogisticRegression, serving_dtype=np.float32))
+    theta = np.array([2.0, -1.0])
+    for _ in range(100):
+        x = np.random.randn(8, 3, 2)
+        a = policy.draw(as_variable(x)).data
+        p = 1.0 / (1.0 + np.exp(-x[np.arange(8), a].dot(theta)))
+        r = 1.0 * (np.random.random(8) < p)
+        policy.update(as_variable(x), as_variable(a), None, as_variable(r))
+    assert_allclose(policy.regressor._theta, theta, atol=0.5)
@@ -0,0 +1,81 @@
+import numpy as np
+from chainer.testing import assert_allclose
+from nose.tools import raises
+
+from chainercb.loss import ips
+from chainercb.util import ReplayBuffer, SumTree
+from test.policy import setup_softmax_policy
+
+
+def fill(buffer, n, seed=42):
+    rng = np.random.RandomState(seed)
+    x = rng.random_sample((n, 3)).astype('float32')
+    a = rng.randint(6, size=n).astype('int32')
+    log_p = np.log(np.ones(n, dtype='float32') / 6)
+    r = rng.random_sample(n).astype('float32')
+    buffer.append(x, a, log_p, r)
+    return x, a, log_p, r
+
+
+def test_sum_tree():
+    tree = SumTree(5)
+    tree.set(np.arange(5), np.array([1.0, 0.0, 2.0, 3.0, 4.0]))
+    assert_allclose(tree.total, 10.0)
+    assert_allclose(tree.find(np.array([0.0, 0.99, 1.0, 2.5, 3.0, 9.99])),
+                    [0, 0, 2, 2, 3, 4])
+    tree.set(np.array([4]), np.array([0.5]))
+    assert_allclose(tree.total, 6.5)
+
+
+def test_append_wraps():
+    buffer = ReplayBuffer(8)
+    fill(buffer, 5)
+    x, a, log_p, r = fill(buffer, 5, seed=1)
+    assert len(buffer) == 8
+    assert_allclose(buffer._ring.columns['x'][[6, 7, 0, 1]], x[1:])
+
+
+def test_views_are_zero_copy():
+    buffer = ReplayBuffer(8)
+    fill(buffer, 8)
+    batches = list(buffer.views(3))
+    assert [len(b.x) for b in batches] == [3, 3, 2]
+    assert np.shares_memory(batches[1].x.data, buffer._ring.columns['x'])
+    loss = ips(*batches[0][:4], setup_softmax_policy())
+    assert loss.shape == ()
+
+
+def test_sample_uniform():
+    buffer = ReplayBuffer(16)
+    x, a, _, _ = fill(buffer, 10)
+    np.random.seed(42)
+    batch = buffer.sample(32)
+    assert np.all(batch.slots < 10)
+    assert_allclose(batch.x.data, x[batch.slots])
+    assert_allclose(batch.actions.data, a[batch.slots])
+    assert_allclose(batch.weights, np.ones(32))
+
+
+def test_sample_prioritized():
+    buffer = ReplayBuffer(4, prioritized=True)
+    fill(buffer, 4)
+    buffer.update_priorities(np.arange(4), np.array([1.0, 0.0, 0.0, 3.0]))
+    np.random.seed(42)
+    batch = buffer.sample(4000)
+    counts = np.bincount(batch.slots, minlength=4)
+    assert_allclose(counts / 4000.0, [0.25, 0.0, 0.0, 0.75])
+    assert_allclose(batch.weights[batch.slots == 3], 1.0 / 3.0)
+
+
+def test_sample_prioritized_new_rows():
+    # New rows receive the largest priority seen so far
+    buffer = ReplayBuffer(8, prioritized=True)
+    fill(buffer, 2)
+    buffer.update_priorities(np.arange(2), np.array([4.0, 0.0]))
+    fill(buffer, 1)
+    assert_allclose(buffer._tree.get(np.arange(3)), [4.0, 0.0, 4.0])
+
+
+@raises(RuntimeError)
+def test_sample_empty():
+    ReplayBuffer(4).sample(1)
@@ -1,6 +1,7 @@
 import numpy as np
 from chainer import as_variable
-from chainercb.util import RidgeRegression
+from chainercb.util import (DiscountedRidgeRegression, RidgeRegression,
+                            WindowedRidgeRegression)
 from chainer.testing import assert_allclose
 
 
@@ -164,3 +165,139 @@ def test_thompson_distribution():
     assert_allclose(np.mean(samples, axis=0), means.data, rtol=1e-2, atol=1e-2)
     assert_allclose(np.std(samples, axis=0), stds.data, rtol=1e-2, atol=1e-2)
 
+
+def test_windowed_matches_recent():
+    np.random.seed(42)
+    x = np.random.randn(50, 4)
+    y = np.random.randn(50)
+    windowed = WindowedRidgeRegression(4, window=10)
+    for start in range(0, 50, 7):
+        windowed.update(as_variable(x[start:start + 7]),
+                        as_variable(y[start:start + 7]))
+    recent = RidgeRegression(4)
+    recent.update(as_variable(x[-10:]), as_variable(y[-10:]))
+    assert windowed.size == 10
+    assert_allclose(windowed._A_inv, recent._A_inv, atol=1e-8)
+    assert_allclose(windowed.predict(as_variable(x)).data,
+                    recent.predict(as_variable(x)).data, atol=1e-8)
+
+
+def test_discounted():
+    np.random.seed(42)
+    x = np.random.randn(30, 4)
+    y = np.random.randn(30)
+
+    # Without forgetting, this is a regular ridge regression
+    discounted = DiscountedRidgeRegression(4, gamma=1.0)
+    discounted.update(as_variable(x), as_variable(y))
+    regular = RidgeRegression(4)
+    regular.update(as_variable(x), as_variable(y))
+    assert_allclose(discounted.predict(as_variable(x)).data,
+                    regular.predict(as_variable(x)).data, atol=1e-8)
+
+    # With forgetting, this is a ridge regression on weighted observations
+    gamma = 0.9
+    discounted = DiscountedRidgeRegression(4, gamma=gamma)
+    discounted.update(as_variable(x), as_variable(y))
+    w = gamma ** np.arange(29, -1, -1)
+    A = np.identity(4) + (x * w[:, None]).T.dot(x)
+    b = (x * (w * y)[:, None]).sum(axis=0)
+    assert_allclose(discounted._A_inv, np.linalg.inv(A), rtol=1e-6)
+    assert_allclose(discounted._theta, np.linalg.solve(A, b), rtol=1e-6)
+
+
+def test_discounted_unobserved_directions():
+    # Directions that are never observed keep their prior
+    r = DiscountedRidgeRegression(3, regularization=2.0, gamma=0.99)
+    x = np.tile([[1.0, 0.0, 0.0]], (1000, 1))
+    for _ in range(20):
+        r.update(as_variable(x), as_variable(np.ones(1000)))
+    assert np.all(np.isfinite(r._A_inv))
+    assert_allclose(r._A_inv[1:, 1:], np.identity(2) / 2.0)
+    assert_allclose(r.ucb(as_variable(np.array([[0.0, 1.0, 0.0]]))).data,
+                    [np.sqrt(0.5)])
+    assert_allclose(r._theta, [100.0 / 102.0, 0.0, 0.0], rtol=1e-6)
+
+
+def test_tracks_drift():
+    np.random.seed(42)
+    x = np.random.randn(400, 3)
+    y = np.where(np.arange(400) < 200, x[:, 0], -x[:, 0])
+    models = [RidgeRegression(3), WindowedRidgeRegression(3, window=50),
+              DiscountedRidgeRegression(3, gamma=0.95)]
+    for model in models:
+        for i in range(400):
+            model.update(as_variable(x[i:i + 1]), as_variable(y[i:i + 1]))
+    assert models[0]._theta[0] > -0.5
+    assert_allclose(models[1]._theta[0], -1.0, atol=5e-2)
+    assert_allclose(models[2]._theta[0], -1.0, atol=5e-2)
+
+
+def test_refactor_every():
+    np.random.seed(42)
+    x = np.random.randn(25, 4)
+    y = np.random.randn(25)
+    r = RidgeRegression(4, refactor_every=10)
+    for i in range(25):
+        r.update(as_variable(x[i:i + 1]), as_variable(y[i:i + 1]))
+    assert r.refactorizations == 2
+    assert r.updates_since_refactorization == 5
+
+    # A batch update computes the inverse from scratch
+    r.update(as_variable(x[:3]), as_variable(y[:3]))
+    assert r.updates_since_refactorization == 0
+    assert_allclose(r._A_inv, np.linalg.inv(r._A), atol=1e-10)
+
+
+def test_drift_tolerance():
+    np.random.seed(42)
+    x = np.random.randn(500, 8).astype(np.float32)
+    y = np.random.randn(500).astype(np.float32)
+    unchecked = RidgeRegression(8, dtype=np.float32)
+    checked = RidgeRegression(8, dtype=np.float32, drift_tolerance=1e-7)
+    for i in range(500):
+        unchecked.update(as_variable(x[i:i + 1]), as_variable(y[i:i + 1]))
+        checked.update(as_variable(x[i:i + 1]), as_variable(y[i:i + 1]))
+    assert unchecked.refactorizations == 0
+    assert unchecked.drift() > 1e-7
+    assert checked.refactorizations > 0
+    assert checked.drift() <= 1e-7
+
+
+def test_serving_dtype():
+    np.random.seed(42)
+    x = np.random.randn(20, 4)
+    y = np.random.randn(20)
+    exact = RidgeRegression(4)
+    r = RidgeRegression(4, serving_dtype=np.float32)
+    for i in range(20):
+        exact.update(as_variable(x[i:i + 1]), as_variable(y[i:i + 1]))
+        r.update(as_variable(x[i:i + 1]), as_variable(y[i:i + 1]))
+
+    # The state is accumulated in double precision and served in single
+    assert r._A_inv.dtype == np.float64
+    assert r._A_inv_serving.dtype == np.float32
+    x = as_variable(x.astype(np.float32))
+    assert r.ucb(x).data.dtype == np.float32
+    assert_allclose(r.ucb(x).data, exact.ucb(x).data, rtol=1e-5)
+    assert_allclose(r.predict(x).data, exact.predict(x).data, rtol=1e-5,
+                    atol=1e-6)
+
+    # Thompson sampling draws around the served mean
+    np.random.seed(7)
+    sampled = r.thompson(x).data
+    assert sampled.dtype == np.float32
+    np.random.seed(7)
+    u = np.random.standard_normal(4)
+    theta = r._theta_serving + r._cholesky_decomposition().dot(u)
+    assert_allclose(sampled, x.data.dot(theta), rtol=1e-5, atol=1e-6)
+
+
+def test_dtype():
+    # Single precision state halves the memory and serves single precision
+    x = as_variable(np.random.random((4, 3)).astype(np.float32))
+    r = RidgeRegression(3, dtype=np.float32)
+    r.update(x, as_variable(np.ones(4, dtype=np.float32)))
+    assert r._A_inv.dtype == np.float32
+    assert r.predict(x).data.dtype == np.float32
+    assert RidgeRegression(3)._A_inv.nbytes == 2 * r._A_inv.nbytes
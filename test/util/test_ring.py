@@ -0,0 +1,30 @@
+import numpy as np
+from chainer.testing import assert_allclose
+from nose.tools import raises
+
+from chainercb.util.ring import RingBuffer
+
+
+def test_push_wraps():
+    ring = RingBuffer(4)
+    ring.push(3, x=np.arange(6).reshape(3, 2))
+    slots = ring.push(2, x=np.arange(6, 10).reshape(2, 2))
+    assert_allclose(slots, [3, 0])
+    assert len(ring) == 4
+    assert_allclose(ring.slots(), [1, 2, 3, 0])
+    assert_allclose(ring.columns['x'][ring.slots()][:, 0], [2, 4, 6, 8])
+
+
+def test_slot():
+    ring = RingBuffer(4)
+    ring.push(3, x=np.arange(3))
+    ring.push(3, x=np.arange(3, 6))
+    assert ring.slot(1) is None
+    assert ring.slot(2) == 2
+    assert ring.slot(5) == 1
+    assert ring.slot(6) is None
+
+
+@raises(ValueError)
+def test_push_too_many():
+    RingBuffer(4).push(5)
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from chainer import Variable, as_variable, gradient_check
+from chainer.testing import assert_allclose
+
+from chainercb.util import select_items_per_row, inverse_select_items_per_row
+from chainercb.util.select_items import SelectItemsPerRow, _buffer
+
+
+def test_select_items_per_row():
+    values = as_variable(np.array([[1.0, 2.0, 3.0, 4.0],
+                                   [5.0, 6.0, 7.0, 8.0],
+                                   [9.0, 10.0, 11.0, 12.0]]))
+    idx = as_variable(np.array([[3, 0], [1, 1], [2, 0]], dtype=np.int32))
+    expected = np.array([[4.0, 1.0], [6.0, 6.0], [11.0, 9.0]])
+    assert_allclose(select_items_per_row(values, idx).data, expected)
+
+
+def test_inverse_select_items_per_row():
+    values = as_variable(np.array([[1.0, 2.0, 3.0, 4.0],
+                                   [5.0, 6.0, 7.0, 8.0],
+                                   [9.0, 10.0, 11.0, 12.0]]))
+    idx = as_variable(np.array([[3, 0], [1, 2], [2, 0]], dtype=np.int32))
+    expected = np.array([[2.0, 3.0], [5.0, 8.0], [10.0, 12.0]])
+    assert_allclose(inverse_select_items_per_row(values, idx).data, expected)
+
+    # The reused mask buffer should not leak between calls
+    idx = as_variable(np.array([[1, 2], [0, 3], [1, 3]], dtype=np.int32))
+    expected = np.array([[1.0, 4.0], [6.0, 7.0], [9.0, 11.0]])
+    assert_allclose(inverse_select_items_per_row(values, idx).data, expected)
+
+
+def test_backward_accumulates_duplicates():
+    values = Variable(np.arange(8.0).reshape(2, 4))
+    idx = np.array([[1, 1, 3], [0, 2, 0]], dtype=np.int32)
+    y = select_items_per_row(values, idx)
+    y.grad = np.ones(y.shape)
+    y.backward()
+    expected = np.array([[0.0, 2.0, 0.0, 1.0], [2.0, 0.0, 1.0, 0.0]])
+    assert_allclose(values.grad, expected)
+
+
+def test_check_backward():
+    np.random.seed(42)
+    x = np.random.random((5, 7))
+    idx = np.random.randint(7, size=(5, 3)).astype(np.int32)
+    gy = np.random.random((5, 3))
+    ggx = np.random.random((5, 7))
+    gradient_check.check_backward(
+        lambda v: SelectItemsPerRow(idx).apply((v,))[0], x, gy)
+    gradient_check.check_double_backward(
+        lambda v: SelectItemsPerRow(idx).apply((v,))[0] ** 2, x, gy, ggx)
+
+
+def test_check_backward_inverse():
+    np.random.seed(42)
+    x = np.random.random((5, 7))
+    idx = np.stack([np.random.permutation(7)[:3] for _ in range(5)])
+    gy = np.random.random((5, 4))
+    ggx = np.random.random((5, 7))
+    gradient_check.check_backward(
+        lambda v: inverse_select_items_per_row(v, idx), x, gy)
+    gradient_check.check_double_backward(
+        lambda v: inverse_select_items_per_row(v, idx) ** 2, x, gy, ggx)
+
+
+def test_buffers_per_thread():
+    buffer = _buffer(np, (3, 4), np.bool_)
+    assert _buffer(np, (3, 4), np.bool_) is buffer
+    with ThreadPoolExecutor(1) as executor:
+        other = executor.submit(_buffer, np, (3, 4), np.bool_).result()
+    assert other is not buffer